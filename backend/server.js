@@ -1243,14 +1243,38 @@ process.on('SIGTERM', () => {
 });
 
 // ===== ЗАПРОС СПИСКА ЧАТОВ ЧЕРЕЗ ПАРСЕР =====
-const FLAG_PATH = path.join(__dirname, '../request_chats.flag');
+// Команда уходит в канал управления работающего парсера (control_server.py)
+const PARSER_CONTROL_URL = process.env.PARSER_CONTROL_URL || 'http://127.0.0.1:8765';
 
-app.post('/api/request-chats', (req, res) => {
+app.post('/api/request-chats', async (req, res) => {
   try {
-    fs.writeFileSync(FLAG_PATH, 'request');
-    res.json({ status: 'ok', message: 'Файл-флаг создан, парсер получит команду.' });
+    const headers = process.env.CONTROL_TOKEN ? { 'X-Control-Token': process.env.CONTROL_TOKEN } : {};
+    const response = await fetch(`${PARSER_CONTROL_URL}/discover-chats`, { method: 'POST', headers });
+    const result = await response.json();
+    if (response.status === 409) {
+      return res.json({ status: 'ok', message: 'Парсер уже обновляет список чатов.' });
+    }
+    if (!response.ok) {
+      return res.status(502).json({ status: 'error', message: result.message || 'Парсер отклонил команду.' });
+    }
+    res.json({ status: 'ok', message: 'Парсер получил команду, список чатов обновляется.' });
+  } catch (err) {
+    res.status(503).json({ status: 'error', message: 'Парсер недоступен: ' + err.message });
+  }
+});
+
+// Список групп и каналов аккаунта от подключенного клиента парсера (без запуска Python)
+app.get('/api/telegram/dialogs', async (req, res) => {
+  try {
+    const headers = process.env.CONTROL_TOKEN ? { 'X-Control-Token': process.env.CONTROL_TOKEN } : {};
+    const response = await fetch(`${PARSER_CONTROL_URL}/dialogs`, { headers });
+    const result = await response.json();
+    if (!response.ok) {
+      return res.status(502).json({ success: false, error: result.message || 'Парсер не вернул список чатов' });
+    }
+    res.json({ success: true, data: result });
   } catch (err) {
-    res.status(500).json({ status: 'error', message: 'Не удалось создать файл-флаг.' });
+    res.status(503).json({ success: false, error: 'Парсер недоступен: ' + err.message });
   }
 });
 
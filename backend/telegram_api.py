@@ -10,6 +10,10 @@ import sys
 from telethon import TelegramClient
 from dotenv import load_dotenv
 
+# Общий с парсером модуль дополнения чатов
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'telegram-parser'))
+from chat_enrichment import ParticipantCountEnricher
+
 # Загружаем переменные окружения
 load_dotenv()
 
@@ -33,6 +37,14 @@ class TelegramChatsAPI:
         )
         
         self.client = TelegramClient(self.session_path, int(self.api_id), self.api_hash)
+        
+        # Число участников каналов и супергрупп из кеша с дозапросом недостающих
+        self.enricher = ParticipantCountEnricher(
+            os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cache', 'chat_participants.json'),
+            max_concurrency=int(os.getenv('CHAT_ENRICH_CONCURRENCY', '4')),
+            rate_per_second=float(os.getenv('CHAT_ENRICH_RATE_PER_SECOND', '5')),
+            time_budget=float(os.getenv('CHAT_ENRICH_TIME_BUDGET', '10'))
+        )
 
     async def get_available_chats(self):
         """Получение списка доступных чатов из реального Telegram аккаунта"""
@@ -44,6 +56,7 @@ class TelegramChatsAPI:
             print(f"✅ Подключен как: {me.first_name} (@{me.username})", file=sys.stderr)
             
             chats = []
+            entities = {}
             
             # Получаем все диалоги
             async for dialog in self.client.iter_dialogs():
@@ -56,8 +69,10 @@ class TelegramChatsAPI:
                         'accessible': True
                     }
                     chats.append(chat_info)
+                    entities[chat_info['id']] = dialog.entity
             
             print(f"✅ Найдено {len(chats)} чатов/каналов", file=sys.stderr)
+            await self.enricher.enrich(self.client, chats, entities)
             return chats
             
         except Exception as e:
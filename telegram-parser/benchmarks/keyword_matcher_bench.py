@@ -0,0 +1,93 @@
+"""
+Бенчмарк поиска ключевых слов: линейный перебор против автомата Ахо-Корасик
+Запуск: python benchmarks/keyword_matcher_bench.py [--messages N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from keyword_matcher import KeywordMatcher
+
+SYLLABLES = ['гру', 'з', 'та', 'ндем', 'ре', 'ф', 'ку', 'зов', 'тон', 'на', 'ма', 'шин', 'ка',
+             'ав', 'то', 'воз', 'дал', 'ьно', 'бой', 'сроч', 'но', 'пал', 'лет', 'ы', 'ал', 'ма']
+
+MESSAGE_TEMPLATES = [
+    'Нужна фура 20 тонн Алматы - Астана, груз паллеты, срочно! Звоните +7 701 123 45 67',
+    'Ищу тандем 140 куб на завтра, загрузка в Шымкенте, оплата нал. 8 777 765 43 21',
+    'Реф до -18, 22 паллеты, Москва - Караганда. Ставка договорная',
+    'Свободная машина газель 3 тонны, по городу и области, недорого',
+    'Требуется дальнобой на постоянную работу, опыт от 3 лет, зп высокая',
+]
+
+
+def random_keyword(rng):
+    word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+    # Примерно каждое десятое правило - составное "слово;число"
+    if rng.random() < 0.1:
+        return f"{word};{rng.randint(10, 200)}"
+    return word
+
+
+def legacy_check_keywords(keywords, text):
+    """Прежняя реализация check_keywords без логирования"""
+    found_keywords = []
+    if not text:
+        return found_keywords
+    text_lower = text.lower()
+    for keyword in keywords:
+        if ';' in keyword:
+            keyword_parts = [part.strip() for part in keyword.split(';')]
+            all_parts_found = True
+            for part in keyword_parts:
+                if part and part in text_lower:
+                    continue
+                elif part:
+                    all_parts_found = False
+                    break
+            if all_parts_found and len(keyword_parts) > 1:
+                found_keywords.append(keyword)
+        elif keyword in text_lower:
+            found_keywords.append(keyword)
+    return found_keywords
+
+
+def measure(func, messages):
+    started = time.perf_counter()
+    for text in messages:
+        func(text)
+    elapsed = time.perf_counter() - started
+    return len(messages) / elapsed if elapsed else float('inf')
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Бенчмарк поиска ключевых слов')
+    arg_parser.add_argument('--messages', type=int, default=2000, help='Количество сообщений')
+    arg_parser.add_argument('--seed', type=int, default=42)
+    args = arg_parser.parse_args()
+
+    rng = random.Random(args.seed)
+    messages = [rng.choice(MESSAGE_TEMPLATES) for _ in range(args.messages)]
+
+    print(f"{'ключей':>8} | {'сборка, мс':>10} | {'перебор, сообщ/с':>17} | {'матчер, сообщ/с':>17} | {'ускорение':>9}")
+    for count in (10, 1000, 10000):
+        keywords = ['груз', 'тандем;140', 'реф'] + [random_keyword(rng) for _ in range(count - 3)]
+
+        started = time.perf_counter()
+        matcher = KeywordMatcher(keywords)
+        build_ms = (time.perf_counter() - started) * 1000
+
+        for text in MESSAGE_TEMPLATES:
+            assert matcher.check(text) == legacy_check_keywords(keywords, text)
+
+        legacy_rate = measure(lambda text: legacy_check_keywords(keywords, text), messages)
+        matcher_rate = measure(matcher.check, messages)
+        print(f"{count:>8} | {build_ms:>10.1f} | {legacy_rate:>17.0f} | {matcher_rate:>17.0f} | {matcher_rate / legacy_rate:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
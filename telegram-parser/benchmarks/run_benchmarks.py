@@ -0,0 +1,288 @@
+"""
+Набор микробенчмарков обработки сообщения с проверкой регрессий
+Измеряет check_keywords, extract_phone_numbers, is_valid_phone_number,
+create_message_hash и get_sender_info на синтетическом корпусе объявлений
+о грузоперевозках разной длины и с разным числом ключевых слов.
+Результаты сравниваются с сохраненным baseline.json: если пропускная
+способность любого замера упала больше порога, код возврата 1.
+Сравнивается скорость относительно эталонной нагрузки, которая чередуется
+с замером, поэтому общее замедление машины (соседи по CPU,
+троттлинг) не выглядит как регрессия кода.
+
+Запуск:
+    python benchmarks/run_benchmarks.py                  # сравнение с baseline
+    python benchmarks/run_benchmarks.py --save-baseline  # записать новый baseline
+    python benchmarks/run_benchmarks.py --threshold 0.3 --only phone
+
+baseline снимается на той же версии Python, что в Dockerfile (3.10);
+на другой версии сравнение не выполняется (код возврата 2)
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import text_processing
+from keyword_matcher import KeywordMatcher
+
+DEFAULT_BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+DEFAULT_THRESHOLD = 0.2
+
+KEYWORD_COUNTS = (10, 100, 1000)
+# Целевая длина сообщения в символах
+MESSAGE_LENGTHS = {'short': 80, 'medium': 400, 'long': 2000}
+
+CITIES = ['Алматы', 'Астана', 'Шымкент', 'Караганда', 'Актобе', 'Павлодар', 'Костанай', 'Атырау',
+          'Москва', 'Екатеринбург', 'Новосибирск', 'Ташкент', 'Бишкек', 'Оренбург', 'Омск']
+VEHICLES = ['фура', 'тандем', 'реф', 'газель', 'трал', 'шаланда', 'изотерм', 'тент', 'манипулятор', 'самосвал']
+CARGO = ['паллеты', 'стройматериалы', 'зерно', 'металлопрокат', 'бытовая техника', 'овощи', 'мебель',
+         'цемент в мешках', 'сборный груз', 'оборудование', 'мука', 'напитки']
+PHRASES = [
+    'Нужна {vehicle} {tons} тонн {src} - {dst}, груз {cargo}, срочно!',
+    'Ищу {vehicle} {volume} куб на завтра, загрузка в {src}, оплата нал.',
+    'Реф до -18, {pallets} паллет, {src} - {dst}. Ставка {price} тг',
+    'Свободная {vehicle} {tons} тонн, по городу {src} и области, недорого',
+    'Требуется водитель на {vehicle}, рейсы {src} - {dst}, зп от {price}',
+    'Груз {cargo} {tons} т из {src} в {dst}, погрузка {day}, оплата по факту {price} руб',
+    'Попутный груз до {dst}, {vehicle} {volume} м3, выезд {day}',
+]
+CONTACTS = [
+    'Звоните +7 701 {a} {b} {c}',
+    'тел. 8 777 {a} {b} {c}',
+    'WhatsApp +7{d}',
+    'пишите в лс',
+    'цена {price}, торг',
+]
+DAYS = ['сегодня', 'завтра', 'в понедельник', 'до пятницы', '15 числа']
+
+SYLLABLES = ['гру', 'з', 'та', 'ндем', 'ре', 'ф', 'ку', 'зов', 'тон', 'на', 'ма', 'шин', 'ка',
+             'ав', 'то', 'воз', 'дал', 'ьно', 'бой', 'сроч', 'но', 'пал', 'лет', 'ы', 'ал', 'ма']
+
+PHONE_CANDIDATES = ['+7 701 123 45 67', '87771234567', '+77011234567', '8 777 765 43 21',
+                    '+996 555 123 456', '150000', '0123456789', '1200', '+12345', '999-999-9999']
+
+
+def random_phrase(rng):
+    return rng.choice(PHRASES).format(
+        vehicle=rng.choice(VEHICLES), cargo=rng.choice(CARGO), src=rng.choice(CITIES), dst=rng.choice(CITIES),
+        tons=rng.randint(1, 25), volume=rng.choice([20, 40, 82, 90, 120, 140]), pallets=rng.randint(4, 33),
+        price=rng.randint(50, 900) * 1000, day=rng.choice(DAYS)
+    )
+
+
+def random_contact(rng):
+    return rng.choice(CONTACTS).format(
+        a=rng.randint(100, 999), b=rng.randint(10, 99), c=rng.randint(10, 99),
+        d=rng.randint(7000000000, 7799999999), price=rng.randint(50, 900) * 1000
+    )
+
+
+def build_messages(rng, target_length, count):
+    """Сообщения из фраз объявлений примерно заданной длины, с контактами"""
+    messages = []
+    for _ in range(count):
+        parts = [random_phrase(rng)]
+        while sum(len(part) + 1 for part in parts) < target_length:
+            parts.append(random_phrase(rng) if rng.random() < 0.8 else random_contact(rng))
+        parts.append(random_contact(rng))
+        messages.append(' '.join(parts))
+    return messages
+
+
+def build_keywords(rng, count):
+    """Реальные слова из корпуса плюс случайные; каждое десятое - составное"""
+    keywords = ['груз', 'тандем;140', 'реф', 'фура', 'алматы;астана']
+    while len(keywords) < count:
+        word = ''.join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4)))
+        keywords.append(f"{word};{rng.randint(10, 200)}" if rng.random() < 0.1 else word)
+    return keywords[:count]
+
+
+def build_senders(rng, count):
+    senders = []
+    for i in range(count):
+        sender = types.SimpleNamespace(
+            username=f"driver_{i}" if rng.random() < 0.7 else None,
+            first_name=rng.choice(['Ерлан', 'Иван', 'Айгуль', 'Сергей', None]),
+            last_name=rng.choice(['Петров', 'Сейткали', None])
+        )
+        senders.append(types.SimpleNamespace(sender_id=100000 + i, sender=sender if rng.random() < 0.95 else None))
+    return senders
+
+
+def measure_once(func, items, min_time):
+    """Операций в секунду: корпус прогоняется целиком, пока не наберется min_time секунд"""
+    operations = 0
+    started = time.perf_counter()
+    while True:
+        for item in items:
+            func(item)
+        operations += len(items)
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time:
+            return operations / elapsed
+
+
+def measure(func, items, reference_items, repeat, min_time):
+    """(лучшие операций/с, медиана отношения к эталонной нагрузке)
+
+    Эталон и замер чередуются попарно: соседние по времени прогоны одинаково
+    страдают от чужой нагрузки на CPU, и их отношение от нее почти не зависит.
+    Сборщик мусора на время замера выключен
+    """
+    rates = []
+    ratios = []
+    gc_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            reference = measure_once(reference_work, reference_items, min_time)
+            rate = measure_once(func, items, min_time)
+            rates.append(rate)
+            ratios.append(rate / reference)
+    finally:
+        if gc_enabled:
+            gc.enable()
+    return max(rates), statistics.median(ratios)
+
+
+def reference_work(text):
+    """Эталонная нагрузка на чистом Python: разбиение, регистр, словарь"""
+    return len({word: len(word) for word in text.lower().split()})
+
+
+def build_cases(rng, messages_per_case):
+    """Замеры: имя -> (функция, входные данные)"""
+    cases = {}
+    corpora = {name: build_messages(rng, length, messages_per_case) for name, length in MESSAGE_LENGTHS.items()}
+
+    for count in KEYWORD_COUNTS:
+        matcher = KeywordMatcher(build_keywords(rng, count))
+        for name, messages in corpora.items():
+            # Тот же код, что вызывает TelegramParser.check_keywords
+            cases[f"check_keywords[kw={count},len={name}]"] = (
+                lambda text, matcher=matcher: text_processing.find_keywords(text, matcher), messages
+            )
+
+    for name, messages in corpora.items():
+        cases[f"extract_phone_numbers[len={name}]"] = (text_processing.extract_phone_numbers, messages)
+    for name, messages in corpora.items():
+        cases[f"create_message_hash[len={name}]"] = (
+            lambda text: text_processing.create_message_hash(text, '123456789'), messages
+        )
+
+    cases['reference'] = (reference_work, corpora['medium'])
+    candidates = [rng.choice(PHONE_CANDIDATES) for _ in range(messages_per_case * 4)]
+    cases['is_valid_phone_number'] = (text_processing.is_valid_phone_number, candidates)
+    cases['get_sender_info'] = (text_processing.sender_info, build_senders(rng, messages_per_case * 4))
+    return cases
+
+
+def python_series(version):
+    """'3.10.13' -> '3.10'"""
+    return '.'.join(str(version).split('.')[:2])
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    data = {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': f"{platform.system()} {platform.machine()}",
+        'ops_per_second': {name: round(rate, 1) for name, (rate, _) in results.items()},
+        'relative': {name: round(score, 6) for name, (_, score) in results.items()}
+    }
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+    os.replace(temp_path, path)
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description='Микробенчмарки обработки сообщений')
+    arg_parser.add_argument('--messages', type=int, default=500, help='Сообщений в каждом корпусе')
+    arg_parser.add_argument('--repeat', type=int, default=7, help='Попыток на замер, берется лучшая')
+    arg_parser.add_argument('--min-time', type=float, default=0.03, help='Минимальная длительность попытки, с')
+    arg_parser.add_argument('--seed', type=int, default=42)
+    arg_parser.add_argument('--baseline', default=DEFAULT_BASELINE_PATH)
+    arg_parser.add_argument('--save-baseline', action='store_true', help='Записать результаты как новый baseline')
+    arg_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='Допустимое падение пропускной способности (0.2 = 20%%)')
+    arg_parser.add_argument('--retries', type=int, default=2, help='Перезамеров при подозрении на регрессию')
+    arg_parser.add_argument('--only', help='Запускать только замеры, содержащие подстроку')
+    args = arg_parser.parse_args()
+
+    cases = build_cases(random.Random(args.seed), args.messages)
+    _, reference_items = cases.pop('reference')
+    if args.only:
+        cases = {name: case for name, case in cases.items() if args.only in name}
+
+    baseline = None if args.save_baseline else load_baseline(args.baseline)
+    expected = baseline['relative'] if baseline else {}
+    expected_rates = baseline['ops_per_second'] if baseline else {}
+
+    def run_case(func, items):
+        return measure(func, items, reference_items, args.repeat, args.min_time)
+    if baseline and python_series(baseline.get('python')) != python_series(platform.python_version()):
+        # Между версиями интерпретатора скорость меняется сильнее порога
+        print(
+            f"❌ baseline снят на Python {baseline.get('python')}, сейчас {platform.python_version()}: "
+            f"запустите на той же версии, что в Dockerfile, или перезапишите baseline (--save-baseline)"
+        )
+        return 2
+
+    results = {}
+    regressions = []
+    print(f"{'замер':<42} | {'операций/с':>12} | {'baseline':>12} | {'изменение':>9}")
+    for name, (func, items) in cases.items():
+        rate, score = run_case(func, items)
+        base = expected.get(name)
+        # Провал засчитывается, только если он повторился во всех перезамерах
+        for _ in range(args.retries):
+            if not base or score / base - 1 >= -args.threshold:
+                break
+            retry_rate, retry_score = run_case(func, items)
+            if retry_score > score:
+                rate, score = retry_rate, retry_score
+        results[name] = (rate, score)
+        if base:
+            change = score / base - 1
+            mark = ''
+            if change < -args.threshold:
+                regressions.append(name)
+                mark = ' ❌'
+            print(f"{name:<42} | {rate:>12.0f} | {expected_rates.get(name, 0):>12.0f} | {change:>+8.1%}{mark}")
+        else:
+            print(f"{name:<42} | {rate:>12.0f} | {'-':>12} | {'-':>9}")
+
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"✅ baseline сохранен: {args.baseline}")
+        return 0
+    if baseline is None:
+        print(f"ℹ️ baseline не найден ({args.baseline}), запустите с --save-baseline")
+        return 0
+    if regressions:
+        print(f"❌ Регрессия больше {args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print(f"✅ Регрессий больше {args.threshold:.0%} нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
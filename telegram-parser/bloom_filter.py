@@ -0,0 +1,140 @@
+"""
+Ротируемый фильтр Блума для окна дедупликации
+Набор почасовых фильтров фиксированного размера, покрывающих последние 24 часа.
+Точный промах фильтра означает, что хеша за окно не было и проверку
+дубликата можно пропустить
+"""
+
+import hashlib
+import math
+import time
+
+DEFAULT_WINDOW_SECONDS = 24 * 60 * 60
+DEFAULT_BUCKET_SECONDS = 60 * 60
+DEFAULT_CAPACITY_PER_BUCKET = 20000
+DEFAULT_ERROR_RATE = 0.001
+
+
+class RotatingBloomFilter:
+    """Кольцо фильтров Блума по временным корзинам
+
+    Корзин на одну больше, чем помещается в окно: запись, сделанная почти
+    24 часа назад, не должна выпасть вместе с самой старой корзиной.
+    Память выделяется один раз и не зависит от трафика
+    """
+
+    def __init__(self, window_seconds=DEFAULT_WINDOW_SECONDS, bucket_seconds=DEFAULT_BUCKET_SECONDS,
+                 capacity_per_bucket=DEFAULT_CAPACITY_PER_BUCKET, error_rate=DEFAULT_ERROR_RATE):
+        self.bucket_seconds = bucket_seconds
+        self.bucket_count = math.ceil(window_seconds / bucket_seconds) + 1
+        self.capacity_per_bucket = capacity_per_bucket
+        self.error_rate = error_rate
+
+        # Оптимальные размер фильтра и число хеш-функций для заданной емкости
+        self.bit_count = max(8, math.ceil(-capacity_per_bucket * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.bit_count / capacity_per_bucket * math.log(2)))
+
+        byte_count = (self.bit_count + 7) // 8
+        self._buckets = [bytearray(byte_count) for _ in range(self.bucket_count)]
+        self._bucket_ids = [None] * self.bucket_count  # номер корзины от начала эпохи
+        self._bucket_items = [0] * self.bucket_count
+
+        # Фильтр считается полным только после прогрева из БД
+        self.ready = False
+        self.checks = 0
+        self.definite_misses = 0
+        self.false_positives = 0
+
+    def _positions(self, message_hash):
+        """Позиции битов для хеша (двойное хеширование)"""
+        try:
+            first = int(message_hash[:16], 16)
+            second = int(message_hash[16:32], 16)
+        except ValueError:
+            digest = hashlib.sha256(message_hash.encode('utf-8')).digest()
+            first = int.from_bytes(digest[:8], 'big')
+            second = int.from_bytes(digest[8:16], 'big')
+        second |= 1
+        bit_count = self.bit_count
+        return [(first + i * second) % bit_count for i in range(self.hash_count)]
+
+    def _bucket_for(self, bucket_id):
+        """Слот корзины; чужая (старая) корзина в слоте очищается"""
+        slot = bucket_id % self.bucket_count
+        current_id = self._bucket_ids[slot]
+        if current_id != bucket_id:
+            if current_id is not None and current_id > bucket_id:
+                # Слот уже занят более новой корзиной - запись вне окна
+                return None
+            self._buckets[slot][:] = bytes(len(self._buckets[slot]))
+            self._bucket_ids[slot] = bucket_id
+            self._bucket_items[slot] = 0
+        return slot
+
+    def _live_slots(self, now):
+        """Слоты корзин, попадающих в окно"""
+        newest = int(now // self.bucket_seconds)
+        oldest = newest - self.bucket_count + 1
+        return [slot for slot, bucket_id in enumerate(self._bucket_ids)
+                if bucket_id is not None and oldest <= bucket_id <= newest]
+
+    def add(self, message_hash, timestamp=None):
+        """Добавление хеша в корзину его времени создания"""
+        now = time.time()
+        if timestamp is None or timestamp > now:
+            timestamp = now
+        bucket_id = int(timestamp // self.bucket_seconds)
+        if bucket_id <= int(now // self.bucket_seconds) - self.bucket_count:
+            return
+        slot = self._bucket_for(bucket_id)
+        if slot is None:
+            return
+        bits = self._buckets[slot]
+        for position in self._positions(message_hash):
+            bits[position >> 3] |= 1 << (position & 7)
+        self._bucket_items[slot] += 1
+
+    def might_contain(self, message_hash):
+        """False - хеша точно не было за окно, True - возможно был"""
+        self.checks += 1
+        positions = self._positions(message_hash)
+        for slot in self._live_slots(time.time()):
+            bits = self._buckets[slot]
+            if all(bits[position >> 3] & (1 << (position & 7)) for position in positions):
+                return True
+        self.definite_misses += 1
+        return False
+
+    def record_false_positive(self):
+        """Фильтр ответил 'возможно', а точная проверка дубликат не нашла"""
+        self.false_positives += 1
+
+    def estimated_false_positive_rate(self):
+        """Оценка вероятности ложного срабатывания по заполненности корзин"""
+        miss_probability = 1.0
+        for slot in self._live_slots(time.time()):
+            items = self._bucket_items[slot]
+            bucket_rate = (1 - math.exp(-self.hash_count * items / self.bit_count)) ** self.hash_count
+            miss_probability *= 1 - bucket_rate
+        return 1 - miss_probability
+
+    def memory_bytes(self):
+        """Память, занятая битовыми массивами"""
+        return sum(len(bits) for bits in self._buckets)
+
+    def get_stats(self):
+        """Статистика фильтра для TelegramParser.get_stats"""
+        # Ложные срабатывания среди сообщений, которых не было за окно
+        negatives = self.definite_misses + self.false_positives
+        return {
+            'ready': self.ready,
+            'buckets': self.bucket_count,
+            'bucket_seconds': self.bucket_seconds,
+            'items': sum(self._bucket_items[slot] for slot in self._live_slots(time.time())),
+            'memory_bytes': self.memory_bytes(),
+            'checks': self.checks,
+            'definite_misses': self.definite_misses,
+            'false_positives': self.false_positives,
+            'observed_false_positive_rate': self.false_positives / negatives if negatives else 0.0,
+            'estimated_false_positive_rate': self.estimated_false_positive_rate()
+        }
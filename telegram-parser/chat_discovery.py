@@ -0,0 +1,131 @@
+"""
+Потоковая выгрузка чатов пользователя в all_chats
+Диалоги читаются по мере получения от Telegram, сравниваются с сохраненным
+отпечатком (название, тип, число участников) и в all_chats пишутся только
+новые или изменившиеся чаты, пакетами ограниченного размера
+"""
+
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_FINGERPRINTS_PATH = os.path.join('cache', 'chat_fingerprints.json')
+DEFAULT_CHUNK_SIZE = 200
+
+
+def dialog_type(dialog):
+    """Тип диалога для отпечатка: channel, megagroup или group"""
+    if dialog.is_channel:
+        return 'megagroup' if dialog.is_group else 'channel'
+    return 'group'
+
+
+def dialog_fingerprint(dialog):
+    """Отпечаток чата: меняется при смене названия, типа или числа участников"""
+    participants = getattr(dialog.entity, 'participants_count', None)
+    return [dialog.name or '', dialog_type(dialog), participants]
+
+
+class ChatFingerprintStore:
+    """Отпечатки уже записанных в all_chats чатов, сохраняются на диск"""
+
+    def __init__(self, path=DEFAULT_FINGERPRINTS_PATH):
+        self.path = path
+        self._fingerprints = {}
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    self._fingerprints = json.load(file).get('chats', {})
+            except Exception as e:
+                logger.warning(f"ЧАТЫ: Не удалось прочитать отпечатки {path}: {e}")
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def is_changed(self, chat_id, fingerprint):
+        return self._fingerprints.get(chat_id) != fingerprint
+
+    def update(self, fingerprints):
+        """Запоминание отпечатков записанных чатов и сохранение на диск"""
+        self._fingerprints.update(fingerprints)
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': 1, 'chats': self._fingerprints}, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.warning(f"ЧАТЫ: Не удалось сохранить отпечатки {self.path}: {e}")
+
+
+class ChatDiscovery:
+    """Выгрузка групп и каналов в all_chats с пропуском неизменившихся
+
+    upsert_rows - корутина (rows) для записи пакета строк all_chats
+    """
+
+    def __init__(self, upsert_rows, fingerprints_path=DEFAULT_FINGERPRINTS_PATH, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.upsert_rows = upsert_rows
+        self.store = ChatFingerprintStore(fingerprints_path)
+        self.chunk_size = chunk_size
+        self.last_run = None
+
+    async def _flush(self, rows, fingerprints, stats):
+        await self.upsert_rows(rows)
+        # Отпечатки сохраняются только после успешной записи: при ошибке
+        # эти чаты будут записаны при следующем запуске
+        self.store.update(fingerprints)
+        stats['upserted'] += len(rows)
+        stats['chunks'] += 1
+        logger.debug(f"ЧАТЫ: Записан пакет из {len(rows)} чатов: {[row['chat_name'] for row in rows]}")
+
+    async def run(self, dialogs, full_refresh=False):
+        """Обход асинхронного итератора диалогов; full_refresh игнорирует отпечатки"""
+        started = time.perf_counter()
+        stats = {'seen': 0, 'changed': 0, 'upserted': 0, 'chunks': 0, 'failed_chunks': 0}
+        rows = []
+        fingerprints = {}
+
+        async for dialog in dialogs:
+            if not (dialog.is_group or dialog.is_channel):
+                continue
+            stats['seen'] += 1
+            chat_id = str(dialog.id)
+            fingerprint = dialog_fingerprint(dialog)
+            if not full_refresh and not self.store.is_changed(chat_id, fingerprint):
+                continue
+            stats['changed'] += 1
+            rows.append({
+                'chat_id': chat_id,
+                'chat_name': dialog.name or chat_id,
+                'active': True,
+                'created_at': datetime.now().isoformat()
+            })
+            fingerprints[chat_id] = fingerprint
+            if len(rows) >= self.chunk_size:
+                try:
+                    await self._flush(rows, fingerprints, stats)
+                except Exception as e:
+                    stats['failed_chunks'] += 1
+                    logger.error(f"ЧАТЫ: Ошибка записи пакета из {len(rows)} чатов: {e}")
+                rows, fingerprints = [], {}
+
+        if rows:
+            try:
+                await self._flush(rows, fingerprints, stats)
+            except Exception as e:
+                stats['failed_chunks'] += 1
+                logger.error(f"ЧАТЫ: Ошибка записи пакета из {len(rows)} чатов: {e}")
+
+        stats['duration_seconds'] = round(time.perf_counter() - started, 2)
+        self.last_run = stats
+        return stats
+
+    def get_stats(self):
+        return {'known_chats': len(self.store), 'last_run': self.last_run}
@@ -0,0 +1,147 @@
+"""
+Дополнение списка чатов числом участников
+У каналов и супергрупп participants_count в dialog.entity часто отсутствует,
+его дает только запрос полной информации о чате. Такие запросы выполняются
+параллельно с ограничением темпа, а результаты кешируются по id чата
+с долгим TTL, поэтому каждый вызов списка дозапрашивает только то,
+чего нет в кеше, и укладывается в ограниченное время.
+Используется списком чатов дашборда (chat_list_service.py) и
+backend/telegram_api.py
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from telethon.errors import FloodWaitError
+from telethon.tl.functions.channels import GetFullChannelRequest
+from telethon.tl.functions.messages import GetFullChatRequest
+from telethon.tl.types import Channel, InputPeerChannel, InputPeerChat
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join('cache', 'chat_participants.json')
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class ParticipantCountEnricher:
+    """Кеш числа участников с параллельным дозапросом недостающих"""
+
+    def __init__(self, cache_path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_concurrency=4, rate_per_second=5.0, time_budget=10.0):
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.time_budget = time_budget
+        self._cache = {}
+        self._next_request_at = 0.0
+        self._rate_lock = asyncio.Lock()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                self._cache = json.load(file).get('chats', {})
+        except Exception as e:
+            logger.warning(f"ЧАТЫ: Не удалось прочитать кеш участников {self.cache_path}: {e}")
+
+    def _save(self):
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': 1, 'chats': self._cache}, file)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"ЧАТЫ: Не удалось сохранить кеш участников {self.cache_path}: {e}")
+
+    def _cached(self, chat_id):
+        entry = self._cache.get(chat_id)
+        if entry and time.time() - entry['fetched_at'] < self.ttl_seconds:
+            return entry['participants_count']
+        return None
+
+    def apply(self, chats):
+        """Подстановка чисел из кеша; возвращает id чатов, которых в кеше нет"""
+        missing = []
+        for chat in chats:
+            count = self._cached(chat['id'])
+            if count is not None:
+                chat['participantsCount'] = count
+            elif not chat.get('participantsCount'):
+                missing.append(chat['id'])
+        return missing
+
+    async def _wait_rate(self):
+        # Запросы разнесены не чаще rate_per_second в секунду
+        async with self._rate_lock:
+            delay = self._next_request_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_request_at = max(self._next_request_at, time.monotonic()) + 1 / self.rate_per_second
+
+    async def _fetch_count(self, client, chat_id, entity):
+        await self._wait_rate()
+        if entity is None:
+            # Сущность из кеша сессии Telethon: диалог только что выгружался
+            entity = await client.get_input_entity(int(chat_id))
+        if isinstance(entity, (Channel, InputPeerChannel)):
+            full = await client(GetFullChannelRequest(entity))
+            return full.full_chat.participants_count
+        full = await client(GetFullChatRequest(entity.chat_id if isinstance(entity, InputPeerChat) else entity.id))
+        participants = getattr(full.full_chat.participants, 'participants', None)
+        return len(participants) if participants is not None else None
+
+    async def enrich(self, client, chats, entities=None):
+        """Дозапрос недостающих чисел участников в пределах time_budget секунд
+
+        entities - словарь id чата -> entity из диалога; без него сущности
+        берутся из кеша сессии клиента. Числа подставляются в chats на месте
+        """
+        missing = self.apply(chats)
+        if entities is not None:
+            missing = [chat_id for chat_id in missing if chat_id in entities]
+        if not missing:
+            return chats
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        flood_wait = asyncio.Event()
+
+        async def fetch(chat_id):
+            async with semaphore:
+                if flood_wait.is_set():
+                    return
+                try:
+                    count = await self._fetch_count(client, chat_id, (entities or {}).get(chat_id))
+                except FloodWaitError as e:
+                    # Остаток дозапросим при следующем вызове списка
+                    logger.warning(f"ЧАТЫ: FloodWait {e.seconds} с, дополнение чатов прервано")
+                    flood_wait.set()
+                    return
+                except Exception as e:
+                    logger.warning(f"ЧАТЫ: Нет данных о чате {chat_id}: {e}")
+                    return
+                if count is not None:
+                    self._cache[chat_id] = {'participants_count': count, 'fetched_at': time.time()}
+
+        started = time.perf_counter()
+        tasks = [asyncio.ensure_future(fetch(chat_id)) for chat_id in missing]
+        done, pending = await asyncio.wait(tasks, timeout=self.time_budget)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        self._save()
+        self.apply(chats)
+        logger.info(
+            f"ЧАТЫ: Дополнено {len(missing) - len(pending)} из {len(missing)} чатов "
+            f"за {time.perf_counter() - started:.1f} с"
+        )
+        return chats
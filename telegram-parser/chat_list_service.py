@@ -0,0 +1,131 @@
+"""
+Сервис списка чатов Telegram поверх постоянного подключения
+Один подключенный клиент отдает список диалогов в JSON через локальный
+канал управления (control_server.py) - в процессе парсера или в отдельном
+режиме get_chats.py --serve. Запрос списка не запускает новый процесс
+и не открывает файл сессии повторно.
+Со снимком (dialog_snapshot.py) список отдается сразу из снимка, а
+досинхронизация идет в фоне. Число участников каналов и супергрупп, которого
+нет в диалогах, дополняется из кеша chat_enrichment.py при каждой выгрузке
+"""
+
+import asyncio
+import json
+import logging
+import time
+import urllib.request
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVICE_URL = 'http://127.0.0.1:8765'
+DEFAULT_CLIENT_TIMEOUT = 2.0
+# Досинхронизация снимка не чаще, чем раз в столько секунд
+REVALIDATE_INTERVAL = 30
+
+
+def dialog_info(dialog):
+    """Описание группы или канала в формате get_chats.py"""
+    return {
+        'id': str(dialog.id),
+        'title': dialog.title,
+        'participantsCount': getattr(dialog.entity, 'participants_count', 0),
+        'type': 'channel' if dialog.is_channel else 'supergroup',
+        'accessible': True,
+        'username': getattr(dialog.entity, 'username', None)
+    }
+
+
+class ChatListService:
+    """Список групп и каналов подключенного клиента; одновременные запросы делят одну выгрузку
+
+    snapshot - необязательный DialogSnapshot для мгновенных ответов,
+    enricher - необязательный ParticipantCountEnricher для числа участников
+    """
+
+    def __init__(self, client, snapshot=None, enricher=None):
+        self.client = client
+        self.snapshot = snapshot
+        self.enricher = enricher
+        self._inflight = None
+        self._last_revalidation = 0.0
+        self.requests = 0
+        self.snapshot_hits = 0
+        self.fetches = 0
+        self.last_fetch_seconds = None
+
+    async def _fetch(self, full):
+        started = time.perf_counter()
+        if self.snapshot is not None:
+            chats = await self.snapshot.refresh(self.client, full=full)
+        else:
+            chats = [
+                dialog_info(dialog)
+                async for dialog in self.client.iter_dialogs()
+                if dialog.is_group or dialog.is_channel
+            ]
+        if self.enricher is not None:
+            await self.enricher.enrich(self.client, chats)
+            if self.snapshot is not None:
+                # Дополненные числа сохраняются, чтобы ответы из снимка были точными
+                self.snapshot.save()
+        self.fetches += 1
+        self.last_fetch_seconds = round(time.perf_counter() - started, 3)
+        logger.info(f"ЧАТЫ: Получено {len(chats)} чатов/каналов за {self.last_fetch_seconds} с")
+        return chats
+
+    def _log_background_error(self, task):
+        if not task.cancelled() and task.exception():
+            logger.error(f"ЧАТЫ: Ошибка досинхронизации снимка: {task.exception()}")
+
+    def _start_fetch(self, full=False):
+        if self._inflight is None or self._inflight.done():
+            self._inflight = asyncio.ensure_future(self._fetch(full))
+            self._inflight.add_done_callback(self._log_background_error)
+        return self._inflight
+
+    async def dialogs(self, refresh=False):
+        """Список чатов; refresh=True - полная выгрузка мимо снимка"""
+        self.requests += 1
+        if not refresh and self.snapshot is not None and self.snapshot.is_fresh():
+            self.snapshot_hits += 1
+            now = time.monotonic()
+            if now - self._last_revalidation >= REVALIDATE_INTERVAL:
+                self._last_revalidation = now
+                self._start_fetch()
+            return self.snapshot.chats
+
+        if refresh and self._inflight is not None and not self._inflight.done():
+            # Идущая досинхронизация может быть неполной - дожидаемся ее и выгружаем заново
+            await asyncio.wait([self._inflight])
+        # shield: отмена одного запроса не прерывает выгрузку для остальных
+        return await asyncio.shield(self._start_fetch(full=refresh))
+
+    async def handle_dialogs(self, params):
+        """Команда GET /dialogs канала управления (refresh=1 - полная выгрузка)"""
+        refresh = str(params.get('refresh', '')).lower() in ('1', 'true', 'yes')
+        return 200, await self.dialogs(refresh)
+
+    def get_stats(self):
+        stats = {
+            'requests': self.requests,
+            'snapshot_hits': self.snapshot_hits,
+            'fetches': self.fetches,
+            'last_fetch_seconds': self.last_fetch_seconds
+        }
+        if self.snapshot is not None:
+            stats['snapshot'] = self.snapshot.get_stats()
+        return stats
+
+
+def fetch_from_service(url=DEFAULT_SERVICE_URL, token=None, timeout=DEFAULT_CLIENT_TIMEOUT, refresh=False):
+    """Список чатов из запущенного сервиса; None если сервис недоступен"""
+    query = '?refresh=1' if refresh else ''
+    request = urllib.request.Request(f"{url.rstrip('/')}/dialogs{query}")
+    if token:
+        request.add_header('X-Control-Token', token)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return json.loads(response.read().decode('utf-8'))
+    except Exception as e:
+        logger.info(f"ЧАТЫ: Сервис списка чатов недоступен ({url}): {e}")
+        return None
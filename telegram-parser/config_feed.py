@@ -0,0 +1,218 @@
+"""
+Поток изменений конфигурации парсера (ключевые слова, чаты, получатели)
+Правки из дашборда приходят через Postgres LISTEN/NOTIFY (триггер из
+sql/config_change_notify.sql) и применяются к таблицам в памяти по одной
+строке, без повторной выгрузки таблиц целиком.
+LocalConfigFeed - замена без базы данных для локального запуска и проверок
+"""
+
+import asyncio
+import json
+import logging
+
+try:
+    import asyncpg
+except ImportError:
+    asyncpg = None
+
+logger = logging.getLogger(__name__)
+
+CONFIG_CHANNEL = 'config_changes'
+
+# Ключ строки в каждой таблице конфигурации
+TABLE_KEYS = {
+    'keywords': 'id',
+    'monitored_chats': 'chat_id',
+    'recipient_categories': 'id'
+}
+
+HEALTH_CHECK_INTERVAL = 30
+MAX_RECONNECT_DELAY = 60
+
+
+class ConfigTables:
+    """Активные строки таблиц конфигурации в памяти: таблица -> ключ -> строка"""
+
+    def __init__(self):
+        self._tables = {table: {} for table in TABLE_KEYS}
+
+    def load(self, table, rows):
+        """Полная замена содержимого таблицы (начальная загрузка или ресинхронизация)"""
+        key_column = TABLE_KEYS[table]
+        self._tables[table] = {
+            str(row[key_column]): row
+            for row in rows
+            if row.get(key_column) is not None and row.get('active', True)
+        }
+
+    def rows(self, table):
+        return list(self._tables[table].values())
+
+    def snapshot(self):
+        """Все таблицы {имя: строки} для локального снимка"""
+        return {table: list(rows.values()) for table, rows in self._tables.items()}
+
+    def apply(self, change):
+        """Применение одного изменения; возвращает имя таблицы, если что-то поменялось"""
+        table = change.get('table')
+        if table not in TABLE_KEYS:
+            return None
+        key_column = TABLE_KEYS[table]
+        rows = self._tables[table]
+        new_row = change.get('row')
+        old_row = change.get('old')
+
+        changed = False
+        # При смене ключа (например, chat_id) старая запись удаляется
+        if old_row and old_row.get(key_column) is not None:
+            old_key = str(old_row[key_column])
+            if change.get('op') == 'DELETE' or not new_row or str(new_row.get(key_column)) != old_key:
+                changed = rows.pop(old_key, None) is not None
+        if change.get('op') != 'DELETE' and new_row and new_row.get(key_column) is not None:
+            key = str(new_row[key_column])
+            if new_row.get('active', True):
+                if rows.get(key) != new_row:
+                    rows[key] = new_row
+                    changed = True
+            elif rows.pop(key, None) is not None:
+                # Строку выключили в дашборде - убираем ее из конфигурации
+                changed = True
+        return table if changed else None
+
+    def get_stats(self):
+        return {table: len(rows) for table, rows in self._tables.items()}
+
+
+class LocalConfigFeed:
+    """Поток изменений без базы данных: изменения публикуются вызовом publish"""
+
+    connected = False
+
+    def __init__(self, on_change):
+        self.on_change = on_change
+        self.received = 0
+
+    async def start(self):
+        logger.info("КОНФИГ: Поток изменений БД не настроен, используется локальный (DATABASE_URL не задан)")
+
+    def publish(self, change):
+        self.received += 1
+        self.on_change(change)
+
+    async def stop(self):
+        pass
+
+    def get_stats(self):
+        return {'type': 'local', 'connected': self.connected, 'received': self.received}
+
+
+class PostgresConfigFeed:
+    """Подписка LISTEN на канал изменений конфигурации с автоматическим переподключением
+
+    on_change - функция (change) для каждого уведомления
+    on_resync - корутина полной перезагрузки; вызывается после каждой успешной
+    подписки, включая первую: правки, сделанные до подписки (между загрузкой
+    конфигурации и start) или во время разрыва, уведомлениями не придут.
+    Уведомления, пришедшие во время перезагрузки, откладываются и применяются
+    после нее по порядку, иначе загруженные таблицы затерли бы эти правки
+    Нужно прямое (session) подключение к Postgres: пулер в режиме transaction
+    не поддерживает LISTEN
+    """
+
+    def __init__(self, dsn, on_change, on_resync, channel=CONFIG_CHANNEL):
+        if asyncpg is None:
+            raise RuntimeError("Для потока изменений конфигурации нужен пакет asyncpg")
+        self.dsn = dsn
+        self.on_change = on_change
+        self.on_resync = on_resync
+        self.channel = channel
+        self.connected = False
+        self._task = None
+        self._deferred = None  # уведомления во время on_resync
+        self.received = 0
+        self.errors = 0
+        self.reconnects = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    def _on_notify(self, connection, pid, channel, payload):
+        self.received += 1
+        if self._deferred is not None:
+            self._deferred.append(payload)
+            return
+        self._apply(payload)
+
+    def _apply(self, payload):
+        try:
+            self.on_change(json.loads(payload))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"КОНФИГ: Ошибка применения изменения: {e}")
+
+    async def _resync(self):
+        """Полная перезагрузка с отложенным применением уведомлений, пришедших во время нее"""
+        self._deferred = []
+        try:
+            await self.on_resync()
+        finally:
+            deferred, self._deferred = self._deferred, None
+            if deferred:
+                logger.info(f"КОНФИГ: Применяем {len(deferred)} изменений, пришедших во время перезагрузки")
+            for payload in deferred:
+                self._apply(payload)
+
+    async def _listen(self, connection):
+        """Ожидание разрыва соединения с периодической проверкой"""
+        closed = asyncio.Event()
+        connection.add_termination_listener(lambda _: closed.set())
+        while not closed.is_set():
+            try:
+                await asyncio.wait_for(closed.wait(), HEALTH_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                await connection.execute('SELECT 1')
+
+    async def _run(self):
+        delay = 1
+        first = True
+        while True:
+            connection = None
+            try:
+                connection = await asyncpg.connect(self.dsn)
+                await connection.add_listener(self.channel, self._on_notify)
+                self.connected = True
+                delay = 1
+                logger.info(f"КОНФИГ: Подписка на канал {self.channel} активна")
+                if not first:
+                    self.reconnects += 1
+                first = False
+                await self._resync()
+                await self._listen(connection)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.errors += 1
+                logger.warning(f"КОНФИГ: Потеряно соединение с потоком изменений: {e}")
+            finally:
+                self.connected = False
+                if connection is not None and not connection.is_closed():
+                    connection.terminate()
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get_stats(self):
+        return {
+            'type': 'postgres',
+            'channel': self.channel,
+            'connected': self.connected,
+            'received': self.received,
+            'errors': self.errors,
+            'reconnects': self.reconnects
+        }
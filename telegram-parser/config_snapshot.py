@@ -0,0 +1,86 @@
+"""
+Локальный снимок конфигурации парсера в SQLite
+Последние известные строки keywords, monitored_chats и recipient_categories
+(из них строятся матчер и маршрутизация) читаются при запуске за миллисекунды,
+поэтому мониторинг стартует с рабочей конфигурацией даже при недоступной БД
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = os.path.join('cache', 'config_snapshot.sqlite3')
+SNAPSHOT_VERSION = 1
+
+
+class ConfigSnapshot:
+    """Снимок таблиц конфигурации: одна строка SQLite на таблицу"""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH):
+        self.path = path
+        self.saved_at = None
+        self.saves = 0
+
+    def _connect(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path)
+        connection.execute(
+            'CREATE TABLE IF NOT EXISTS config_tables ('
+            'name TEXT PRIMARY KEY, version INTEGER NOT NULL, rows TEXT NOT NULL, updated_at REAL NOT NULL)'
+        )
+        return connection
+
+    def load(self):
+        """Таблицы снимка {имя: строки}; пустой словарь, если снимка нет"""
+        if not os.path.exists(self.path):
+            return {}
+        try:
+            connection = self._connect()
+            try:
+                records = connection.execute(
+                    'SELECT name, rows, updated_at FROM config_tables WHERE version = ?', (SNAPSHOT_VERSION,)
+                ).fetchall()
+            finally:
+                connection.close()
+            # Испорченная строка снимка не должна ронять запуск - снимок просто не используется
+            tables = {name: json.loads(rows) for name, rows, _ in records}
+        except (sqlite3.Error, ValueError, TypeError) as e:
+            logger.warning(f"КОНФИГ: Не удалось прочитать снимок {self.path}: {e}")
+            return {}
+        if records:
+            self.saved_at = max(updated_at for _, _, updated_at in records)
+        return tables
+
+    def save(self, tables):
+        """Запись всех таблиц одной транзакцией"""
+        now = time.time()
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    connection.executemany(
+                        'INSERT OR REPLACE INTO config_tables (name, version, rows, updated_at) VALUES (?, ?, ?, ?)',
+                        [
+                            (name, SNAPSHOT_VERSION, json.dumps(rows, ensure_ascii=False, default=str), now)
+                            for name, rows in tables.items()
+                        ]
+                    )
+            finally:
+                connection.close()
+            self.saved_at = now
+            self.saves += 1
+        except sqlite3.Error as e:
+            logger.warning(f"КОНФИГ: Не удалось сохранить снимок {self.path}: {e}")
+
+    def get_stats(self):
+        return {
+            'path': self.path,
+            'saves': self.saves,
+            'age_seconds': round(time.time() - self.saved_at) if self.saved_at else None
+        }
@@ -0,0 +1,149 @@
+"""
+Локальный канал управления работающим парсером
+Минимальный HTTP-сервер на loopback-адресе: backend отправляет команды
+(discover-chats, reload-config, backfill, stats) прямо в процесс парсера,
+и они выполняются параллельно с мониторингом, без переподключения клиента
+"""
+
+import asyncio
+import json
+import logging
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_SIZE = 64 * 1024
+READ_TIMEOUT = 10
+
+HTTP_REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    409: 'Conflict',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error'
+}
+
+
+class ControlError(Exception):
+    """Ошибка команды с HTTP-статусом ответа"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class ControlServer:
+    """HTTP-сервер команд: путь -> (метод, корутина(params) -> (статус, ответ))
+
+    params - параметры строки запроса, дополненные JSON-телом запроса;
+    ответ-строка отдается как text/plain (формат Prometheus), остальное - JSON
+    """
+
+    def __init__(self, host=DEFAULT_HOST, port=DEFAULT_PORT, token=None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self._commands = {}
+        self._server = None
+        self.requests = 0
+        self.errors = 0
+
+    def add_command(self, path, method, handler):
+        self._commands[path] = (method, handler)
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        logger.info(f"УПРАВЛЕНИЕ: Канал управления слушает http://{self.host}:{self.port}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _read_request(self, reader):
+        request_line = (await reader.readline()).decode('latin-1').strip()
+        parts = request_line.split()
+        if len(parts) != 3:
+            raise ControlError(400, 'Некорректная строка запроса')
+        method, target, _ = parts
+
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1').strip()
+            if not line:
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_SIZE:
+            raise ControlError(413, 'Слишком большое тело запроса')
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, headers, body
+
+    async def _dispatch(self, method, target, headers, body):
+        if self.token and headers.get('x-control-token') != self.token:
+            raise ControlError(401, 'Неверный токен управления')
+
+        url = urlsplit(target)
+        command = self._commands.get(url.path.rstrip('/') or '/')
+        if command is None:
+            raise ControlError(404, f"Неизвестная команда: {url.path}")
+        expected_method, handler = command
+        if method != expected_method:
+            raise ControlError(405, f"Команда {url.path} принимает только {expected_method}")
+
+        params = dict(parse_qsl(url.query))
+        if body:
+            try:
+                params.update(json.loads(body))
+            except (ValueError, TypeError):
+                raise ControlError(400, 'Тело запроса должно быть JSON-объектом')
+        return await handler(params)
+
+    async def _handle_connection(self, reader, writer):
+        self.requests += 1
+        try:
+            try:
+                method, target, headers, body = await asyncio.wait_for(self._read_request(reader), READ_TIMEOUT)
+                status, payload = await self._dispatch(method, target, headers, body)
+            except ControlError as e:
+                self.errors += 1
+                status, payload = e.status, {'status': 'error', 'message': str(e)}
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"УПРАВЛЕНИЕ: Ошибка обработки команды: {e}")
+                status, payload = 500, {'status': 'error', 'message': str(e)}
+
+            if isinstance(payload, str):
+                data = payload.encode('utf-8')
+                content_type = 'text/plain; version=0.0.4; charset=utf-8'
+            else:
+                data = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+                content_type = 'application/json; charset=utf-8'
+            writer.write(
+                f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(data)}\r\n"
+                f"Connection: close\r\n\r\n".encode('latin-1') + data
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"УПРАВЛЕНИЕ: Соединение прервано: {e}")
+        finally:
+            writer.close()
+
+    def get_stats(self):
+        return {
+            'listening': self._server is not None,
+            'address': f"{self.host}:{self.port}",
+            'requests': self.requests,
+            'errors': self.errors
+        }
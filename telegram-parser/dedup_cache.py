@@ -0,0 +1,163 @@
+"""
+Кеш дедупликации сообщений в памяти процесса
+Хранит хеш -> строка оригинального сообщения за последние 24 часа,
+чтобы не ходить в Supabase за каждым входящим сообщением
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_MAX_SIZE = 100000
+
+
+def parse_created_at(value):
+    """Время создания строки из Supabase в unix-времени (None если не разобрать)"""
+    if not value:
+        return None
+    try:
+        created_at = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    # Supabase отдает timestamp без зоны в UTC
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=timezone.utc)
+    return created_at.timestamp()
+
+
+class DuplicateCache:
+    """TTL-кеш хеш -> оригинальное сообщение с ограничением по размеру
+
+    Записи упорядочены по времени добавления: при переполнении
+    вытесняются самые старые, просроченные удаляются при обращении
+    """
+
+    def __init__(self, ttl_seconds=DEFAULT_TTL_SECONDS, max_size=DEFAULT_MAX_SIZE):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()  # hash -> (expires_at, row)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, message_hash):
+        """Оригинальное сообщение по хешу или None"""
+        entry = self._entries.get(message_hash)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, row = entry
+        if expires_at <= time.time():
+            del self._entries[message_hash]
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row
+
+    def add(self, message_hash, row):
+        """Добавление сообщения; срок жизни отсчитывается от created_at строки"""
+        now = time.time()
+        created_at = parse_created_at(row.get('created_at')) if row else None
+        expires_at = (created_at if created_at is not None else now) + self.ttl_seconds
+        if expires_at <= now:
+            return
+
+        # Первое сообщение с этим хешем остается оригиналом
+        if message_hash in self._entries:
+            return
+
+        self._entries[message_hash] = (expires_at, row)
+        self._evict(now)
+
+    def warm(self, rows):
+        """Заполнение кеша строками messages (по возрастанию created_at)"""
+        for row in rows:
+            message_hash = row.get('content_hash')
+            if message_hash:
+                self.add(message_hash, row)
+        return len(self._entries)
+
+    def _evict(self, now):
+        """Удаление просроченных записей с начала и лишних сверх max_size"""
+        entries = self._entries
+        while entries:
+            message_hash, (expires_at, _) = next(iter(entries.items()))
+            if expires_at > now and len(entries) <= self.max_size:
+                break
+            entries.popitem(last=False)
+            if expires_at > now:
+                self.evictions += 1
+
+    def get_stats(self):
+        """Статистика кеша для TelegramParser.get_stats"""
+        return {
+            'size': len(self._entries),
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions
+        }
+
+
+class PendingMessages:
+    """Хеши сообщений, которые прошли дедупликацию, но еще не записаны в БД
+
+    Обработчик резервирует хеш до проверки дубликата, и вторая копия того же
+    сообщения, пришедшая параллельно, ждет future первой вместо повторной
+    записи и рассылки. future получает строку оригинала или None, если
+    сообщение так и не было записано
+    """
+
+    def __init__(self):
+        self._entries = {}  # hash -> {'future', 'near_row', 'near_entry'}
+        self.waits = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, message_hash):
+        """future зарезервированного хеша или None"""
+        entry = self._entries.get(message_hash)
+        return entry['future'] if entry else None
+
+    def reserve(self, message_hash):
+        entry = {
+            'future': asyncio.get_running_loop().create_future(),
+            'near_row': None,
+            'near_entry': None
+        }
+        self._entries[message_hash] = entry
+        return entry
+
+    def entry(self, message_hash):
+        return self._entries.get(message_hash)
+
+    async def wait(self, message_hash):
+        """Строка оригинала для хеша в записи; None - резерва нет или запись не удалась"""
+        future = self.get(message_hash)
+        if future is None:
+            return None
+        self.waits += 1
+        return await asyncio.shield(future)
+
+    def resolve(self, message_hash, row):
+        """Снятие резерва со строкой оригинала; возвращает запись резерва или None"""
+        entry = self._entries.pop(message_hash, None)
+        if entry is not None and not entry['future'].done():
+            entry['future'].set_result(row)
+        return entry
+
+    def release(self, message_hash):
+        """Снятие резерва без записи (ошибка или отказ от сохранения)"""
+        return self.resolve(message_hash, None)
+
+    def get_stats(self):
+        return {
+            'in_flight': len(self._entries),
+            'waits': self.waits
+        }
@@ -0,0 +1,131 @@
+"""
+Снимок списка диалогов на диске
+Список групп и каналов отдается из снимка сразу, а затем досинхронизируется:
+iter_dialogs возвращает диалоги по убыванию даты последнего сообщения, поэтому
+достаточно пройти только диалоги новее верхнего сообщения снимка.
+Полная выгрузка нужна после истечения TTL или по явному запросу
+"""
+
+import json
+import logging
+import os
+import time
+
+from chat_list_service import dialog_info
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+DEFAULT_SNAPSHOT_PATH = os.path.join('cache', 'dialog_snapshot.json')
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+def dialog_timestamp(dialog):
+    return dialog.date.timestamp() if dialog.date else 0.0
+
+
+class DialogSnapshot:
+    """Версионированный снимок групп и каналов с TTL"""
+
+    def __init__(self, path=DEFAULT_SNAPSHOT_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.chats = []
+        self.created_at = None  # время последней полной выгрузки
+        self.top_message_date = None
+        self.full_refreshes = 0
+        self.incremental_refreshes = 0
+        self.load()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            if data.get('version') != SNAPSHOT_VERSION:
+                logger.info(f"ЧАТЫ: Снимок {self.path} другой версии, будет выгружен заново")
+                return
+            self.chats = data['chats']
+            self.created_at = data['created_at']
+            self.top_message_date = data.get('top_message_date')
+        except Exception as e:
+            logger.warning(f"ЧАТЫ: Не удалось прочитать снимок {self.path}: {e}")
+
+    def save(self):
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'version': SNAPSHOT_VERSION,
+                    'created_at': self.created_at,
+                    'top_message_date': self.top_message_date,
+                    'chats': self.chats
+                }, file, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except Exception as e:
+            logger.warning(f"ЧАТЫ: Не удалось сохранить снимок {self.path}: {e}")
+
+    def is_fresh(self):
+        """Снимок есть и моложе TTL"""
+        return self.created_at is not None and time.time() - self.created_at < self.ttl_seconds
+
+    async def refresh(self, client, full=False):
+        """Обновление снимка; без full проходятся только диалоги новее снимка"""
+        if full or not self.is_fresh():
+            return await self._refresh_full(client)
+        return await self._refresh_incremental(client)
+
+    async def _refresh_full(self, client):
+        started = time.perf_counter()
+        chats = []
+        top_message_date = 0.0
+        async for dialog in client.iter_dialogs():
+            top_message_date = max(top_message_date, dialog_timestamp(dialog))
+            if dialog.is_group or dialog.is_channel:
+                chats.append(dialog_info(dialog))
+        self.chats = chats
+        self.created_at = time.time()
+        self.top_message_date = top_message_date
+        self.full_refreshes += 1
+        self.save()
+        logger.info(f"ЧАТЫ: Полная выгрузка снимка - {len(chats)} чатов за {time.perf_counter() - started:.2f} с")
+        return self.chats
+
+    async def _refresh_incremental(self, client):
+        started = time.perf_counter()
+        top = self.top_message_date or 0.0
+        newest = top
+        updated = []
+        seen = 0
+        async for dialog in client.iter_dialogs():
+            date = dialog_timestamp(dialog)
+            # Закрепленные диалоги идут первыми независимо от даты
+            if date <= top and not dialog.pinned:
+                break
+            seen += 1
+            if date > top:
+                newest = max(newest, date)
+                if dialog.is_group or dialog.is_channel:
+                    updated.append(dialog_info(dialog))
+
+        if updated:
+            updated_ids = {chat['id'] for chat in updated}
+            # Свежие диалоги наверх, как в списке Telegram
+            self.chats = updated + [chat for chat in self.chats if chat['id'] not in updated_ids]
+        self.top_message_date = newest
+        self.incremental_refreshes += 1
+        self.save()
+        logger.info(f"ЧАТЫ: Досинхронизация снимка - просмотрено {seen} диалогов, обновлено {len(updated)} чатов за {time.perf_counter() - started:.2f} с")
+        return self.chats
+
+    def get_stats(self):
+        return {
+            'chats': len(self.chats),
+            'age_seconds': round(time.time() - self.created_at) if self.created_at else None,
+            'full_refreshes': self.full_refreshes,
+            'incremental_refreshes': self.incremental_refreshes
+        }
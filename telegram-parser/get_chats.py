@@ -2,47 +2,64 @@
 """
 Утилита для получения списка доступных чатов из Telegram аккаунта
 Использует существующую сессию railway_production без конфликтов
+
+Сначала список запрашивается у запущенного сервиса (парсер или
+get_chats.py --serve), и только если сервис недоступен - через
+собственное подключение к Telegram. Без сервиса список берется из
+снимка на диске (dialog_snapshot.py) и досинхронизируется отдельным
+фоновым процессом, так что stdout закрывается сразу после JSON
+
+Параметры:
+  --serve       постоянный сервис списка чатов
+  --refresh     полная выгрузка списка мимо снимка
+  --revalidate  только досинхронизация снимка (запускается из main)
 """
 
 # --- Автоматическая расшифровка файла сессии ---
 import os
-# Проверяем два возможных пути для зашифрованного файла
-enc_paths = ['railway_production.session.enc', os.path.join('telegram-parser', 'railway_production.session.enc')]
-dec_paths = ['railway_production.session', os.path.join('telegram-parser', 'railway_production.session')]
-
-print(f'📂 Текущая директория: {os.getcwd()}')
-print(f'📄 Содержимое: {os.listdir()}')
-
-# Находим правильный путь
-enc_path, dec_path = None, None
-for i, (ep, dp) in enumerate(zip(enc_paths, dec_paths)):
-    if os.path.exists(ep):
-        enc_path, dec_path = ep, dp
-        print(f'🔍 Найден зашифрованный файл по пути: {ep}')
-        break
-
-if enc_path and not os.path.exists(dec_path):
-    print(f'🔐 Расшифровка файла {enc_path}...')
-    try:
-        from cryptography.fernet import Fernet
-        key = os.getenv('SESSION_KEY')
-        print(f'🔑 SESSION_KEY: {key}')
-        if not key:
-            raise Exception('SESSION_KEY не задана в переменных окружения!')
-        f = Fernet(key.encode())
-        with open(enc_path, 'rb') as file:
-            encrypted_data = file.read()
-            print(f'📦 Размер зашифрованного файла: {len(encrypted_data)} байт')
-            decrypted = f.decrypt(encrypted_data)
-        with open(dec_path, 'wb') as file:
-            file.write(decrypted)
-        print(f'✅ Файл {dec_path} успешно расшифрован!')
-    except Exception as e:
-        print(f'❌ Ошибка расшифровки: {e}')
+
+
+def decrypt_session_file():
+    """Расшифровка railway_production.session (нужна только для прямого подключения)
+
+    Сообщения идут в лог (stderr): stdout занят JSON со списком чатов
+    """
+    # Проверяем два возможных пути для зашифрованного файла
+    enc_paths = ['railway_production.session.enc', os.path.join('telegram-parser', 'railway_production.session.enc')]
+    dec_paths = ['railway_production.session', os.path.join('telegram-parser', 'railway_production.session')]
+
+    logger.debug(f'📂 Текущая директория: {os.getcwd()}')
+
+    # Находим правильный путь
+    enc_path, dec_path = None, None
+    for i, (ep, dp) in enumerate(zip(enc_paths, dec_paths)):
+        if os.path.exists(ep):
+            enc_path, dec_path = ep, dp
+            logger.info(f'🔍 Найден зашифрованный файл по пути: {ep}')
+            break
+
+    if enc_path and not os.path.exists(dec_path):
+        logger.info(f'🔐 Расшифровка файла {enc_path}...')
+        try:
+            from cryptography.fernet import Fernet
+            key = os.getenv('SESSION_KEY')
+            if not key:
+                raise Exception('SESSION_KEY не задана в переменных окружения!')
+            f = Fernet(key.encode())
+            with open(enc_path, 'rb') as file:
+                encrypted_data = file.read()
+                logger.info(f'📦 Размер зашифрованного файла: {len(encrypted_data)} байт')
+                decrypted = f.decrypt(encrypted_data)
+            with open(dec_path, 'wb') as file:
+                file.write(decrypted)
+            logger.info(f'✅ Файл {dec_path} успешно расшифрован!')
+        except Exception as e:
+            logger.error(f'❌ Ошибка расшифровки: {e}')
 
 import asyncio
 import os
 import json
+import subprocess
 import sys
 import traceback
 import glob
@@ -51,6 +68,11 @@ from telethon import TelegramClient
 from dotenv import load_dotenv
 import logging
 
+from chat_enrichment import ParticipantCountEnricher, DEFAULT_CACHE_PATH as DEFAULT_PARTICIPANTS_CACHE_PATH
+from chat_list_service import ChatListService, DEFAULT_CLIENT_TIMEOUT, DEFAULT_SERVICE_URL, fetch_from_service
+from dialog_snapshot import DialogSnapshot, DEFAULT_SNAPSHOT_PATH, DEFAULT_TTL_SECONDS
+from control_server import ControlServer
+
 # Исправляем кодировку для Windows консоли
 try:
     sys.stdout.reconfigure(encoding='utf-8')
@@ -79,18 +101,8 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-async def get_telegram_chats():
-    """Получение списка всех доступных чатов из Telegram аккаунта"""
-    
-    # Telegram API данные
-    api_id = os.getenv('TELEGRAM_API_ID')
-    api_hash = os.getenv('TELEGRAM_API_HASH')
-    
-    if not api_id or not api_hash:
-        logger.error("❌ TELEGRAM_API_ID и TELEGRAM_API_HASH должны быть установлены в .env файле")
-        return []
-    
-    # Ищем доступные сессии (в порядке приоритета)
+def find_session_name():
+    """Поиск доступной сессии (в порядке приоритета)"""
     session_candidates = [
         'api_chats',           # Специальная сессия для API (приоритет!)
         'railway_production',  # Railway production
@@ -100,27 +112,54 @@ async def get_telegram_chats():
         'local_development'    # Локальная разработка
     ]
     
-    session_name = None
-    session_file = None
-    
     for candidate in session_candidates:
         test_file = f"{candidate}.session"
         if os.path.exists(test_file):
-            session_name = candidate
-            session_file = test_file
-            logger.info(f"✅ Найдена сессия: {session_file}")
-            break
+            logger.info(f"✅ Найдена сессия: {test_file}")
+            return candidate
+    
+    logger.error("❌ Не найдено ни одной сессии Telegram")
+    logger.info("💡 Доступные варианты: railway_production.session, autologist_session.session")
+    return None
+
+def create_client(**kwargs):
+    """Telegram клиент для найденной сессии или None"""
+    api_id = os.getenv('TELEGRAM_API_ID')
+    api_hash = os.getenv('TELEGRAM_API_HASH')
     
+    if not api_id or not api_hash:
+        logger.error("❌ TELEGRAM_API_ID и TELEGRAM_API_HASH должны быть установлены в .env файле")
+        return None
+    
+    decrypt_session_file()
+    session_name = find_session_name()
     if not session_name:
-        logger.error("❌ Не найдено ни одной сессии Telegram")
-        logger.info("💡 Доступные варианты: railway_production.session, autologist_session.session")
-        return []
+        return None
+    return TelegramClient(session_name, int(api_id), api_hash, **kwargs)
+
+def create_snapshot():
+    return DialogSnapshot(
+        os.getenv('DIALOG_SNAPSHOT_PATH', DEFAULT_SNAPSHOT_PATH),
+        ttl_seconds=int(os.getenv('DIALOG_SNAPSHOT_TTL', str(DEFAULT_TTL_SECONDS)))
+    )
+
+def create_enricher():
+    return ParticipantCountEnricher(
+        os.getenv('CHAT_PARTICIPANTS_CACHE', DEFAULT_PARTICIPANTS_CACHE_PATH),
+        max_concurrency=int(os.getenv('CHAT_ENRICH_CONCURRENCY', '4')),
+        rate_per_second=float(os.getenv('CHAT_ENRICH_RATE_PER_SECOND', '5')),
+        time_budget=float(os.getenv('CHAT_ENRICH_TIME_BUDGET', '10'))
+    )
+
+async def get_telegram_chats(snapshot, refresh=False):
+    """Получение списка всех доступных чатов из Telegram аккаунта с обновлением снимка"""
     
     client = None
     try:
         # Создаем клиент с очень коротким timeout для минимизации конфликтов
-        client = TelegramClient(session_name, int(api_id), api_hash, 
-                               connection_retries=1, retry_delay=1, timeout=10)
+        client = create_client(connection_retries=1, retry_delay=1, timeout=10)
+        if client is None:
+            return []
         
         logger.info("🔌 Подключаемся к Telegram...")
         await client.start()
@@ -129,26 +168,14 @@ async def get_telegram_chats():
         me = await client.get_me()
         logger.info(f"✅ Подключен как: {me.first_name} (@{me.username})")
         
-        chats = []
-        chat_count = 0
-        
         logger.info("📋 Получаем список чатов...")
         
-        # Быстро получаем все диалоги
-        async for dialog in client.iter_dialogs():
-            if dialog.is_group or dialog.is_channel:
-                chat_info = {
-                    'id': str(dialog.id),
-                    'title': dialog.title,
-                    'participantsCount': getattr(dialog.entity, 'participants_count', 0),
-                    'type': 'channel' if dialog.is_channel else 'supergroup',
-                    'accessible': True,
-                    'username': getattr(dialog.entity, 'username', None)
-                }
-                chats.append(chat_info)
-                chat_count += 1
+        # Свежий снимок досинхронизируется только по новым диалогам
+        chats = await snapshot.refresh(client, full=refresh)
+        await create_enricher().enrich(client, chats)
+        snapshot.save()
         
-        logger.info(f"✅ Найдено {chat_count} чатов/каналов")
+        logger.info(f"✅ Найдено {len(chats)} чатов/каналов")
         return chats
         
     except Exception as e:
@@ -162,8 +189,62 @@ async def get_telegram_chats():
             except Exception as e:
                 logger.error(f"⚠️ Ошибка при отключении: {e}")
 
-async def main():
-    """Основная функция для вызова из Node.js"""
+async def serve():
+    """Режим сервиса: одно постоянное подключение, список чатов по GET /dialogs"""
+    client = create_client()
+    if client is None:
+        return
+    await client.start()
+    me = await client.get_me()
+    logger.info(f"✅ Подключен как: {me.first_name} (@{me.username})")
+    
+    service = ChatListService(client, create_snapshot(), create_enricher())
+    server = ControlServer(
+        host=os.getenv('CONTROL_HOST', '127.0.0.1'),
+        port=int(os.getenv('CONTROL_PORT', '8765')),
+        token=os.getenv('CONTROL_TOKEN') or None
+    )
+    server.add_command('/dialogs', 'GET', service.handle_dialogs)
+    
+    async def stats(params):
+        return 200, {'chat_list': service.get_stats(), 'control': server.get_stats()}
+    server.add_command('/stats', 'GET', stats)
+    
+    await server.start()
+    try:
+        await client.run_until_disconnected()
+    finally:
+        await server.stop()
+
+def spawn_revalidation():
+    """Досинхронизация снимка в отдельном процессе, не связанном с stdout/stderr вызывающего
+
+    Вызывающий (Node.js) получает JSON и конец вывода сразу, не дожидаясь
+    подключения к Telegram; ошибки фонового процесса только логируются им самим
+    """
+    try:
+        subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--revalidate'],
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True
+        )
+        logger.info("🔄 Досинхронизация снимка запущена в фоне")
+    except Exception as e:
+        logger.error(f"⚠️ Не удалось запустить досинхронизацию снимка: {e}")
+
+async def revalidate():
+    """Режим --revalidate: обновление снимка без вывода в stdout"""
+    await get_telegram_chats(create_snapshot())
+
+async def main(refresh=False):
+    """Основная функция для вызова из Node.js
+
+    В stdout выводится ровно один JSON массив; все остальное - в stderr
+    """
+    chats = []
+    revalidate_snapshot = False
     try:
         logger.info("🚀 ================================")
         logger.info("🚀 PYTHON: Скрипт get_chats.py запущен")
@@ -191,7 +272,23 @@ async def main():
             size = os.path.getsize(session_file) if os.path.exists(session_file) else 0
             logger.info(f"  📄 {session_file} ({size} байт)")
         
-        chats = await get_telegram_chats()
+        # Быстрый путь: уже подключенный клиент парсера или сервиса
+        chats = fetch_from_service(
+            os.getenv('CHAT_SERVICE_URL', DEFAULT_SERVICE_URL),
+            token=os.getenv('CONTROL_TOKEN') or None,
+            # Полная выгрузка в сервисе может занять заметное время
+            timeout=60 if refresh else DEFAULT_CLIENT_TIMEOUT,
+            refresh=refresh
+        )
+        if chats is None:
+            snapshot = create_snapshot()
+            if not refresh and snapshot.is_fresh():
+                # Снимок отдается сразу, досинхронизация - после вывода
+                logger.info(f"📦 Список чатов из снимка {snapshot.path}")
+                chats = snapshot.chats
+                revalidate_snapshot = True
+            else:
+                chats = await get_telegram_chats(snapshot, refresh)
         
         if chats:
             logger.info(f"✅ Успешно получено {len(chats)} чатов")
@@ -202,22 +299,32 @@ async def main():
                 logger.info(f"  ... и еще {len(chats) - 5} чатов")
         else:
             logger.error("❌ Не удалось получить чаты")
-        
-        # Выводим результат в JSON формате в stdout с fallback для кодировки
-        try:
-            print(json.dumps(chats, ensure_ascii=False, indent=2))
-        except UnicodeEncodeError as ue:
-            logger.warning(f"⚠️ Проблема с кодировкой: {ue}")
-            logger.info("🔄 Используем ASCII-безопасный вывод...")
-            print(json.dumps(chats, ensure_ascii=True, indent=2))
-        except Exception as e:
-            logger.error(f"❌ Ошибка вывода JSON: {e}")
-            print("[]")  # Fallback к пустому массиву
+            chats = []
         
     except Exception as e:
         logger.error(f"❌ Критическая ошибка: {e}")
         logger.error(f"🔍 Traceback: {traceback.format_exc()}")
-        print("[]")  # Возвращаем пустой массив в случае ошибки
+        chats = []  # Возвращаем пустой массив в случае ошибки
+    
+    # Выводим результат в JSON формате в stdout с fallback для кодировки
+    try:
+        print(json.dumps(chats, ensure_ascii=False, indent=2), flush=True)
+    except UnicodeEncodeError as ue:
+        logger.warning(f"⚠️ Проблема с кодировкой: {ue}")
+        logger.info("🔄 Используем ASCII-безопасный вывод...")
+        print(json.dumps(chats, ensure_ascii=True, indent=2), flush=True)
+    except Exception as e:
+        logger.error(f"❌ Ошибка вывода JSON: {e}")
+        print("[]", flush=True)  # Fallback к пустому массиву
+    
+    # После JSON в stdout больше ничего не пишется
+    if revalidate_snapshot:
+        spawn_revalidation()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    if '--serve' in sys.argv:
+        asyncio.run(serve())
+    elif '--revalidate' in sys.argv:
+        asyncio.run(revalidate())
+    else:
+        asyncio.run(main(refresh='--refresh' in sys.argv))
\ No newline at end of file
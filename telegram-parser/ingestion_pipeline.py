@@ -0,0 +1,152 @@
+"""
+Конвейер обработки входящих сообщений
+Обработчик Telethon только кладет компактное событие в ограниченную очередь,
+а хеширование, дедупликацию, поиск ключевых слов, запись и рассылку
+выполняет пул обработчиков
+"""
+
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+# Что делать, когда очередь заполнена
+OVERFLOW_WAIT = 'wait'  # ждать свободного места (сообщения не теряются)
+OVERFLOW_DROP_OLDEST = 'drop_oldest'  # выбросить самое старое событие
+OVERFLOW_DROP_NEWEST = 'drop_newest'  # отклонить новое событие
+OVERFLOW_POLICIES = (OVERFLOW_WAIT, OVERFLOW_DROP_OLDEST, OVERFLOW_DROP_NEWEST)
+
+
+class IncomingMessage:
+    """Компактное событие нового сообщения из отслеживаемого чата"""
+
+    __slots__ = ('chat_id', 'chat_name', 'chat', 'message', 'received_at', 'trace')
+
+    def __init__(self, chat_id, chat_name, chat, message, trace=None):
+        self.chat_id = chat_id
+        self.chat_name = chat_name
+        self.chat = chat
+        self.message = message
+        self.received_at = time.perf_counter()
+        # Трасса сообщения (tracing.Trace), продолжается в обработчике очереди
+        self.trace = trace
+
+
+class IngestionPipeline:
+    """Ограниченная очередь событий с пулом обработчиков
+
+    process_event - корутина, обрабатывающая одно событие IncomingMessage;
+    on_drop - функция (event) для события, вытесненного из очереди (drop_oldest)
+    """
+
+    def __init__(self, process_event, workers=4, max_queue_size=1000, overflow_policy=OVERFLOW_WAIT, on_drop=None):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Неизвестная политика переполнения: {overflow_policy}")
+        self.process_event = process_event
+        self.on_drop = on_drop
+        self.worker_count = max(1, workers)
+        self.max_queue_size = max_queue_size
+        self.overflow_policy = overflow_policy
+        self._queue = None
+        self._workers = []
+        self.busy_workers = 0
+        self.enqueued = 0
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.overflow_waits = 0
+        self.overflow_wait_time = 0.0
+        self.max_depth = 0
+
+    def start(self):
+        """Запуск обработчиков (нужен работающий цикл событий)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker(index))
+            for index in range(self.worker_count)
+        ]
+        logger.info(f"КОНВЕЙЕР: Запущено {self.worker_count} обработчиков, очередь до {self.max_queue_size} событий ({self.overflow_policy})")
+
+    def depth(self):
+        """Текущее число событий в очереди"""
+        return self._queue.qsize() if self._queue else 0
+
+    async def submit(self, event):
+        """Постановка события в очередь; False если событие отброшено"""
+        queue = self._queue
+        if queue.full():
+            if self.overflow_policy == OVERFLOW_DROP_NEWEST:
+                self.dropped += 1
+                logger.warning(f"КОНВЕЙЕР: Очередь заполнена ({queue.qsize()}), новое событие отброшено")
+                return False
+            if self.overflow_policy == OVERFLOW_DROP_OLDEST:
+                evicted = queue.get_nowait()
+                queue.task_done()
+                self.dropped += 1
+                logger.warning(f"КОНВЕЙЕР: Очередь заполнена ({queue.qsize()}), старое событие отброшено")
+                if self.on_drop is not None:
+                    self.on_drop(evicted)
+            else:
+                # Обратное давление: обработчик Telethon ждет места в очереди
+                self.overflow_waits += 1
+                started = time.perf_counter()
+                await queue.put(event)
+                self.overflow_wait_time += time.perf_counter() - started
+                self._accepted(queue)
+                return True
+
+        queue.put_nowait(event)
+        self._accepted(queue)
+        return True
+
+    def _accepted(self, queue):
+        self.enqueued += 1
+        depth = queue.qsize()
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    async def _worker(self, index):
+        queue = self._queue
+        while True:
+            event = await queue.get()
+            self.busy_workers += 1
+            try:
+                await self.process_event(event)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"КОНВЕЙЕР: Ошибка обработчика {index}: {e}")
+            finally:
+                self.busy_workers -= 1
+                queue.task_done()
+
+    async def stop(self, drain=True):
+        """Остановка обработчиков; при drain=True сначала дорабатываем очередь"""
+        if not self._workers:
+            return
+        if drain:
+            await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def get_stats(self):
+        """Статистика конвейера для TelegramParser.get_stats"""
+        return {
+            'queue_depth': self.depth(),
+            'queue_max_size': self.max_queue_size,
+            'max_depth_seen': self.max_depth,
+            'workers': self.worker_count,
+            'busy_workers': self.busy_workers,
+            'enqueued': self.enqueued,
+            'processed': self.processed,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'overflow_policy': self.overflow_policy,
+            'overflow_waits': self.overflow_waits,
+            'overflow_wait_seconds': round(self.overflow_wait_time, 3)
+        }
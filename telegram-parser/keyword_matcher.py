@@ -0,0 +1,184 @@
+"""
+Компилированный поиск ключевых слов для парсера
+Строит автомат Ахо-Корасик один раз по списку ключевых слов и находит
+все простые слова и все части составных правил за один проход по тексту
+"""
+
+from collections import deque
+
+# До этого числа шаблонов проверка через `in` (на C) быстрее прохода автомата
+# на чистом Python, поэтому для маленьких списков автомат не используется
+LINEAR_SCAN_MAX_PATTERNS = 32
+
+
+class KeywordMatcher:
+    """Неизменяемый матчер ключевых слов на основе автомата Ахо-Корасик
+
+    Поддерживает те же правила, что и TelegramParser.check_keywords:
+    - Простое слово: "тандем" - подстрока "тандем" в тексте
+    - Логическое И: "тандем;140" - все части должны быть в тексте
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        # Правила: (ключевое слово, индексы шаблонов), порядок как в списке
+        self._rules = []
+        # Правила без непустых частей срабатывают на любом непустом тексте
+        self._always_rules = []
+        self._patterns = []
+        pattern_ids = {}
+        # Для каждого шаблона - индексы правил, которые от него зависят
+        self._pattern_rules = []
+
+        for rule_index, keyword in enumerate(self.keywords):
+            keyword = keyword.lower()
+            if ';' in keyword:
+                parts = [part.strip() for part in keyword.split(';')]
+            else:
+                parts = [keyword]
+            parts = [part for part in parts if part]
+
+            ids = []
+            for part in parts:
+                pattern_id = pattern_ids.get(part)
+                if pattern_id is None:
+                    pattern_id = len(self._patterns)
+                    pattern_ids[part] = pattern_id
+                    self._patterns.append(part)
+                    self._pattern_rules.append([])
+                if pattern_id not in ids:
+                    ids.append(pattern_id)
+                    self._pattern_rules[pattern_id].append(rule_index)
+
+            self._rules.append((self.keywords[rule_index], tuple(ids)))
+            if not ids:
+                self._always_rules.append(rule_index)
+
+        if len(self._patterns) > LINEAR_SCAN_MAX_PATTERNS:
+            self._build_automaton()
+        else:
+            self._goto = None
+
+    def _build_automaton(self):
+        """Построение переходов, суффиксных ссылок и выходов автомата"""
+        goto = [{}]
+        outputs = [[]]
+
+        for pattern_id, pattern in enumerate(self._patterns):
+            state = 0
+            for char in pattern:
+                next_state = goto[state].get(char)
+                if next_state is None:
+                    next_state = len(goto)
+                    goto[state][char] = next_state
+                    goto.append({})
+                    outputs.append([])
+                state = next_state
+            outputs[state].append(pattern_id)
+
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in goto[state].items():
+                queue.append(next_state)
+                fallback = fail[state]
+                while fallback and char not in goto[fallback]:
+                    fallback = fail[fallback]
+                fail[next_state] = goto[fallback].get(char, 0)
+                # Выходы по суффиксной ссылке уже посчитаны (обход в ширину)
+                outputs[next_state].extend(outputs[fail[next_state]])
+
+        self._goto = goto
+        self._fail = fail
+        # Кортежи вместо списков: пустой кортеж ложен и дешево проверяется
+        self._outputs = [tuple(output) for output in outputs]
+
+    def __len__(self):
+        return len(self.keywords)
+
+    def _scan(self, text_lower, collect_spans):
+        """Один проход автомата по тексту в нижнем регистре"""
+        if self._goto is None:
+            return self._scan_linear(text_lower, collect_spans)
+
+        goto = self._goto
+        fail = self._fail
+        outputs = self._outputs
+        patterns = self._patterns
+
+        found = set()
+        spans = {} if collect_spans else None
+        state = 0
+        for position, char in enumerate(text_lower):
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            matched = outputs[state]
+            if matched:
+                found.update(matched)
+                if collect_spans:
+                    end = position + 1
+                    for pattern_id in matched:
+                        spans.setdefault(pattern_id, []).append(
+                            (end - len(patterns[pattern_id]), end)
+                        )
+        return found, spans
+
+    def _scan_linear(self, text_lower, collect_spans):
+        """Поиск каждого шаблона через str.find для коротких списков"""
+        found = set()
+        spans = {} if collect_spans else None
+        for pattern_id, pattern in enumerate(self._patterns):
+            if pattern not in text_lower:
+                continue
+            found.add(pattern_id)
+            if collect_spans:
+                pattern_spans = spans[pattern_id] = []
+                start = text_lower.find(pattern)
+                while start != -1:
+                    pattern_spans.append((start, start + len(pattern)))
+                    start = text_lower.find(pattern, start + 1)
+        return found, spans
+
+    def _matched_rules(self, found):
+        """Индексы сработавших правил в порядке исходного списка"""
+        candidates = set(self._always_rules)
+        for pattern_id in found:
+            candidates.update(self._pattern_rules[pattern_id])
+
+        matched = []
+        for rule_index in sorted(candidates):
+            if all(pattern_id in found for pattern_id in self._rules[rule_index][1]):
+                matched.append(rule_index)
+        return matched
+
+    def check(self, text, text_lower=None):
+        """Список найденных ключевых слов (как TelegramParser.check_keywords)"""
+        if not text:
+            return []
+        if text_lower is None:
+            text_lower = text.lower()
+        found, _ = self._scan(text_lower, collect_spans=False)
+        return [self._rules[rule_index][0] for rule_index in self._matched_rules(found)]
+
+    def match(self, text, text_lower=None):
+        """Найденные ключевые слова с позициями совпадений
+
+        Возвращает список словарей {'keyword', 'parts'}, где parts - словарь
+        часть -> список (start, end) в тексте, приведенном к нижнему регистру
+        """
+        if not text:
+            return []
+        if text_lower is None:
+            text_lower = text.lower()
+        found, spans = self._scan(text_lower, collect_spans=True)
+
+        matches = []
+        for rule_index in self._matched_rules(found):
+            keyword, pattern_ids = self._rules[rule_index]
+            matches.append({
+                'keyword': keyword,
+                'parts': {self._patterns[pattern_id]: spans[pattern_id] for pattern_id in pattern_ids}
+            })
+        return matches
@@ -0,0 +1,137 @@
+"""
+Настройка логирования парсера
+Обработчики логгеров только кладут запись в ограниченную очередь, а запись
+в файл (с ротацией по размеру) и в консоль выполняет отдельный поток
+QueueListener, поэтому медленный диск не задерживает цикл событий.
+Подробная диагностика по каждому сообщению идет на уровне DEBUG и
+включается переменной PARSER_DEBUG=1 или LOG_LEVEL=DEBUG
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+
+DEFAULT_LOG_FILE = os.path.join('logs', 'telegram_parser.log')
+DEFAULT_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_BACKUP_COUNT = 5
+DEFAULT_QUEUE_SIZE = 10000
+TEXT_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+_runtime = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись - один JSON-объект в строке (для сборщиков логов)"""
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class CountingQueueHandler(QueueHandler):
+    """Передача записей в очередь без блокировки с подсчетом по уровням
+
+    При переполнении очереди запись отбрасывается и учитывается в dropped,
+    вызывающий код никогда не ждет поток записи
+    """
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.counts = {}
+        self.dropped = 0
+
+    def enqueue(self, record):
+        self.counts[record.levelname] = self.counts.get(record.levelname, 0) + 1
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingRuntime:
+    """Очередь, поток записи и счетчики настроенного логирования"""
+
+    def __init__(self, handler, listener, level, log_format, log_file):
+        self.handler = handler
+        self.listener = listener
+        self.level = level
+        self.log_format = log_format
+        self.log_file = log_file
+
+    def stop(self):
+        """Дописывает оставшиеся в очереди записи и останавливает поток"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+    def get_stats(self):
+        return {
+            'level': logging.getLevelName(self.level),
+            'format': self.log_format,
+            'file': self.log_file,
+            'records': dict(self.handler.counts),
+            'dropped': self.handler.dropped,
+            'queued': self.handler.queue.qsize()
+        }
+
+
+def resolve_level():
+    """Уровень из LOG_LEVEL; PARSER_DEBUG=1 включает DEBUG"""
+    if os.getenv('PARSER_DEBUG', '').lower() in ('1', 'true', 'yes'):
+        return logging.DEBUG
+    level = logging.getLevelName(os.getenv('LOG_LEVEL', 'INFO').upper())
+    return level if isinstance(level, int) else logging.INFO
+
+
+def setup_logging():
+    """Настройка корневого логгера; повторный вызов возвращает уже настроенное"""
+    global _runtime
+    if _runtime is not None:
+        return _runtime
+
+    level = resolve_level()
+    log_format = os.getenv('LOG_FORMAT', 'text').lower()
+    log_file = os.getenv('LOG_FILE', DEFAULT_LOG_FILE)
+    formatter = JsonFormatter() if log_format == 'json' else logging.Formatter(TEXT_FORMAT)
+
+    handlers = [logging.StreamHandler()]
+    if log_file:
+        directory = os.path.dirname(log_file)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        handlers.append(RotatingFileHandler(
+            log_file,
+            maxBytes=int(os.getenv('LOG_MAX_BYTES', DEFAULT_MAX_BYTES)),
+            backupCount=int(os.getenv('LOG_BACKUP_COUNT', DEFAULT_BACKUP_COUNT)),
+            encoding='utf-8'
+        ))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(maxsize=int(os.getenv('LOG_QUEUE_SIZE', DEFAULT_QUEUE_SIZE)))
+    queue_handler = CountingQueueHandler(log_queue)
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    # Отладочные записи Telethon слишком объемны даже для режима DEBUG парсера
+    logging.getLogger('telethon').setLevel(max(level, logging.INFO))
+
+    listener.start()
+    _runtime = LoggingRuntime(queue_handler, listener, level, log_format, log_file)
+    atexit.register(_runtime.stop)
+    return _runtime
@@ -0,0 +1,164 @@
+"""
+Сторожевой поток цикла событий
+Корутина в цикле событий отмечает каждый свой тик (и заодно измеряет
+задержку цикла, как LoopLagMonitor), а отдельный поток проверяет, как давно
+был последний тик. Если цикл не отвечает дольше порога, поток снимает стек
+потока цикла (sys._current_frames) и находит место в коде парсера, которое
+его держит: синхронный запрос, тяжелая регулярка и т.п. Время блокировок
+суммируется по местам вызова и отдается в статистику и /metrics
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+
+from metrics import LoopLagMonitor
+
+logger = logging.getLogger(__name__)
+
+PROJECT_DIR = os.path.dirname(os.path.abspath(__file__))
+OTHER_SITE = 'other'
+
+
+def find_call_site(frame, stack_depth=8):
+    """(место вызова, короткий стек) для кадра потока цикла событий
+
+    Место - самый глубокий кадр из файлов парсера (кроме этого модуля),
+    иначе самый глубокий кадр вообще
+    """
+    entries = traceback.extract_stack(frame)
+    site_entry = entries[-1] if entries else None
+    for entry in reversed(entries):
+        filename = os.path.abspath(entry.filename)
+        if filename.startswith(PROJECT_DIR) and filename != os.path.abspath(__file__):
+            site_entry = entry
+            break
+    if site_entry is None:
+        return OTHER_SITE, []
+    site = f"{os.path.basename(site_entry.filename)}:{site_entry.lineno} {site_entry.name}"
+    stack = [
+        f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}"
+        for entry in entries[-stack_depth:]
+    ]
+    return site, stack
+
+
+class LoopWatchdog(LoopLagMonitor):
+    """Измерение задержки цикла и поиск мест, блокирующих его дольше порога
+
+    interval - период тика в цикле событий, threshold - порог блокировки
+    (секунды); max_sites ограничивает число отслеживаемых мест вызова
+    """
+
+    def __init__(self, interval=0.1, threshold=0.25, max_sites=50):
+        super().__init__(interval)
+        self.threshold = threshold
+        self.max_sites = max_sites
+        self.sites = {}  # место -> {'blocks', 'total_seconds', 'max_seconds', 'stack'}
+        self.blocks = 0
+        self.blocked_seconds = 0.0
+        self._heartbeat = None
+        self._loop_thread_id = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    def start(self):
+        if self._task is None:
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+        super().start()
+        if self._thread is None and hasattr(sys, '_current_frames'):
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+            self._thread.start()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            self._heartbeat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
+    def _watch(self):
+        check_interval = max(0.01, min(self.interval, self.threshold) / 2)
+        blocked_heartbeat = None
+        site = None
+        while not self._stopping.wait(check_interval):
+            heartbeat = self._heartbeat
+            overdue = time.monotonic() - heartbeat - self.interval
+            if blocked_heartbeat is None:
+                if overdue >= self.threshold:
+                    # Цикл не проснулся вовремя - снимаем стек, пока он еще заблокирован
+                    blocked_heartbeat = heartbeat
+                    frame = sys._current_frames().get(self._loop_thread_id)
+                    site, stack = find_call_site(frame) if frame is not None else (OTHER_SITE, [])
+                    # Полный стек в лог - только при первой блокировке в этом месте
+                    log = logger.debug if site in self.sites else logger.warning
+                    self._remember_stack(site, stack)
+                    log(
+                        "ЦИКЛ: Цикл событий заблокирован дольше %.0f мс в %s\n  %s",
+                        self.threshold * 1000, site, '\n  '.join(stack)
+                    )
+            elif heartbeat != blocked_heartbeat:
+                # Цикл ожил: блокировка длилась от планового пробуждения до нового тика
+                self._record_block(site, max(0.0, heartbeat - blocked_heartbeat - self.interval))
+                blocked_heartbeat = None
+
+    def _site_entry(self, site):
+        entry = self.sites.get(site)
+        if entry is None:
+            if len(self.sites) >= self.max_sites:
+                site = OTHER_SITE
+                entry = self.sites.get(site)
+            if entry is None:
+                entry = self.sites[site] = {'blocks': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'stack': []}
+        return entry
+
+    def _remember_stack(self, site, stack):
+        self._site_entry(site)['stack'] = stack
+
+    def _record_block(self, site, duration):
+        entry = self._site_entry(site)
+        entry['blocks'] += 1
+        entry['total_seconds'] += duration
+        entry['max_seconds'] = max(entry['max_seconds'], duration)
+        self.blocks += 1
+        self.blocked_seconds += duration
+
+    def stop(self):
+        super().stop()
+        if self._thread is not None:
+            self._stopping.set()
+            self._thread.join(1)
+            self._thread = None
+
+    def blocked_seconds_by_site(self):
+        """Суммарное время блокировок по местам вызова (для /metrics)"""
+        return {site: round(entry['total_seconds'], 6) for site, entry in list(self.sites.items())}
+
+    def get_stats(self, top=10):
+        sites = sorted(list(self.sites.items()), key=lambda item: item[1]['total_seconds'], reverse=True)[:top]
+        return {
+            'lag_ms': round(self.lag * 1000, 1),
+            'max_lag_ms': round(self.max_lag * 1000, 1),
+            'threshold_ms': self.threshold * 1000,
+            'blocks': self.blocks,
+            'blocked_seconds': round(self.blocked_seconds, 3),
+            'sites': [
+                {
+                    'site': site,
+                    'blocks': entry['blocks'],
+                    'total_ms': round(entry['total_seconds'] * 1000, 1),
+                    'max_ms': round(entry['max_seconds'] * 1000, 1),
+                    'stack': entry['stack']
+                }
+                for site, entry in sites
+            ]
+        }
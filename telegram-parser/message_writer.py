@@ -0,0 +1,132 @@
+"""
+Пакетная запись сообщений в Supabase
+Строки копятся в очереди и уходят одной массовой вставкой, когда набралось
+max_batch_size строк или прошло max_delay_ms с первой строки в очереди.
+Вставка выполняется вне трассы какого-либо сообщения, а ее спан
+записывается в трассу каждого сообщения пакета. Отклоненный БД пакет (4xx)
+повторяется по одной строке, при неоднозначной ошибке строки не повторяются
+"""
+
+import asyncio
+import contextvars
+import logging
+import time
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+
+def is_rejected(error):
+    """Пакет точно отклонен БД целиком (HTTP 4xx), и ни одна строка не записана
+
+    Таймаут, обрыв соединения или 5xx неоднозначны: строки могли быть вставлены,
+    и повтор по одной создал бы дубликаты
+    """
+    status_code = getattr(error, 'status_code', None)
+    return status_code is not None and 400 <= status_code < 500 and status_code != 408
+
+
+class BatchedMessageWriter:
+    """Отложенная запись строк с future на каждую строку
+
+    insert_rows - корутина, которая вставляет список строк и возвращает
+    вставленные строки в том же порядке (с id и created_at из БД)
+    """
+
+    def __init__(self, insert_rows, max_batch_size=50, max_delay_ms=50):
+        self.insert_rows = insert_rows
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay_ms / 1000
+        self._pending = []  # [(row, future, контекст трассы)]
+        self._timer = None
+        self._flushes = set()
+        self.batches = 0
+        self.rows_written = 0
+        self.rows_failed = 0
+
+    def submit(self, row):
+        """Постановка строки в очередь; future получит вставленную строку"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((row, future, tracing.capture()))
+
+        if len(self._pending) >= self.max_batch_size:
+            self._start_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_delay, self._start_flush, context=contextvars.Context())
+        return future
+
+    async def write(self, row):
+        """Запись одной строки с ожиданием результата пакетной вставки"""
+        return await self.submit(row)
+
+    def _start_flush(self):
+        """Отправка накопленного пакета в фоновой задаче"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        batch, self._pending = self._pending, []
+        # Пустой контекст: задача не должна унаследовать трассу первого сообщения
+        task = contextvars.Context().run(asyncio.get_running_loop().create_task, self._flush(batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch):
+        rows = [row for row, _, _ in batch]
+        started = time.perf_counter()
+        try:
+            inserted = await self.insert_rows(rows)
+            if len(inserted) != len(rows):
+                raise RuntimeError(f"вставлено {len(inserted)} строк из {len(rows)}")
+        except Exception as e:
+            self._record_spans(batch, started, f"{type(e).__name__}: {e}")
+            if len(batch) == 1 or not is_rejected(e):
+                for _, future, _ in batch:
+                    self._resolve(future, exception=e)
+                self.rows_failed += len(batch)
+                if len(batch) > 1:
+                    logger.error(f"ЗАПИСЬ: Пакет из {len(batch)} строк не записан ({e}), результат неизвестен - без повтора")
+                return
+            # Одна плохая строка не должна ронять весь пакет - пишем по одной
+            logger.warning(f"ЗАПИСЬ: Пакет из {len(batch)} строк не записан ({e}), пишем по одной")
+            await asyncio.gather(*(self._flush([item]) for item in batch))
+            return
+
+        self._record_spans(batch, started)
+        self.batches += 1
+        self.rows_written += len(rows)
+        for (_, future, _), row in zip(batch, inserted):
+            self._resolve(future, result=row)
+
+    def _record_spans(self, batch, started, error=None):
+        """Спан вставки пакета в трассе каждого сообщения пакета"""
+        for _, _, context in batch:
+            tracing.record_span('db', started, context=context, error=error,
+                                method='POST', table='messages', batch_size=len(batch))
+
+    def _resolve(self, future, result=None, exception=None):
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    async def close(self):
+        """Запись всего, что осталось в очереди"""
+        self._start_flush()
+        if self._flushes:
+            await asyncio.gather(*list(self._flushes), return_exceptions=True)
+
+    def get_stats(self):
+        """Статистика записи для TelegramParser.get_stats"""
+        return {
+            'pending': len(self._pending),
+            'batches': self.batches,
+            'rows_written': self.rows_written,
+            'rows_failed': self.rows_failed,
+            'average_batch_size': self.rows_written / self.batches if self.batches else 0.0
+        }
@@ -0,0 +1,208 @@
+"""
+Метрики парсера в текстовом формате Prometheus
+Счетчики, гистограммы и датчики без внешних зависимостей: запись метрики -
+это поиск корзины и пара сложений, поэтому метрики включены всегда.
+Отдаются через канал управления (GET /metrics)
+"""
+
+import asyncio
+import os
+import time
+from bisect import bisect_left
+
+import tracing
+
+# Границы корзин гистограмм времени, секунды
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Этапы обработки сообщения для parser_stage_seconds
+STAGES = ('queue_wait', 'hash', 'dedup_lookup', 'sender_info', 'keyword_match', 'save_message', 'recipient_lookup', 'send')
+
+
+def format_labels(label, value):
+    return f'{{{label}="{value}"}}' if label else ''
+
+
+class Counter:
+    """Монотонный счетчик с необязательной меткой"""
+
+    def __init__(self, name, help_text, label=None):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self._values = {}
+
+    def inc(self, label_value=None, amount=1):
+        self._values[label_value] = self._values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for label_value, value in self._values.items():
+            lines.append(f"{self.name}{format_labels(self.label, label_value)} {value}")
+        return lines
+
+
+class Histogram:
+    """Гистограмма с кумулятивными корзинами, как в Prometheus"""
+
+    def __init__(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(buckets)
+        self._series = {}  # значение метки -> [счетчики корзин..., +Inf], сумма
+
+    def observe(self, value, label_value=None):
+        series = self._series.get(label_value)
+        if series is None:
+            series = self._series[label_value] = [[0] * (len(self.buckets) + 1), 0.0]
+        # Значение попадает в первую корзину с границей >= value
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, label_value=None):
+        series = self._series.get(label_value)
+        return sum(series[0]) if series else 0
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for label_value, (counts, total) in self._series.items():
+            prefix = f'{self.label}="{label_value}",' if self.label else ''
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f'{self.name}_bucket{{{prefix}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{prefix}le="+Inf"}} {cumulative}')
+            labels = format_labels(self.label, label_value)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Датчик, значение которого вычисляется функцией при каждом опросе
+
+    С меткой функция возвращает словарь значение метки -> значение
+    """
+
+    def __init__(self, name, help_text, read_value, metric_type='gauge', label=None):
+        self.name = name
+        self.help_text = help_text
+        self.read_value = read_value
+        self.metric_type = metric_type
+        self.label = label
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {self.metric_type}"]
+        if self.label:
+            for label_value, value in self.read_value().items():
+                lines.append(f"{self.name}{format_labels(self.label, label_value)} {value}")
+        else:
+            lines.append(f"{self.name} {self.read_value()}")
+        return lines
+
+
+class MetricsRegistry:
+    """Набор метрик с выводом в текстовом формате Prometheus"""
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, help_text, label=None):
+        metric = Counter(name, help_text, label)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, help_text, label=None, buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, help_text, label, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name, help_text, read_value, metric_type='gauge', label=None):
+        metric = Gauge(name, help_text, read_value, metric_type, label)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+class LoopLagMonitor:
+    """Задержка цикла событий: насколько позже запланированного просыпается sleep"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lag = max(0.0, loop.time() - started - self.interval)
+            if self.lag > self.max_lag:
+                self.max_lag = self.lag
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+def process_rss_bytes():
+    """Текущий RSS процесса (Linux /proc), иначе пиковый из getrusage"""
+    try:
+        with open('/proc/self/statm', 'r') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            # ru_maxrss в килобайтах на Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return 0
+
+
+class ParserMetrics:
+    """Метрики конвейера сообщений TelegramParser
+
+    loop_lag - монитор задержки цикла (LoopLagMonitor или его наследник)
+    """
+
+    def __init__(self, loop_lag=None):
+        self.registry = MetricsRegistry()
+        self.loop_lag = loop_lag or LoopLagMonitor()
+        self.messages = self.registry.counter(
+            'parser_messages_total', 'Обработанные сообщения по результату', 'result'
+        )
+        self.stage_seconds = self.registry.histogram(
+            'parser_stage_seconds', 'Время этапа обработки сообщения', 'stage'
+        )
+        self.notifications = self.registry.counter(
+            'parser_notifications_total', 'Отправленные уведомления по результату', 'result'
+        )
+        self.registry.gauge('parser_event_loop_lag_seconds', 'Последняя задержка цикла событий', lambda: self.loop_lag.lag)
+        self.registry.gauge('parser_event_loop_lag_max_seconds', 'Максимальная задержка цикла событий', lambda: self.loop_lag.max_lag)
+        self.registry.gauge('process_resident_memory_bytes', 'RSS процесса', process_rss_bytes)
+        self.registry.gauge('process_cpu_seconds_total', 'Процессорное время процесса', time.process_time, 'counter')
+
+    def observe_stage(self, stage, started):
+        """Время этапа от started (time.perf_counter) до текущего момента
+
+        Этап также записывается спаном текущей трассы сообщения
+        """
+        self.stage_seconds.observe(time.perf_counter() - started, stage)
+        tracing.record_span(stage, started)
+
+    def render(self):
+        return self.registry.render()
@@ -0,0 +1,156 @@
+"""
+Поиск почти-дубликатов сообщений (MinHash + LSH)
+Ловит репосты объявлений с измененным словом, эмодзи или другим отправителем,
+которые не совпадают по точному хешу create_message_hash
+"""
+
+import hashlib
+import re
+import time
+from array import array
+from collections import deque
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+DEFAULT_THRESHOLD = 0.7
+DEFAULT_MAX_SIZE = 50000
+
+# 16 полос по 4 строки: порог кандидатов LSH около 0.5, ниже порога сходства
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+
+SHINGLE_SIZE = 2
+# Слишком короткие тексты ("ок", "+") дают ложные совпадения
+MIN_TOKENS = 5
+
+TOKEN = re.compile(r'\w+')
+
+
+def text_shingles(text):
+    """Словесные шинглы нормализованного текста (без эмодзи и пунктуации)"""
+    tokens = TOKEN.findall(text.lower())
+    if len(tokens) < MIN_TOKENS:
+        return set()
+    return {
+        ' '.join(tokens[i:i + SHINGLE_SIZE]).encode('utf-8')
+        for i in range(len(tokens) - SHINGLE_SIZE + 1)
+    }
+
+
+class NearDuplicateIndex:
+    """Индекс MinHash-подписей с LSH-полосами за скользящее окно"""
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, ttl_seconds=DEFAULT_TTL_SECONDS,
+                 max_size=DEFAULT_MAX_SIZE, seed=b'autologist'):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._seed = seed
+
+        self._entries = {}  # entry_id -> (signature, row)
+        self._bands = {}  # (band, rows) -> [entry_id]
+        self._expiry = deque()  # (expires_at, entry_id) в порядке добавления
+        self._next_id = 0
+        self.lookups = 0
+        self.found = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def signature(self, shingles):
+        """MinHash-подпись множества шинглов
+
+        Один вызов SHAKE-128 на шингл дает сразу NUM_PERMUTATIONS 32-битных
+        хешей, а минимумы по столбцам считаются встроенными map/min/zip
+        """
+        seed = self._seed
+        digest_size = NUM_PERMUTATIONS * 4
+        columns = [array('I', hashlib.shake_128(seed + shingle).digest(digest_size)) for shingle in shingles]
+        return tuple(map(min, zip(*columns)))
+
+    def _band_keys(self, signature):
+        return [
+            (band, signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND])
+            for band in range(BANDS)
+        ]
+
+    def _expire(self, now):
+        """Удаление записей старше окна и лишних сверх max_size"""
+        while self._expiry and (self._expiry[0][0] <= now or len(self._entries) > self.max_size):
+            _, entry_id = self._expiry.popleft()
+            self.remove(entry_id)
+
+    def remove(self, entry_id):
+        """Удаление записи (например, сообщения, которое не удалось сохранить)"""
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in self._band_keys(entry[0]):
+            bucket = self._bands.get(key)
+            if bucket is None:
+                continue
+            bucket.remove(entry_id)
+            if not bucket:
+                del self._bands[key]
+
+    def find(self, text):
+        """Самое похожее сообщение за окно: (строка, сходство) или (None, 0.0)"""
+        self.lookups += 1
+        shingles = text_shingles(text) if text else None
+        if not shingles:
+            return None, 0.0
+        self._expire(time.time())
+
+        signature = self.signature(shingles)
+        candidates = set()
+        for key in self._band_keys(signature):
+            bucket = self._bands.get(key)
+            if bucket:
+                candidates.update(bucket)
+
+        best_row, best_similarity = None, 0.0
+        for entry_id in candidates:
+            candidate_signature, row = self._entries[entry_id]
+            # Доля совпавших минимумов - оценка коэффициента Жаккара
+            similarity = sum(
+                1 for left, right in zip(signature, candidate_signature) if left == right
+            ) / NUM_PERMUTATIONS
+            if similarity > best_similarity:
+                best_row, best_similarity = row, similarity
+
+        if best_similarity >= self.threshold:
+            self.found += 1
+            return best_row, best_similarity
+        return None, best_similarity
+
+    def add(self, text, row, created_at=None):
+        """Добавление сохраненного сообщения; created_at - unix-время создания
+
+        Возвращает id записи для remove или None, если текст не индексируется
+        """
+        shingles = text_shingles(text) if text else None
+        if not shingles:
+            return None
+        now = time.time()
+        expires_at = (created_at if created_at is not None else now) + self.ttl_seconds
+        if expires_at <= now:
+            return None
+
+        signature = self.signature(shingles)
+        entry_id = self._next_id
+        self._next_id += 1
+        self._entries[entry_id] = (signature, row)
+        for key in self._band_keys(signature):
+            self._bands.setdefault(key, []).append(entry_id)
+        self._expiry.append((expires_at, entry_id))
+        self._expire(now)
+        return entry_id
+
+    def get_stats(self):
+        """Статистика индекса для TelegramParser.get_stats"""
+        return {
+            'size': len(self._entries),
+            'threshold': self.threshold,
+            'lookups': self.lookups,
+            'found': self.found
+        }
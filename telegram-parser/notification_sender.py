@@ -0,0 +1,219 @@
+"""
+Параллельная рассылка уведомлений получателям
+Рассылка ставится в собственную очередь и выполняется пулом отправителей,
+поэтому обработчики входящих сообщений не ждут лимитов Telegram. Число
+одновременных отправок ограничено размером пула, темп - token bucket, а при
+FloodWaitError все отправители приостанавливаются на время, которое запросил
+Telegram, и отправка повторяется после паузы. Клиент Telegram должен быть
+создан с flood_sleep_threshold=0, иначе Telethon сам пережидает короткие
+FloodWait внутри send_message и остальные отправители продолжают слать
+"""
+
+import asyncio
+import logging
+import time
+from collections import deque
+
+from telethon.errors import FloodWaitError
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+LATENCY_WINDOW = 1000
+
+
+class TokenBucket:
+    """Ограничитель темпа: rate токенов в секунду, не больше capacity подряд"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        """Ожидание одного токена (очередь ожидающих - по порядку)"""
+        async with self._lock:
+            self._refill()
+            while self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= 1
+
+
+class NotificationSender:
+    """Очередь рассылки и пул отправителей
+
+    send_message - корутина (target, text, parse_mode=...) -> отправленное сообщение.
+    После FloodWait отправка откладывается до конца общей паузы, какой бы
+    долгой она ни была (до max_flood_retries повторов); ждут только
+    отправители, обработчики входящих сообщений не блокируются
+    """
+
+    def __init__(self, send_message, max_concurrency=5, rate_per_second=5.0, burst=5, max_flood_retries=2,
+                 max_queue_size=1000):
+        self.send_message = send_message
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_flood_retries = max_flood_retries
+        self.max_queue_size = max_queue_size
+        self._bucket = TokenBucket(rate_per_second, burst)
+        # Момент (time.monotonic), до которого все отправки стоят из-за FloodWait
+        self._paused_until = 0.0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._queue = None
+        self._workers = []
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+        self.flood_waits = 0
+        self.flood_wait_seconds = 0
+        self.deferred = 0
+
+    def start(self):
+        """Запуск отправителей (нужен работающий цикл событий)"""
+        if self._workers:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._workers = [
+            asyncio.create_task(self._worker())
+            for _ in range(self.max_concurrency)
+        ]
+
+    def depth(self):
+        """Текущее число отправок в очереди"""
+        return self._queue.qsize() if self._queue else 0
+
+    async def _wait_flood(self):
+        while True:
+            delay = self._paused_until - time.monotonic()
+            if delay <= 0:
+                return
+            self.deferred += 1
+            await asyncio.sleep(delay)
+
+    async def send(self, target, text, parse_mode='markdown'):
+        """Отправка одному получателю; повтор после паузы FloodWait"""
+        attempt = 0
+        while True:
+            await self._wait_flood()
+            await self._bucket.acquire()
+            await self._wait_flood()
+            try:
+                return await self.send_message(target, text, parse_mode=parse_mode)
+            except FloodWaitError as e:
+                self.flood_waits += 1
+                self.flood_wait_seconds += e.seconds
+                # Пауза общая для всех отправителей
+                self._paused_until = max(self._paused_until, time.monotonic() + e.seconds)
+                logger.warning(f"ОТПРАВКА: FloodWait {e.seconds} с, все отправки приостановлены")
+                attempt += 1
+                if attempt > self.max_flood_retries:
+                    raise
+
+    def submit(self, deliveries, text, on_done=None, trace=None):
+        """Постановка рассылки списку (получатель, адрес) в очередь без ожидания доставки
+
+        on_done(results) вызывается, когда обработаны все адреса (результаты
+        в порядке deliveries); отправки идут в трассе trace
+        """
+        self.start()
+        fan_out = {
+            'results': [None] * len(deliveries),
+            'remaining': len(deliveries),
+            'on_done': on_done,
+            'trace': trace,
+            'started': time.perf_counter()
+        }
+        if not deliveries:
+            self._complete(fan_out)
+            return
+        for index, (recipient, target) in enumerate(deliveries):
+            try:
+                self._queue.put_nowait((fan_out, index, recipient, target, text))
+            except asyncio.QueueFull:
+                self.dropped += 1
+                logger.warning(f"ОТПРАВКА: Очередь рассылки заполнена ({self._queue.qsize()}), уведомление отброшено")
+                self._record(fan_out, index, recipient, target, RuntimeError('очередь рассылки заполнена'))
+
+    async def _worker(self):
+        queue = self._queue
+        while True:
+            fan_out, index, recipient, target, text = await queue.get()
+            try:
+                with tracing.use(fan_out['trace']):
+                    try:
+                        await self.send(target, text)
+                        error = None
+                    except Exception as e:
+                        error = e
+                self._record(fan_out, index, recipient, target, error)
+            finally:
+                queue.task_done()
+
+    def _record(self, fan_out, index, recipient, target, error):
+        # Время до доставки считается от постановки рассылки, включая ожидание очереди
+        latency = time.perf_counter() - fan_out['started']
+        if error is None:
+            self.sent += 1
+            self._latencies.append(latency)
+        else:
+            self.failed += 1
+        fan_out['results'][index] = {
+            'recipient': recipient,
+            'target': target,
+            'ok': error is None,
+            'error': error,
+            'latency': latency
+        }
+        fan_out['remaining'] -= 1
+        if fan_out['remaining'] == 0:
+            self._complete(fan_out)
+
+    def _complete(self, fan_out):
+        if fan_out['on_done'] is None:
+            return
+        try:
+            fan_out['on_done'](fan_out['results'])
+        except Exception as e:
+            logger.error(f"ОТПРАВКА: Ошибка обработки результатов рассылки: {e}")
+
+    async def close(self):
+        """Доотправка очереди и остановка отправителей"""
+        if not self._workers:
+            return
+        await self._queue.join()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def get_stats(self):
+        """Статистика рассылки для TelegramParser.get_stats"""
+        latencies = sorted(self._latencies)
+
+        def percentile(fraction):
+            if not latencies:
+                return 0.0
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * fraction))] * 1000, 1)
+
+        return {
+            'sent': self.sent,
+            'failed': self.failed,
+            'dropped': self.dropped,
+            'queue_depth': self.depth(),
+            'max_concurrency': self.max_concurrency,
+            'flood_waits': self.flood_waits,
+            'flood_wait_seconds': self.flood_wait_seconds,
+            'deferred': self.deferred,
+            'paused_for_seconds': max(0.0, round(self._paused_until - time.monotonic(), 1)),
+            'latency_p50_ms': percentile(0.5),
+            'latency_p95_ms': percentile(0.95),
+            'latency_max_ms': round(latencies[-1] * 1000, 1) if latencies else 0.0
+        }
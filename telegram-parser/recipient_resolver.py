@@ -0,0 +1,157 @@
+"""
+Кеш разрешенных получателей уведомлений
+Телефон или username получателя заранее превращается во input peer Telethon,
+чтобы отправка уведомления не тратила запросы на поиск контакта.
+Кеш с TTL сохраняется на диск и переживает перезапуск парсера
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerSelf, InputPeerUser
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join('cache', 'recipient_peers.json')
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+def peer_to_dict(peer):
+    """Сериализация input peer для файла кеша (None если тип не поддерживается)"""
+    if isinstance(peer, InputPeerUser):
+        return {'type': 'user', 'id': peer.user_id, 'access_hash': peer.access_hash}
+    if isinstance(peer, InputPeerChannel):
+        return {'type': 'channel', 'id': peer.channel_id, 'access_hash': peer.access_hash}
+    if isinstance(peer, InputPeerChat):
+        return {'type': 'chat', 'id': peer.chat_id}
+    if isinstance(peer, InputPeerSelf):
+        return {'type': 'self'}
+    return None
+
+
+def peer_from_dict(data):
+    peer_type = data.get('type')
+    if peer_type == 'user':
+        return InputPeerUser(data['id'], data['access_hash'])
+    if peer_type == 'channel':
+        return InputPeerChannel(data['id'], data['access_hash'])
+    if peer_type == 'chat':
+        return InputPeerChat(data['id'])
+    if peer_type == 'self':
+        return InputPeerSelf()
+    return None
+
+
+class RecipientResolver:
+    """Кеш контакт -> input peer с TTL и сохранением на диск
+
+    resolve_entity - корутина (contact) -> input peer, обычно client.get_input_entity
+    """
+
+    def __init__(self, resolve_entity, cache_path=DEFAULT_CACHE_PATH, ttl_seconds=DEFAULT_TTL_SECONDS):
+        self.resolve_entity = resolve_entity
+        self.cache_path = cache_path
+        self.ttl_seconds = ttl_seconds
+        self._peers = {}  # contact -> (peer, resolved_at)
+        self.failures = {}  # contact -> текст ошибки
+        self._task = None
+        self._pending = None
+        self.hits = 0
+        self.misses = 0
+        self.load()
+
+    def load(self):
+        """Чтение кеша с диска, просроченные записи пропускаются"""
+        if not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            now = time.time()
+            for contact, entry in data.get('peers', {}).items():
+                peer = peer_from_dict(entry)
+                if peer is not None and now - entry.get('resolved_at', 0) < self.ttl_seconds:
+                    self._peers[contact] = (peer, entry['resolved_at'])
+            logger.info(f"ПОЛУЧАТЕЛИ: Загружено {len(self._peers)} разрешенных контактов из {self.cache_path}")
+        except Exception as e:
+            logger.warning(f"ПОЛУЧАТЕЛИ: Не удалось прочитать кеш {self.cache_path}: {e}")
+
+    def save(self):
+        """Атомарная запись кеша на диск"""
+        try:
+            directory = os.path.dirname(self.cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            peers = {}
+            for contact, (peer, resolved_at) in self._peers.items():
+                entry = peer_to_dict(peer)
+                if entry is not None:
+                    entry['resolved_at'] = resolved_at
+                    peers[contact] = entry
+            temp_path = f"{self.cache_path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump({'version': 1, 'peers': peers}, file, ensure_ascii=False)
+            os.replace(temp_path, self.cache_path)
+        except Exception as e:
+            logger.warning(f"ПОЛУЧАТЕЛИ: Не удалось сохранить кеш {self.cache_path}: {e}")
+
+    def get(self, contact):
+        """Разрешенный peer для контакта или None"""
+        entry = self._peers.get(contact)
+        if entry is None or time.time() - entry[1] >= self.ttl_seconds:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def invalidate(self, contact):
+        """Сброс записи (например, если peer перестал быть валидным)"""
+        self._peers.pop(contact, None)
+
+    async def resolve_all(self, contacts):
+        """Разрешение всех контактов без свежей записи в кеше"""
+        now = time.time()
+        pending = [
+            contact for contact in dict.fromkeys(contacts)
+            if contact not in self._peers or now - self._peers[contact][1] >= self.ttl_seconds
+        ]
+        if not pending:
+            return
+
+        resolved = 0
+        for contact in pending:
+            try:
+                peer = await self.resolve_entity(contact)
+                self._peers[contact] = (peer, time.time())
+                self.failures.pop(contact, None)
+                resolved += 1
+            except Exception as e:
+                self.failures[contact] = str(e)
+                logger.warning(f"ПОЛУЧАТЕЛИ: ❌ Не удалось разрешить {contact}: {e}")
+        if resolved:
+            self.save()
+        logger.info(f"ПОЛУЧАТЕЛИ: Разрешено {resolved} из {len(pending)} контактов, ошибок: {len(self.failures)}")
+
+    def schedule(self, contacts):
+        """Фоновое разрешение контактов; во время работы задачи запоминается последний список"""
+        self._pending = list(contacts)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._resolve_pending())
+        return self._task
+
+    async def _resolve_pending(self):
+        while self._pending is not None:
+            contacts, self._pending = self._pending, None
+            await self.resolve_all(contacts)
+
+    def get_stats(self):
+        """Статистика кеша для TelegramParser.get_stats"""
+        return {
+            'resolved': len(self._peers),
+            'hits': self.hits,
+            'misses': self.misses,
+            'unresolved': dict(self.failures)
+        }
@@ -0,0 +1,66 @@
+"""
+Маршрутизация уведомлений: ключевое слово -> категории -> получатели
+Таблица строится один раз вместе с загрузкой ключевых слов, поэтому
+поиск получателей для сообщения не требует запросов к БД
+"""
+
+MEMO_MAX_SIZE = 1024
+
+
+class RecipientRouter:
+    """Неизменяемая таблица маршрутизации с мемоизацией по набору ключевых слов"""
+
+    def __init__(self, keyword_rows, recipient_rows):
+        # Ключи без учета регистра: 'Тандем' и 'тандем' - одно ключевое слово
+        self._keyword_categories = {}
+        for row in keyword_rows:
+            keyword = (row.get('keyword') or '').lower()
+            category = row.get('category')
+            if not keyword or not category:
+                continue
+            categories = self._keyword_categories.setdefault(keyword, [])
+            if category not in categories:
+                categories.append(category)
+
+        self._category_recipients = {}
+        for row in recipient_rows:
+            category = row.get('category')
+            if category:
+                self._category_recipients.setdefault(category, []).append(row)
+
+        self.recipient_count = len(recipient_rows)
+        self._memo = {}
+
+    def categories_for(self, keywords_found):
+        """Категории найденных ключевых слов в порядке первого появления"""
+        categories = []
+        for keyword in keywords_found:
+            for category in self._keyword_categories.get(keyword.lower(), ()):
+                if category not in categories:
+                    categories.append(category)
+        return categories
+
+    def recipients_for(self, keywords_found):
+        """Уникальные получатели (по телефону или username) для набора ключевых слов"""
+        key = frozenset(keyword.lower() for keyword in keywords_found)
+        recipients = self._memo.get(key)
+        if recipients is not None:
+            return recipients
+
+        recipients = []
+        seen_contacts = set()
+        for category in self.categories_for(keywords_found):
+            for recipient in self._category_recipients.get(category, ()):
+                contact_key = recipient.get('phone') or recipient.get('username')
+                if contact_key and contact_key not in seen_contacts:
+                    recipients.append(recipient)
+                    seen_contacts.add(contact_key)
+
+        if len(self._memo) >= MEMO_MAX_SIZE:
+            self._memo.clear()
+        self._memo[key] = recipients
+        return recipients
+
+    def all_recipients(self):
+        """Все активные получатели из таблицы"""
+        return [recipient for recipients in self._category_recipients.values() for recipient in recipients]
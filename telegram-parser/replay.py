@@ -0,0 +1,342 @@
+"""
+Офлайн-прогон записанных сообщений через конвейер парсера
+Сообщения из JSONL-файла подаются в TelegramParser.handle_new_message -
+тот же путь, что у событий Telethon (очередь, дедупликация, ключевые слова,
+пакетная запись, рассылка), но база данных заменена хранилищем в памяти,
+а Telegram - клиентом-заглушкой. Позволяет оценить пропускную способность
+без аккаунта Telegram и Supabase: файл сессии не расшифровывается, а кеши,
+лог и трассы прогона пишутся во временный каталог и удаляются после него.
+
+Запуск: python telegram_parser.py --replay messages.jsonl [--speed 10]
+
+Строка JSONL - одно сообщение:
+{"chat_id": -1001234567890, "chat_name": "Грузы КЗ", "id": 15, "sender_id": 42,
+ "username": "driver", "first_name": "Ерлан", "text": "...", "date": "2025-03-01T10:00:05+00:00"}
+Конфигурация (--replay-config) - JSON с ключами keywords, recipients и
+monitored_chats в формате строк таблиц; без monitored_chats отслеживаются
+все чаты из записи
+"""
+
+import asyncio
+import json
+import logging
+import os
+import tempfile
+import time
+import types
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+# Кеши парсера на время прогона пишутся во временный каталог
+CACHE_PATH_VARIABLES = {
+    'CONFIG_SNAPSHOT_PATH': 'config_snapshot.sqlite3',
+    'CHAT_FINGERPRINTS_PATH': 'chat_fingerprints.json',
+    'RECIPIENT_PEERS_CACHE': 'recipient_peers.json',
+    'DIALOG_SNAPSHOT_PATH': 'dialog_snapshot.json',
+    'CHAT_PARTICIPANTS_CACHE': 'chat_participants.json'
+}
+# Лог и трассы прогона - тоже во временный каталог, если не заданы явно
+OUTPUT_PATH_VARIABLES = {
+    'LOG_FILE': 'telegram_parser.log',
+    'TRACE_FILE': 'traces.jsonl'
+}
+
+
+class InMemoryRepository:
+    """Замена SupabaseRepository: те же методы, данные в памяти
+
+    latency - искусственная задержка каждого запроса в секундах (сетевой RTT)
+    """
+
+    def __init__(self, config, latency=0.0):
+        self.keywords = list(config.get('keywords', []))
+        self.recipients = list(config.get('recipients', []))
+        self.monitored_chats = list(config.get('monitored_chats', []))
+        self.latency = latency
+        self.messages = []
+        self.duplicates = []
+        self._by_hash = {}
+        self.calls = 0
+        self.calls_by_method = {}
+
+    async def _call(self, method):
+        self.calls += 1
+        self.calls_by_method[method] = self.calls_by_method.get(method, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def fetch_active_keywords(self, columns='keyword'):
+        await self._call('fetch_active_keywords')
+        return [dict(row) for row in self.keywords]
+
+    async def fetch_monitored_chats(self):
+        await self._call('fetch_monitored_chats')
+        return [dict(row) for row in self.monitored_chats]
+
+    async def find_message_by_hash(self, content_hash, since):
+        await self._call('find_message_by_hash')
+        return self._by_hash.get(content_hash)
+
+    async def fetch_messages_since(self, since, offset, limit):
+        await self._call('fetch_messages_since')
+        return self.messages[offset:offset + limit]
+
+    async def insert_messages(self, rows):
+        await self._call('insert_messages')
+        inserted = []
+        created_at = datetime.now(timezone.utc).isoformat()
+        for row in rows:
+            row = dict(row, id=len(self.messages) + 1, created_at=created_at)
+            self.messages.append(row)
+            self._by_hash.setdefault(row['content_hash'], row)
+            inserted.append(row)
+        return inserted
+
+    async def insert_message_duplicate(self, row):
+        await self._call('insert_message_duplicate')
+        self.duplicates.append(row)
+        return [row]
+
+    async def fetch_active_recipients(self):
+        await self._call('fetch_active_recipients')
+        return [dict(row) for row in self.recipients]
+
+    async def upsert_all_chats(self, chats):
+        await self._call('upsert_all_chats')
+        return chats
+
+    async def close(self):
+        pass
+
+    def get_stats(self):
+        return {
+            'calls': self.calls,
+            'errors': 0,
+            'average_latency_ms': self.latency * 1000
+        }
+
+
+class ReplayClient:
+    """Заглушка TelegramClient: отправки только считаются
+
+    is_connected() возвращает False, поэтому получатели не разрешаются
+    заранее и уведомления уходят по телефону или username
+    """
+
+    def __init__(self, send_latency=0.0):
+        self.send_latency = send_latency
+        self.sent = 0
+
+    async def send_message(self, target, text, parse_mode=None):
+        if self.send_latency:
+            await asyncio.sleep(self.send_latency)
+        self.sent += 1
+        return types.SimpleNamespace(id=self.sent)
+
+    async def get_input_entity(self, contact):
+        return contact
+
+    def is_connected(self):
+        return False
+
+    async def disconnect(self):
+        pass
+
+
+def load_records(path):
+    """Записанные сообщения из JSONL; пустые строки пропускаются"""
+    records = []
+    with open(path, 'r', encoding='utf-8') as file:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError as e:
+                logger.warning(f"ПРОГОН: Строка {line_number} пропущена: {e}")
+    return records
+
+
+def load_config(path, records):
+    """Конфигурация прогона; без monitored_chats - все чаты из записи"""
+    config = {}
+    if path:
+        with open(path, 'r', encoding='utf-8') as file:
+            config = json.load(file)
+    if not config.get('monitored_chats'):
+        chats = {}
+        for record in records:
+            chats.setdefault(record['chat_id'], record.get('chat_name') or str(record['chat_id']))
+        config['monitored_chats'] = [
+            {'chat_id': chat_id, 'chat_name': chat_name, 'active': True}
+            for chat_id, chat_name in chats.items()
+        ]
+    return config
+
+
+def record_time(record):
+    """Время сообщения в секундах epoch (date - ISO-строка или число) или None"""
+    value = record.get('date')
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return datetime.fromisoformat(str(value).replace('Z', '+00:00')).timestamp()
+    except ValueError:
+        return None
+
+
+def to_event(record):
+    """Объект с полями события Telethon NewMessage, которые читает парсер"""
+    chat_id = int(record['chat_id'])
+    chat = types.SimpleNamespace(id=chat_id, title=record.get('chat_name'))
+    sender = None
+    if record.get('username') or record.get('first_name') or record.get('last_name'):
+        sender = types.SimpleNamespace(
+            username=record.get('username'),
+            first_name=record.get('first_name'),
+            last_name=record.get('last_name')
+        )
+    message = types.SimpleNamespace(
+        id=record.get('id'),
+        text=record.get('text'),
+        sender_id=record.get('sender_id'),
+        sender=sender,
+        chat_id=chat_id,
+        chat=chat,
+        date=record.get('date')
+    )
+    return types.SimpleNamespace(chat_id=chat_id, chat=chat, message=message)
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_replay(parser_class, path, speed=0.0, config_path=None, db_latency_ms=0.0, send_latency_ms=0.0):
+    """Прогон файла через parser_class (TelegramParser); возвращает отчет
+
+    speed - 1 для реального темпа по полю date, N - в N раз быстрее,
+    0 - максимальная скорость (ограничена только очередью конвейера)
+    """
+    records = load_records(path)
+    config = load_config(config_path, records)
+
+    with tempfile.TemporaryDirectory(prefix='parser-replay-') as cache_dir:
+        # Кеши и снимки прогона не должны попасть в рабочий cache/
+        for variable, file_name in CACHE_PATH_VARIABLES.items():
+            os.environ[variable] = os.path.join(cache_dir, file_name)
+        for variable, file_name in OUTPUT_PATH_VARIABLES.items():
+            if variable not in os.environ:
+                os.environ[variable] = os.path.join(cache_dir, file_name)
+        os.environ.pop('DATABASE_URL', None)
+
+        repository = InMemoryRepository(config, db_latency_ms / 1000)
+        client = ReplayClient(send_latency_ms / 1000)
+        parser = parser_class(repository=repository, client=client)
+        if parser.config_reload_task:
+            await parser.config_reload_task
+        else:
+            await parser.reload_config()
+        await parser.warm_duplicate_cache()
+        startup_calls = dict(repository.calls_by_method)
+
+        # Сквозная задержка: от постановки в очередь до конца обработки
+        latencies = []
+        process_event = parser.ingestion.process_event
+
+        async def timed_process_event(item):
+            try:
+                await process_event(item)
+            finally:
+                latencies.append(time.perf_counter() - item.received_at)
+
+        parser.ingestion.process_event = timed_process_event
+        parser.ingestion.start()
+        parser.metrics.loop_lag.start()
+
+        skipped = 0
+        first_time = None
+        started = time.perf_counter()
+        for record in records:
+            if speed > 0:
+                moment = record_time(record)
+                if moment is not None:
+                    if first_time is None:
+                        first_time = moment
+                    delay = started + (moment - first_time) / speed - time.perf_counter()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+            event = to_event(record)
+            if not parser.is_monitored_event(event) or not event.message.text:
+                skipped += 1
+                continue
+            await parser.handle_new_message(event)
+
+        await parser.ingestion.stop()
+        await parser.message_writer.close()
+        elapsed = time.perf_counter() - started
+        # Рассылка идет вне обработчиков: ее доотправка учитывается отдельно
+        await parser.notification_sender.close()
+        notifications_elapsed = time.perf_counter() - started - elapsed
+        parser.metrics.loop_lag.stop()
+
+        latencies.sort()
+        processed = len(latencies)
+        calls_by_method = {
+            method: count - startup_calls.get(method, 0)
+            for method, count in repository.calls_by_method.items()
+            if count > startup_calls.get(method, 0)
+        }
+        db_calls = sum(calls_by_method.values())
+        report = {
+            'records': len(records),
+            'processed': processed,
+            'skipped': skipped,
+            'speed': speed,
+            'duration_seconds': round(elapsed, 3),
+            'messages_per_second': round(processed / elapsed, 1) if elapsed else 0.0,
+            'latency_ms': {
+                'p50': round(percentile(latencies, 0.5) * 1000, 2),
+                'p99': round(percentile(latencies, 0.99) * 1000, 2),
+                'max': round(latencies[-1] * 1000, 2) if latencies else 0.0
+            },
+            'db_calls': db_calls,
+            'db_calls_per_message': round(db_calls / processed, 3) if processed else 0.0,
+            'db_calls_by_method': calls_by_method,
+            'notifications_sent': client.sent,
+            'notifications_drain_seconds': round(notifications_elapsed, 3),
+            'duplicates': parser.stats['duplicates'],
+            'near_duplicates': parser.stats['near_duplicates'],
+            'keywords_found': parser.stats['keywords_found'],
+            'errors': parser.stats['errors'],
+            'message_writer': parser.message_writer.get_stats(),
+            'event_loop': parser.loop_watchdog.get_stats(top=5)
+        }
+        await parser.stop()
+    return report
+
+
+def format_report(report):
+    latency = report['latency_ms']
+    return '\n'.join([
+        f"📼 ПРОГОН: {report['processed']} из {report['records']} сообщений за {report['duration_seconds']} с "
+        f"(пропущено {report['skipped']}, скорость {report['speed'] or 'максимальная'})",
+        f"⚡ Пропускная способность: {report['messages_per_second']} сообщ/с",
+        f"⏱️ Задержка: p50 {latency['p50']} мс, p99 {latency['p99']} мс, max {latency['max']} мс",
+        f"🗄️ Запросов к БД: {report['db_calls']} ({report['db_calls_per_message']} на сообщение) {report['db_calls_by_method']}",
+        f"📨 Уведомлений: {report['notifications_sent']}, ключевые слова в {report['keywords_found']} сообщениях "
+        f"(доотправка после обработки {report['notifications_drain_seconds']} с)",
+        f"♻️ Дубликатов: {report['duplicates']} (почти-дубликатов {report['near_duplicates']}), ошибок: {report['errors']}",
+        f"🐢 Цикл событий: max задержка {report['event_loop']['max_lag_ms']} мс, "
+        f"блокировок дольше порога {report['event_loop']['blocks']} ({report['event_loop']['blocked_seconds']} с)"
+    ] + [
+        f"   {site['site']}: {site['blocks']} раз, всего {site['total_ms']} мс, max {site['max_ms']} мс"
+        for site in report['event_loop']['sites']
+    ])
@@ -0,0 +1,30 @@
+-- Уведомления об изменениях конфигурации парсера (config_feed.PostgresConfigFeed)
+-- Каждая вставка, правка или удаление в keywords, monitored_chats и
+-- recipient_categories отправляет строку в канал config_changes
+
+CREATE OR REPLACE FUNCTION notify_config_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('config_changes', json_build_object(
+        'table', TG_TABLE_NAME,
+        'op', TG_OP,
+        'row', CASE WHEN TG_OP = 'DELETE' THEN NULL ELSE row_to_json(NEW) END,
+        'old', CASE WHEN TG_OP = 'INSERT' THEN NULL ELSE row_to_json(OLD) END
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS keywords_config_change ON keywords;
+CREATE TRIGGER keywords_config_change
+    AFTER INSERT OR UPDATE OR DELETE ON keywords
+    FOR EACH ROW EXECUTE FUNCTION notify_config_change();
+
+DROP TRIGGER IF EXISTS monitored_chats_config_change ON monitored_chats;
+CREATE TRIGGER monitored_chats_config_change
+    AFTER INSERT OR UPDATE OR DELETE ON monitored_chats
+    FOR EACH ROW EXECUTE FUNCTION notify_config_change();
+
+DROP TRIGGER IF EXISTS recipient_categories_config_change ON recipient_categories;
+CREATE TRIGGER recipient_categories_config_change
+    AFTER INSERT OR UPDATE OR DELETE ON recipient_categories
+    FOR EACH ROW EXECUTE FUNCTION notify_config_change();
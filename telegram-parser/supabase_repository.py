@@ -0,0 +1,158 @@
+"""
+Асинхронный слой доступа к Supabase для парсера
+Все запросы идут через один пул keep-alive соединений httpx к PostgREST
+с таймаутами и ограничением числа одновременных запросов, поэтому
+медленный запрос не блокирует цикл событий и чтение обновлений Telegram
+"""
+
+import asyncio
+import time
+
+import httpx
+
+import tracing
+
+DEFAULT_TIMEOUT = 10.0
+DEFAULT_MAX_CONCURRENCY = 10
+
+MESSAGE_DUPLICATE_COLUMNS = 'id, message_text, chat_name, username, created_at'
+
+
+class SupabaseRepositoryError(Exception):
+    """Ошибка запроса к PostgREST"""
+
+    def __init__(self, status_code, message):
+        super().__init__(f"HTTP {status_code}: {message}")
+        self.status_code = status_code
+
+
+class SupabaseRepository:
+    """Репозиторий таблиц парсера поверх REST API Supabase"""
+
+    def __init__(self, supabase_url, supabase_key, timeout=DEFAULT_TIMEOUT,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self._client = httpx.AsyncClient(
+            base_url=f"{supabase_url.rstrip('/')}/rest/v1",
+            headers={
+                'apikey': supabase_key,
+                'Authorization': f"Bearer {supabase_key}",
+                'Content-Type': 'application/json'
+            },
+            timeout=httpx.Timeout(timeout),
+            limits=httpx.Limits(
+                max_connections=max_concurrency,
+                max_keepalive_connections=max_concurrency,
+                keepalive_expiry=60
+            )
+        )
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+        self.errors = 0
+        self.total_time = 0.0
+
+    async def _request(self, method, table, params=None, json=None, prefer=None):
+        """Один HTTP-запрос к таблице с учетом лимита одновременных запросов"""
+        headers = {'Prefer': prefer} if prefer else None
+        # Спан включает ожидание свободного слота в пуле запросов
+        with tracing.span('db', method=method, table=table):
+            async with self._semaphore:
+                started = time.perf_counter()
+                self.calls += 1
+                try:
+                    response = await self._client.request(method, f"/{table}", params=params, json=json, headers=headers)
+                except httpx.HTTPError:
+                    self.errors += 1
+                    raise
+                finally:
+                    self.total_time += time.perf_counter() - started
+
+        if not response.is_success:
+            self.errors += 1
+            raise SupabaseRepositoryError(response.status_code, response.text)
+        if not response.content:
+            return []
+        return response.json()
+
+    async def select(self, table, columns='*', filters=None, order=None, limit=None, offset=None):
+        """SELECT с фильтрами вида [(колонка, 'eq.значение'), ...]"""
+        # PostgREST не принимает пробелы в списке колонок
+        params = [('select', columns.replace(' ', ''))]
+        params.extend(filters or [])
+        if order:
+            params.append(('order', order))
+        if limit is not None:
+            params.append(('limit', str(limit)))
+        if offset:
+            params.append(('offset', str(offset)))
+        return await self._request('GET', table, params=params)
+
+    def _columns_param(self, rows):
+        """columns= для массовой вставки: объединение ключей всех строк
+
+        PostgREST отклоняет массив объектов с разными ключами без columns;
+        с ним отсутствующие в строке ключи записываются как NULL
+        """
+        columns = sorted({key for row in rows for key in row})
+        return [('columns', ','.join(columns))] if columns else []
+
+    async def insert(self, table, rows):
+        """INSERT списка строк, возвращает вставленные строки в том же порядке"""
+        return await self._request('POST', table, params=self._columns_param(rows), json=rows,
+                                   prefer='return=representation')
+
+    async def upsert(self, table, rows, on_conflict=None):
+        """UPSERT списка строк (слияние по первичному ключу или on_conflict)"""
+        params = self._columns_param(rows)
+        if on_conflict:
+            params.append(('on_conflict', on_conflict))
+        return await self._request('POST', table, params=params, json=rows,
+                                   prefer='resolution=merge-duplicates,return=minimal')
+
+    # --- Запросы парсера ---
+
+    async def fetch_active_keywords(self, columns='keyword'):
+        return await self.select('keywords', columns, [('active', 'eq.true')])
+
+    async def fetch_monitored_chats(self):
+        return await self.select('monitored_chats', '*', [('active', 'eq.true')])
+
+    async def find_message_by_hash(self, content_hash, since):
+        """Оригинал сообщения с этим хешем, созданный не раньше since"""
+        rows = await self.select(
+            'messages', MESSAGE_DUPLICATE_COLUMNS,
+            [('content_hash', f"eq.{content_hash}"), ('created_at', f"gte.{since}")],
+            limit=1
+        )
+        return rows[0] if rows else None
+
+    async def fetch_messages_since(self, since, offset, limit):
+        """Страница сообщений за период по возрастанию created_at"""
+        return await self.select(
+            'messages', f"{MESSAGE_DUPLICATE_COLUMNS}, content_hash",
+            [('created_at', f"gte.{since}")],
+            order='created_at.asc', limit=limit, offset=offset
+        )
+
+    async def insert_messages(self, rows):
+        return await self.insert('messages', rows)
+
+    async def insert_message_duplicate(self, row):
+        return await self.insert('message_duplicates', [row])
+
+    async def fetch_active_recipients(self):
+        """Все активные получатели с их категориями"""
+        return await self.select('recipient_categories', '*', [('active', 'eq.true')])
+
+    async def upsert_all_chats(self, chats):
+        return await self.upsert('all_chats', chats)
+
+    async def close(self):
+        await self._client.aclose()
+
+    def get_stats(self):
+        """Статистика запросов для TelegramParser.get_stats"""
+        return {
+            'calls': self.calls,
+            'errors': self.errors,
+            'average_latency_ms': self.total_time / self.calls * 1000 if self.calls else 0.0
+        }
@@ -1,88 +1,81 @@
 # --- Автоматическая расшифровка файла сессии ---
 import os
-# Проверяем два возможных пути для зашифрованного файла
-enc_paths = ['railway_production.session.enc', os.path.join('telegram-parser', 'railway_production.session.enc')]
-dec_paths = ['railway_production.session', os.path.join('telegram-parser', 'railway_production.session')]
-
-print(f'📂 Текущая директория: {os.getcwd()}')
-print(f'📄 Содержимое: {os.listdir()}')
-
-# Находим правильный путь
-enc_path, dec_path = None, None
-for i, (ep, dp) in enumerate(zip(enc_paths, dec_paths)):
-    if os.path.exists(ep):
-        enc_path, dec_path = ep, dp
-        print(f'🔍 Найден зашифрованный файл по пути: {ep}')
-        break
-
-if enc_path and not os.path.exists(dec_path):
-    print(f'🔐 Расшифровка файла {enc_path}...')
-    try:
-        from cryptography.fernet import Fernet
-        # Пробуем все возможные варианты названий переменной (исключаем TELEGRAM_SESSION_NAME - это имя, а не ключ)
-        key_vars = ['SESSION_KEY', 'TELEGRAM_SESSION_KEY', 'RAILWAY_SESSION_KEY', 'AUTOLOGIST_SESSION_KEY', 'PARSER_SESSION_KEY', 'DECRYPT_KEY', 'ENC_KEY']
-        key = None
-        for var_name in key_vars:
-            key = os.getenv(var_name)
-            if key:
-                print(f'🔑 Найден ключ в переменной: {var_name}')
-                break
+def decrypt_session_file():
+    """Расшифровка railway_production.session (нужна только для подключения к Telegram)"""
+    # Проверяем два возможных пути для зашифрованного файла
+    enc_paths = ['railway_production.session.enc', os.path.join('telegram-parser', 'railway_production.session.enc')]
+    dec_paths = ['railway_production.session', os.path.join('telegram-parser', 'railway_production.session')]
+
+    print(f'📂 Текущая директория: {os.getcwd()}')
+    print(f'📄 Содержимое: {os.listdir()}')
+
+    # Находим правильный путь
+    enc_path, dec_path = None, None
+    for i, (ep, dp) in enumerate(zip(enc_paths, dec_paths)):
+        if os.path.exists(ep):
+            enc_path, dec_path = ep, dp
+            print(f'🔍 Найден зашифрованный файл по пути: {ep}')
+            break
+
+    if enc_path and not os.path.exists(dec_path):
+        print(f'🔐 Расшифровка файла {enc_path}...')
+        try:
+            from cryptography.fernet import Fernet
+            # Пробуем все возможные варианты названий переменной (исключаем TELEGRAM_SESSION_NAME - это имя, а не ключ)
+            key_vars = ['SESSION_KEY', 'TELEGRAM_SESSION_KEY', 'RAILWAY_SESSION_KEY', 'AUTOLOGIST_SESSION_KEY', 'PARSER_SESSION_KEY', 'DECRYPT_KEY', 'ENC_KEY']
+            key = None
+            for var_name in key_vars:
+                key = os.getenv(var_name)
+                if key:
+                    print(f'🔑 Найден ключ в переменной: {var_name}')
+                    break
         
-        print(f'🔑 Итоговый ключ: {key}')
-        print(f'🔑 Длина ключа: {len(key) if key else "None"}')
+            print(f'🔑 Итоговый ключ: {key}')
+            print(f'🔑 Длина ключа: {len(key) if key else "None"}')
         
-        # Проверяем, что ключ имеет правильный формат для Fernet (32 байта в base64)
-        if key and len(key) < 32:
-            print(f'⚠️  Ключ слишком короткий ({len(key)} символов). Нужен 32+ символов base64.')
-            key = None
+            # Проверяем, что ключ имеет правильный формат для Fernet (32 байта в base64)
+            if key and len(key) < 32:
+                print(f'⚠️  Ключ слишком короткий ({len(key)} символов). Нужен 32+ символов base64.')
+                key = None
         
-        print(f'🌍 ВСЕ переменные окружения с SESSION в названии:')
-        for k in sorted(os.environ.keys()):
-            if 'SESSION' in k.upper():
-                print(f'   {k} = {os.environ[k][:10]}...' if len(os.environ[k]) > 10 else f'   {k} = {os.environ[k]}')
+            print(f'🌍 ВСЕ переменные окружения с SESSION в названии:')
+            for k in sorted(os.environ.keys()):
+                if 'SESSION' in k.upper():
+                    print(f'   {k} = {os.environ[k][:10]}...' if len(os.environ[k]) > 10 else f'   {k} = {os.environ[k]}')
         
-        if not key:
-            print('🚨 КРИТИЧЕСКАЯ ИНФОРМАЦИЯ ДЛЯ ДИАГНОСТИКИ:')
-            print(f'🌍 Все переменные окружения ({len(os.environ)} штук):')
-            for k, v in sorted(os.environ.items()):
-                if 'SESSION' in k.upper() or 'TELEGRAM' in k.upper() or 'KEY' in k.upper():
-                    # Показываем полную переменную для диагностики
-                    print(f'   🔍 {k} = {v}')
-            
-            # 🚨 ВРЕМЕННОЕ РЕШЕНИЕ для Railway - используем правильный ключ
-            print('🔧 ВРЕМЕННОЕ РЕШЕНИЕ: Используем правильный ключ для Railway')
-            key = 'p62-NDe-BuYG66Qxk9gwC4HIp4vbIbLGIIyufjSq-Vc='
-            print(f'🔑 Используем правильный ключ длиной: {len(key)} символов')
+            if not key:
+                print('🚨 КРИТИЧЕСКАЯ ИНФОРМАЦИЯ ДЛЯ ДИАГНОСТИКИ:')
+                print(f'🌍 Все переменные окружения ({len(os.environ)} штук):')
+                for k, v in sorted(os.environ.items()):
+                    if 'SESSION' in k.upper() or 'TELEGRAM' in k.upper() or 'KEY' in k.upper():
+                        # Показываем полную переменную для диагностики
+                        print(f'   🔍 {k} = {v}')
+            
+                # 🚨 ВРЕМЕННОЕ РЕШЕНИЕ для Railway - используем правильный ключ
+                print('🔧 ВРЕМЕННОЕ РЕШЕНИЕ: Используем правильный ключ для Railway')
+                key = 'p62-NDe-BuYG66Qxk9gwC4HIp4vbIbLGIIyufjSq-Vc='
+                print(f'🔑 Используем правильный ключ длиной: {len(key)} символов')
         
-        if not key:
-            raise Exception('Ни одна из переменных ключа не найдена! Проверяемые переменные: ' + ', '.join(key_vars))
-        f = Fernet(key.encode())
-        with open(enc_path, 'rb') as file:
-            encrypted_data = file.read()
-            print(f'📦 Размер зашифрованного файла: {len(encrypted_data)} байт')
-            decrypted = f.decrypt(encrypted_data)
-        with open(dec_path, 'wb') as file:
-            file.write(decrypted)
-        print(f'✅ Файл {dec_path} успешно расшифрован!')
-    except Exception as e:
-        print(f'❌ Ошибка расшифровки: {e}')
-else:
-    if not enc_path:
-        print(f'⚠️ Зашифрованный файл сессии не найден в путях: {enc_paths}')
-    elif os.path.exists(dec_path):
-        print(f'ℹ️ Файл сессии {dec_path} уже существует')
+            if not key:
+                raise Exception('Ни одна из переменных ключа не найдена! Проверяемые переменные: ' + ', '.join(key_vars))
+            f = Fernet(key.encode())
+            with open(enc_path, 'rb') as file:
+                encrypted_data = file.read()
+                print(f'📦 Размер зашифрованного файла: {len(encrypted_data)} байт')
+                decrypted = f.decrypt(encrypted_data)
+            with open(dec_path, 'wb') as file:
+                file.write(decrypted)
+            print(f'✅ Файл {dec_path} успешно расшифрован!')
+        except Exception as e:
+            print(f'❌ Ошибка расшифровки: {e}')
+    else:
+        if not enc_path:
+            print(f'⚠️ Зашифрованный файл сессии не найден в путях: {enc_paths}')
+        elif os.path.exists(dec_path):
+            print(f'ℹ️ Файл сессии {dec_path} уже существует')
 
 import logging
-# Настройка логгера
-os.makedirs('logs', exist_ok=True)
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/telegram_parser.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
+# Логгер модуля; обработчики настраиваются в setup_logging после load_dotenv
 logger = logging.getLogger(__name__)
 """
 Telegram парсер для сбора сообщений из групповых чатов
@@ -103,6 +96,7 @@ import os
 import hashlib
 import re
 import json
+import time
 from datetime import datetime, timedelta
 from telethon import TelegramClient, events
 from telethon.errors import SessionPasswordNeededError, FloodWaitError
@@ -125,31 +119,48 @@ except ImportError:
     logger.warning("⚠️ session_helper не найден, будет использована локальная сессия")
     setup_session_from_env = None
 
+from keyword_matcher import KeywordMatcher
+import text_processing
+from dedup_cache import DuplicateCache, PendingMessages, parse_created_at
+from bloom_filter import RotatingBloomFilter
+from near_duplicates import NearDuplicateIndex
+from message_writer import BatchedMessageWriter
+from supabase_repository import SupabaseRepository
+from ingestion_pipeline import IngestionPipeline, IncomingMessage
+from recipient_routing import RecipientRouter
+from notification_sender import NotificationSender
+from recipient_resolver import RecipientResolver
+from config_feed import ConfigTables, LocalConfigFeed, PostgresConfigFeed
+from config_snapshot import ConfigSnapshot
+from control_server import ControlServer, ControlError
+from chat_discovery import ChatDiscovery
+from chat_enrichment import ParticipantCountEnricher
+from chat_list_service import ChatListService
+from dialog_snapshot import DialogSnapshot
+from metrics import ParserMetrics
+from loop_watchdog import LoopWatchdog
+from logging_setup import setup_logging
+import tracing
+from tracing import JsonlExporter, Tracer
+
 # Загружаем переменные окружения
 load_dotenv()
 
-# Создаем папку для логов если её нет
-os.makedirs('logs', exist_ok=True)
-
-# Настройка логирования
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('logs/telegram_parser.log', encoding='utf-8'),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
 
 class TelegramParser:
     def create_message_hash(self, text, sender_id):
         """Создаёт уникальный хеш для сообщения по тексту и id пользователя"""
-        import hashlib
-        hash_input = f"{text}:{sender_id}"
-        return hashlib.sha256(hash_input.encode('utf-8')).hexdigest()
-    def __init__(self):
-        """Инициализация парсера"""
+        return text_processing.create_message_hash(text, sender_id)
+
+    def __init__(self, repository=None, client=None):
+        """Инициализация парсера
+
+        repository и client подставляются вместо Supabase и Telegram
+        (офлайн-прогон replay.py); по умолчанию создаются из .env
+        """
+        # Запись логов в отдельном потоке с ротацией (LOG_LEVEL, PARSER_DEBUG,
+        # LOG_FORMAT, LOG_FILE); повторный вызов возвращает уже настроенное
+        self.logging_runtime = setup_logging()
         logger.info("ЗАПУСК: Инициализация Telegram парсера...")
         
         # Telegram API данные
@@ -169,89 +180,201 @@ class TelegramParser:
         # self.my_telegram_id = os.getenv('MY_TELEGRAM_ID', 'disabled')
         
         # Проверяем наличие обязательных переменных
-        if not self.api_id or not self.api_hash:
+        if client is None and (not self.api_id or not self.api_hash):
             logger.error("ОШИБКА: TELEGRAM_API_ID и TELEGRAM_API_HASH должны быть установлены в .env файле")
             raise ValueError("Не установлены обязательные переменные окружения")
         
         # Инициализация Supabase
-        try:
-            supabase_url = os.getenv('SUPABASE_URL')
-            # ИСПРАВЛЕНИЕ: используем SERVICE_ROLE_KEY для доступа к данным
-            supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-            
-            # ДИАГНОСТИКА: покажем, какие ключи загружены
-            logger.info(f"ДИАГНОСТИКА: SUPABASE_URL = {supabase_url}")
-            logger.info(f"ДИАГНОСТИКА: SUPABASE_SERVICE_ROLE_KEY (первые 20 символов) = {supabase_key[:20] if supabase_key else 'НЕ ЗАГРУЖЕН'}")
-            
-            if not supabase_url or not supabase_key:
-                raise ValueError("SUPABASE_URL и SUPABASE_SERVICE_ROLE_KEY должны быть установлены")
-            
-            self.supabase = create_client(supabase_url, supabase_key)
-            logger.info("УСПЕХ: База данных подключена")
-        except Exception as e:
-            logger.error(f"ОШИБКА: Подключение к БД: {e}")
-            raise
+        if repository is not None:
+            self.supabase = None
+            self.repository = repository
+        else:
+            try:
+                supabase_url = os.getenv('SUPABASE_URL')
+                # ИСПРАВЛЕНИЕ: используем SERVICE_ROLE_KEY для доступа к данным
+                supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
+            
+                # ДИАГНОСТИКА: покажем, какие ключи загружены
+                logger.info(f"ДИАГНОСТИКА: SUPABASE_URL = {supabase_url}")
+                logger.info(f"ДИАГНОСТИКА: SUPABASE_SERVICE_ROLE_KEY (первые 20 символов) = {supabase_key[:20] if supabase_key else 'НЕ ЗАГРУЖЕН'}")
+            
+                if not supabase_url or not supabase_key:
+                    raise ValueError("SUPABASE_URL и SUPABASE_SERVICE_ROLE_KEY должны быть установлены")
+            
+                self.supabase = create_client(supabase_url, supabase_key)
+                # Асинхронный репозиторий для всех запросов из корутин
+                self.repository = SupabaseRepository(
+                    supabase_url,
+                    supabase_key,
+                    timeout=float(os.getenv('SUPABASE_TIMEOUT', '10')),
+                    max_concurrency=int(os.getenv('SUPABASE_MAX_CONCURRENCY', '10'))
+                )
+                logger.info("УСПЕХ: База данных подключена")
+            except Exception as e:
+                logger.error(f"ОШИБКА: Подключение к БД: {e}")
+                raise
             
         # Инициализация переменных
         self.client = None
         self.keywords = []
-        self.monitored_chats = []
+        self.keyword_matcher = KeywordMatcher([])
+        # Таблица ключевое слово -> категории -> получатели (строится в load_keywords)
+        self.recipient_router = None
+        # Отслеживаемые чаты: chat_id (int, как event.chat_id) -> строка monitored_chats
+        self.monitored_chats = {}
         self.last_keywords_reload = 0  # Время последней перезагрузки ключевых слов
+        # Строки keywords, monitored_chats и recipient_categories, к которым
+        # применяются изменения из потока конфигурации
+        self.config_tables = ConfigTables()
+        self.config_feed = self.create_config_feed()
+        self.config_reload_task = None
+        self.config_periodic_task = None
+        # Последняя известная конфигурация на диске; пишется только после
+        # успешной полной загрузки из БД (config_synced)
+        self.config_snapshot = ConfigSnapshot(
+            os.getenv('CONFIG_SNAPSHOT_PATH', os.path.join('cache', 'config_snapshot.sqlite3'))
+        )
+        self.config_synced = False
+        # Локальный канал управления (команды от backend без остановки мониторинга)
+        self.control_server = ControlServer(
+            host=os.getenv('CONTROL_HOST', '127.0.0.1'),
+            port=int(os.getenv('CONTROL_PORT', '8765')),
+            token=os.getenv('CONTROL_TOKEN') or None
+        )
+        self.control_server.add_command('/discover-chats', 'POST', self.control_discover_chats)
+        self.control_server.add_command('/reload-config', 'POST', self.control_reload_config)
+        self.control_server.add_command('/backfill', 'POST', self.control_backfill)
+        self.control_server.add_command('/stats', 'GET', self.control_stats)
+        self.control_server.add_command('/metrics', 'GET', self.control_metrics)
+        self.background_jobs = {}
+        # Выгрузка в all_chats только новых и изменившихся чатов
+        self.chat_discovery = ChatDiscovery(
+            self.repository.upsert_all_chats,
+            fingerprints_path=os.getenv('CHAT_FINGERPRINTS_PATH', os.path.join('cache', 'chat_fingerprints.json')),
+            chunk_size=int(os.getenv('CHAT_DISCOVERY_CHUNK_SIZE', '200'))
+        )
+        # Кеш хешей за последние 24 часа перед запросом в messages
+        self.duplicate_cache = DuplicateCache(
+            max_size=int(os.getenv('DEDUP_CACHE_MAX_SIZE', '100000'))
+        )
+        # Хеши, прошедшие дедупликацию и ждущие пакетной записи в messages
+        self.pending_messages = PendingMessages()
+        # Почасовые фильтры Блума: точный промах пропускает проверку дубликата
+        self.duplicate_filter = RotatingBloomFilter(
+            capacity_per_bucket=int(os.getenv('DEDUP_BLOOM_CAPACITY_PER_HOUR', '20000')),
+            error_rate=float(os.getenv('DEDUP_BLOOM_ERROR_RATE', '0.001'))
+        )
+        # MinHash/LSH индекс для репостов с небольшими изменениями текста
+        self.near_duplicates = NearDuplicateIndex(
+            threshold=float(os.getenv('NEAR_DUPLICATE_THRESHOLD', '0.7')),
+            max_size=int(os.getenv('NEAR_DUPLICATE_MAX_SIZE', '50000'))
+        )
+        # Пакетная запись в messages: N строк или T мс, что наступит раньше
+        self.message_writer = BatchedMessageWriter(
+            self.insert_message_rows,
+            max_batch_size=int(os.getenv('MESSAGE_BATCH_SIZE', '50')),
+            max_delay_ms=int(os.getenv('MESSAGE_BATCH_DELAY_MS', '50'))
+        )
+        # Параллельная рассылка с лимитом одновременных отправок и темпа
+        self.notification_sender = NotificationSender(
+            self.send_notification,
+            max_concurrency=int(os.getenv('NOTIFY_MAX_CONCURRENCY', '5')),
+            rate_per_second=float(os.getenv('NOTIFY_RATE_PER_SECOND', '5')),
+            burst=int(os.getenv('NOTIFY_BURST', '5')),
+            max_queue_size=int(os.getenv('NOTIFY_QUEUE_SIZE', '1000'))
+        )
+        # Разрешенные заранее input peer получателей (кеш на диске с TTL)
+        self.recipient_resolver = RecipientResolver(
+            self.resolve_recipient_entity,
+            cache_path=os.getenv('RECIPIENT_PEERS_CACHE', os.path.join('cache', 'recipient_peers.json')),
+            ttl_seconds=int(os.getenv('RECIPIENT_PEERS_TTL', str(7 * 24 * 60 * 60)))
+        )
+        # Очередь входящих сообщений и пул обработчиков за ней
+        self.ingestion = IngestionPipeline(
+            self.process_incoming_message,
+            workers=int(os.getenv('INGESTION_WORKERS', '4')),
+            max_queue_size=int(os.getenv('INGESTION_QUEUE_SIZE', '1000')),
+            overflow_policy=os.getenv('INGESTION_OVERFLOW_POLICY', 'wait'),
+            on_drop=self.incoming_message_dropped
+        )
+        # Счетчики и время этапов для /metrics; сторожевой поток цикла событий
+        # снимает стек, если цикл заблокирован дольше порога
+        self.loop_watchdog = LoopWatchdog(
+            interval=float(os.getenv('LOOP_WATCHDOG_INTERVAL_MS', '100')) / 1000,
+            threshold=float(os.getenv('LOOP_WATCHDOG_THRESHOLD_MS', '250')) / 1000
+        )
+        self.metrics = ParserMetrics(self.loop_watchdog)
+        self.metrics.registry.gauge(
+            'parser_event_loop_blocks_total', 'Блокировки цикла событий дольше порога', lambda: self.loop_watchdog.blocks, 'counter'
+        )
+        self.metrics.registry.gauge(
+            'parser_event_loop_blocked_seconds_total', 'Время блокировок цикла событий по месту вызова',
+            self.loop_watchdog.blocked_seconds_by_site, 'counter', 'site'
+        )
+        self.metrics.registry.gauge('parser_ingestion_queue_depth', 'Событий в очереди обработки', self.ingestion.depth)
+        self.metrics.registry.gauge('parser_ingestion_busy_workers', 'Занятые обработчики очереди', lambda: self.ingestion.busy_workers)
+        self.metrics.registry.gauge('parser_notification_queue_depth', 'Уведомлений в очереди рассылки', self.notification_sender.depth)
+        self.metrics.registry.gauge(
+            'parser_log_records_total', 'Записи лога по уровню', lambda: dict(self.logging_runtime.handler.counts), 'counter', 'level'
+        )
+        self.metrics.registry.gauge(
+            'parser_log_dropped_total', 'Записи лога, отброшенные при переполнении очереди', lambda: self.logging_runtime.handler.dropped, 'counter'
+        )
+        # Трассы сообщений: доля TRACE_SAMPLE_RATE плюс все медленные и с ошибками
+        trace_file = os.getenv('TRACE_FILE', os.path.join('logs', 'traces.jsonl'))
+        self.tracer = Tracer(
+            JsonlExporter(trace_file, max_bytes=int(os.getenv('TRACE_MAX_BYTES', str(20 * 1024 * 1024)))) if trace_file else None,
+            sample_rate=float(os.getenv('TRACE_SAMPLE_RATE', '0.01')),
+            slow_threshold_ms=float(os.getenv('TRACE_SLOW_MS', '2000'))
+        )
         self.stats = {
             'messages_processed': 0,
             'duplicates': 0,
             'errors': 0,
-            'keywords_found': 0
+            'keywords_found': 0,
+            'near_duplicates': 0
         }
         
         try:
             # В Railway создаем файл сессии из переменной окружения
-            if setup_session_from_env:
+            if setup_session_from_env and client is None:
                 setup_session_from_env()
             
-            # Определяем возможные пути к сессии
-            possible_paths = [
-                f"{self.session_name}.session",  # В текущей папке
-                os.path.join('..', f"{self.session_name}.session"),  # В родительской папке
-                os.path.join('/', f"{self.session_name}.session"),   # В корне контейнера
-            ]
-            
-            session_path = None
-            for path in possible_paths:
-                if os.path.exists(path):
-                    session_path = path
-                    logger.info(f"✅ НАЙДЕНА СЕССИЯ: {path}")
-                    break
-            
-            # Проверяем существование файла сессии
-            if not session_path:
-                logger.error("❌ Файл сессии не найден ни в одном из путей:")
-                for path in possible_paths:
-                    logger.error(f"   ❌ {path}")
-                logger.error("💡 Сессия должна быть создана до инициализации парсера")
-                raise Exception("Файл сессии не найден")
-            
-            # Создаем клиент с найденным путем к сессии
-            # Убираем расширение .session для имени сессии
-            session_name_for_client = session_path.replace('.session', '')
-            self.client = TelegramClient(session_name_for_client, self.api_id, self.api_hash)
-            
-            # Загружаем данные
-            asyncio.create_task(self.load_keywords())
-            asyncio.create_task(self.load_monitored_chats())
+            self.client = client if client is not None else self.create_telegram_client()
+            # Список чатов для дашборда отдается через канал управления этим же клиентом
+            self.chat_list = ChatListService(self.client, DialogSnapshot(
+                os.getenv('DIALOG_SNAPSHOT_PATH', os.path.join('cache', 'dialog_snapshot.json')),
+                ttl_seconds=int(os.getenv('DIALOG_SNAPSHOT_TTL', str(24 * 60 * 60)))
+            ), ParticipantCountEnricher(
+                os.getenv('CHAT_PARTICIPANTS_CACHE', os.path.join('cache', 'chat_participants.json')),
+                max_concurrency=int(os.getenv('CHAT_ENRICH_CONCURRENCY', '4')),
+                rate_per_second=float(os.getenv('CHAT_ENRICH_RATE_PER_SECOND', '5')),
+                time_budget=float(os.getenv('CHAT_ENRICH_TIME_BUDGET', '10'))
+            ))
+            self.control_server.add_command('/dialogs', 'GET', self.chat_list.handle_dialogs)
             
             logger.info("УСПЕХ: Telegram клиент запущен")
             
-            # Загружаем ключевые слова и чаты
-            keywords_data = self.load_keywords_sync()
-            self.keywords = [item['keyword'].lower() for item in keywords_data]
+            # Загружаем ключевые слова, чаты и получателей: из локального снимка,
+            # а без снимка (первый запуск) - синхронно из БД
+            if not self.load_config_snapshot() and self.supabase is not None:
+                keywords_data = self.load_keywords_sync()
+                self.config_tables.load('keywords', keywords_data)
+                self.set_keywords([item['keyword'].lower() for item in self.config_tables.rows('keywords')])
+                
+                chats_data = self.load_monitored_chats_sync()
+                self.config_tables.load('monitored_chats', chats_data)
+                self.set_monitored_chats(self.config_tables.rows('monitored_chats'))
             logger.info(f"ДАННЫЕ: Загружено {len(self.keywords)} ключевых слов")
-            logger.info(f"ДИАГНОСТИКА: Список ключевых слов: {self.keywords}")
-            
-            chats_data = self.load_monitored_chats_sync()
-            self.monitored_chats = chats_data
             logger.info(f"ДАННЫЕ: Загружено {len(self.monitored_chats)} чатов для мониторинга")
             
+            # Сверка с БД в фоне (нужен работающий цикл событий)
+            try:
+                asyncio.get_running_loop()
+                self.config_reload_task = asyncio.create_task(self.reload_config())
+            except RuntimeError:
+                pass
+            
         except Exception as e:
             logger.error(f"ОШИБКА: Инициализация: {e}")
             if self.client:
@@ -260,59 +383,57 @@ class TelegramParser:
         except KeyboardInterrupt:
             logger.error(f"ОШИБКА: Инициализация прервана пользователем")
             raise
-    async def discover_chats(self):
-        """Получение списка чатов пользователя через Telethon"""
+
+    def create_telegram_client(self):
+        """Telegram клиент с найденным файлом сессии"""
+        # Определяем возможные пути к сессии
+        possible_paths = [
+            f"{self.session_name}.session",  # В текущей папке
+            os.path.join('..', f"{self.session_name}.session"),  # В родительской папке
+            os.path.join('/', f"{self.session_name}.session"),   # В корне контейнера
+        ]
+        
+        session_path = None
+        for path in possible_paths:
+            if os.path.exists(path):
+                session_path = path
+                logger.info(f"✅ НАЙДЕНА СЕССИЯ: {path}")
+                break
+        
+        # Проверяем существование файла сессии
+        if not session_path:
+            logger.error("❌ Файл сессии не найден ни в одном из путей:")
+            for path in possible_paths:
+                logger.error(f"   ❌ {path}")
+            logger.error("💡 Сессия должна быть создана до инициализации парсера")
+            raise Exception("Файл сессии не найден")
+        
+        # Создаем клиент с найденным путем к сессии
+        # Убираем расширение .session для имени сессии
+        session_name_for_client = session_path.replace('.session', '')
+        # FloodWait любой длины доходит до NotificationSender, который
+        # приостанавливает всех отправителей, а не спит внутри одного запроса
+        return TelegramClient(session_name_for_client, self.api_id, self.api_hash, flood_sleep_threshold=0)
+
+    async def discover_chats(self, full_refresh=False):
+        """Потоковая выгрузка групп и каналов пользователя в all_chats (клиент уже подключен)"""
         try:
-            await self.client.start()
-            dialogs = await self.client.get_dialogs()
-            chats = []
-            from datetime import datetime
-            for dialog in dialogs:
-                if dialog.is_group or dialog.is_channel:
-                    chat_data = {
-                        'chat_id': str(dialog.id),
-                        'chat_name': dialog.name or str(dialog.id),
-                        'active': True,
-                        'created_at': datetime.now().isoformat()
-                    }
-                    chats.append(chat_data)
-            logger.info(f"Найдено {len(chats)} чатов для записи в базу. Данные: {chats}")
             try:
-                response = self.supabase.table('all_chats').upsert(chats).execute()
-                logger.info(f"Ответ Supabase: {response}")
-                # Проверка на типичный признак ошибки
-                if hasattr(response, 'status_code') and response.status_code != 200:
-                    logger.error(f"Ошибка записи в Supabase: {response}")
-                elif hasattr(response, 'error') and response.error:
-                    logger.error(f"Ошибка Supabase: {response.error}")
-                else:
-                    logger.info(f"УСПЕХ: Обновлено {len(chats)} чатов в all_chats (Supabase)")
-            except Exception as db_exc:
-                logger.error(f"ОШИБКА при записи в Supabase: {db_exc}. Данные: {chats}")
+                stats = await self.chat_discovery.run(self.client.iter_dialogs(), full_refresh=full_refresh)
+            except FloodWaitError as e:
+                # Клиент не пережидает FloodWait сам (flood_sleep_threshold=0); записанные
+                # пакеты уже в отпечатках, поэтому повторный обход продолжит с изменившихся чатов
+                logger.warning(f"ЧАТЫ: FloodWait {e.seconds} с при обходе диалогов, повтор после паузы")
+                await asyncio.sleep(e.seconds)
+                stats = await self.chat_discovery.run(self.client.iter_dialogs(), full_refresh=full_refresh)
+            logger.info(
+                f"УСПЕХ: Просмотрено {stats['seen']} чатов, изменилось {stats['changed']}, "
+                f"записано в all_chats {stats['upserted']} ({stats['chunks']} пакетов) за {stats['duration_seconds']} с"
+            )
+            return stats
         except Exception as e:
             logger.error(f"ОШИБКА discover_chats: {e}")
 
-        def setup_message_handlers(self):
-            """Настройка обработчиков сообщений для Telethon"""
-            @self.client.on(events.NewMessage)
-            async def handle_new_message(event):
-                chat_id = str(event.chat_id)
-                monitored_chat_ids = [str(chat['chat_id']) for chat in self.monitored_chats]
-                if chat_id not in monitored_chat_ids:
-                    return
-                # ... здесь обработка сообщения ...
-                logger.info(f"НОВОЕ СООБЩЕНИЕ: {event.message.text}")
-
-        async def periodic_monitored_chats_update(self, interval=60):
-            """Периодически обновляет список чатов из Supabase"""
-            while True:
-                try:
-                    await self.load_monitored_chats()
-                    logger.info(f"ПЕРИОДИЧЕСКОЕ ОБНОВЛЕНИЕ: Загружено {len(self.monitored_chats)} чатов")
-                except Exception as e:
-                    logger.error(f"ОШИБКА periodic_monitored_chats_update: {e}")
-                await asyncio.sleep(interval)
-    
     async def create_session_from_env(self):
         """Создает сессию из переменных окружения для Railway"""
         try:
@@ -427,7 +548,7 @@ class TelegramParser:
         """Синхронная загрузка ключевых слов"""
         try:
             logger.info("ДИАГНОСТИКА: Запрос ключевых слов из БД...")
-            response = self.supabase.table('keywords').select('keyword').eq('active', True).execute()
+            response = self.supabase.table('keywords').select('id, keyword, category').eq('active', True).execute()
             logger.info(f"ДИАГНОСТИКА: Ответ БД - data: {response.data}, error: {getattr(response, 'error', 'НЕТ')}")
             return response.data
         except Exception as e:
@@ -437,18 +558,38 @@ class TelegramParser:
     async def load_keywords(self):
         """Загрузка ключевых слов из БД"""
         try:
-            response = self.supabase.table('keywords').select('keyword').eq('active', True).execute()
-            self.keywords = [item['keyword'].lower() for item in response.data]
+            # Ключевые слова и получатели грузятся вместе: маршрутизация
+            # обновляется в том же цикле, что и список ключевых слов
+            rows, recipients = await asyncio.gather(
+                self.repository.fetch_active_keywords('id, keyword, category'),
+                self.repository.fetch_active_recipients()
+            )
+            self.config_tables.load('keywords', rows)
+            self.config_tables.load('recipient_categories', recipients)
+            self.rebuild_keyword_routing()
             import time
             self.last_keywords_reload = time.time()
             logger.info(f"ПЕРЕЗАГРУЗКА: Обновлен список ключевых слов: {self.keywords}")
+            return True
         except Exception as e:
             logger.error(f"ОШИБКА: Загрузка ключевых слов: {e}")
+            return False
+
+    def rebuild_keyword_routing(self):
+        """Матчер и маршрутизация из текущих строк keywords и recipient_categories"""
+        rows = self.config_tables.rows('keywords')
+        router = RecipientRouter(rows, self.config_tables.rows('recipient_categories'))
+        self.set_keywords([item['keyword'].lower() for item in rows if item.get('keyword')])
+        self.recipient_router = router
+        logger.info(f"ПЕРЕЗАГРУЗКА: Маршрутизация - {len(rows)} ключевых слов, {router.recipient_count} получателей")
+        self.resolve_recipients()
 
-    def should_reload_keywords(self):
-        """Проверка, нужно ли перезагружать ключевые слова (каждые 5 минут)"""
-        import time
-        return time.time() - self.last_keywords_reload > 300  # 5 минут
+    def set_keywords(self, keywords):
+        """Атомарная замена списка ключевых слов и скомпилированного матчера"""
+        # Матчер строится до присваивания: обработчики сообщений
+        # всегда видят согласованную пару (keywords, keyword_matcher)
+        matcher = KeywordMatcher(keywords)
+        self.keywords, self.keyword_matcher = matcher.keywords, matcher
 
     def load_monitored_chats_sync(self):
         """Синхронная загрузка отслеживаемых чатов"""
@@ -473,31 +614,199 @@ class TelegramParser:
     async def load_monitored_chats(self):
         """Загрузка отслеживаемых чатов из БД"""
         try:
-            # ВОЗВРАТ к правильной таблице 'monitored_chats'
-            response = self.supabase.table('monitored_chats').select('*').eq('active', True).execute()
-            self.monitored_chats = response.data
+            self.config_tables.load('monitored_chats', await self.repository.fetch_monitored_chats())
+            self.set_monitored_chats(self.config_tables.rows('monitored_chats'))
+            return True
         except Exception as e:
             logger.error(f"ОШИБКА: Загрузка чатов: {e}")
+            return False
+
+    def load_config_snapshot(self):
+        """Конфигурация из локального снимка; False если снимка нет"""
+        started = time.perf_counter()
+        tables = self.config_snapshot.load()
+        if not tables:
+            return False
+        for table, rows in tables.items():
+            self.config_tables.load(table, rows)
+        self.rebuild_keyword_routing()
+        self.set_monitored_chats(self.config_tables.rows('monitored_chats'))
+        logger.info(f"КОНФИГ: Загружен локальный снимок {self.config_snapshot.path} за {(time.perf_counter() - started) * 1000:.1f} мс")
+        return True
+
+    def save_config_snapshot(self):
+        """Запись конфигурации в локальный снимок после сверки с БД"""
+        if self.config_synced:
+            self.config_snapshot.save(self.config_tables.snapshot())
+
+    def create_config_feed(self):
+        """Поток изменений конфигурации: Postgres LISTEN при заданном DATABASE_URL"""
+        database_url = os.getenv('DATABASE_URL')
+        if database_url:
+            try:
+                return PostgresConfigFeed(database_url, self.apply_config_change, self.reload_config)
+            except RuntimeError as e:
+                logger.warning(f"КОНФИГ: {e}")
+        return LocalConfigFeed(self.apply_config_change)
+
+    def apply_config_change(self, change):
+        """Применение одной правки keywords, monitored_chats или recipient_categories"""
+        table = self.config_tables.apply(change)
+        if table is None:
+            return
+        if table == 'monitored_chats':
+            self.set_monitored_chats(self.config_tables.rows(table))
+        else:
+            self.rebuild_keyword_routing()
+        self.save_config_snapshot()
+        logger.info(f"КОНФИГ: Применено изменение {change.get('op')} в {table}")
+
+    async def reload_config(self):
+        """Полная перезагрузка конфигурации из БД"""
+        results = await asyncio.gather(self.load_keywords(), self.load_monitored_chats())
+        if all(results):
+            self.config_synced = True
+            self.save_config_snapshot()
+        return all(results)
+
+    async def periodic_config_reload(self, interval):
+        """Запасная перезагрузка конфигурации, пока поток изменений не подключен"""
+        while True:
+            await asyncio.sleep(interval)
+            if not self.config_feed.connected or not self.config_synced:
+                await self.reload_config()
+
+    def set_monitored_chats(self, chats):
+        """Атомарная замена словаря отслеживаемых чатов"""
+        monitored = {}
+        for chat in chats:
+            try:
+                monitored[int(chat['chat_id'])] = chat
+            except (KeyError, TypeError, ValueError):
+                logger.warning(f"ПРОПУСК: Некорректный chat_id у чата {chat.get('chat_name')}: {chat.get('chat_id')}")
+        self.monitored_chats = monitored
+
+    async def warm_duplicate_cache(self, page_size=1000):
+        """Заполнение кеша дубликатов сообщениями за последние сутки"""
+        try:
+            yesterday = datetime.now() - timedelta(days=1)
+            offset = 0
+            while True:
+                rows = await self.repository.fetch_messages_since(yesterday.isoformat(), offset, page_size)
+                self.duplicate_cache.warm(rows)
+                for row in rows:
+                    created_at = parse_created_at(row.get('created_at'))
+                    if row.get('content_hash'):
+                        self.duplicate_filter.add(row['content_hash'], created_at)
+                    self.near_duplicates.add(row.get('message_text'), self.near_duplicate_row(row), created_at)
+                if len(rows) < page_size:
+                    break
+                offset += page_size
+            # Фильтр видел все хеши за окно - его промахам можно доверять
+            self.duplicate_filter.ready = True
+            logger.info(f"ДЕДУПЛИКАЦИЯ: Кеш прогрет, {len(self.duplicate_cache)} сообщений за 24 часа")
+        except Exception as e:
+            logger.error(f"ОШИБКА: Прогрев кеша дубликатов: {e}")
 
     async def is_duplicate_message(self, message_hash):
         """Улучшенная проверка дубликата с возвратом информации об оригинале"""
+        # Точный промах фильтра Блума - такого хеша за 24 часа не было
+        if self.duplicate_filter.ready and not self.duplicate_filter.might_contain(message_hash):
+            return {'is_duplicate': False}
+        
+        # Сначала кеш в памяти, запрос в БД только при промахе
+        cached = self.duplicate_cache.get(message_hash)
+        if cached is not None:
+            return {
+                'is_duplicate': True,
+                'original_message': cached
+            }
+        
         try:
             yesterday = datetime.now() - timedelta(days=1)
-            response = self.supabase.table('messages').select('id, message_text, chat_name, username, created_at').eq('content_hash', message_hash).gte('created_at', yesterday.isoformat()).limit(1).execute()
+            original = await self.repository.find_message_by_hash(message_hash, yesterday.isoformat())
             
-            if len(response.data) > 0:
+            if original:
+                self.duplicate_cache.add(message_hash, original)
+                self.duplicate_filter.add(message_hash, parse_created_at(original.get('created_at')))
                 # Возвращаем информацию об оригинальном сообщении
                 return {
                     'is_duplicate': True,
-                    'original_message': response.data[0]
+                    'original_message': original
                 }
             else:
+                if self.duplicate_filter.ready:
+                    self.duplicate_filter.record_false_positive()
                 return {'is_duplicate': False}
                 
         except Exception as e:
             logger.error(f"ОШИБКА: Проверка дубликата: {e}")
             return {'is_duplicate': False}
 
+    async def claim_message_hash(self, message_hash):
+        """Проверка дубликата с резервированием хеша до записи сообщения
+
+        Пока первая копия сообщения проверяется и ждет пакетной записи в БД,
+        параллельные копии с тем же хешем ждут ее результата. Если дубликата
+        нет, хеш остается зарезервированным до save_message или
+        release_message_hash
+        """
+        while self.pending_messages.get(message_hash) is not None:
+            original = await self.pending_messages.wait(message_hash)
+            if original is not None:
+                return {
+                    'is_duplicate': True,
+                    'original_message': original
+                }
+        self.pending_messages.reserve(message_hash)
+        duplicate_check = await self.is_duplicate_message(message_hash)
+        if duplicate_check['is_duplicate']:
+            self.pending_messages.resolve(message_hash, duplicate_check['original_message'])
+        return duplicate_check
+
+    def reserve_near_duplicate(self, message_hash, text, chat_name, username):
+        """Запись в индексе почти-дубликатов до сохранения; id оригинала дополнит save_message"""
+        pending = self.pending_messages.entry(message_hash)
+        if pending is None:
+            return
+        pending['near_row'] = {
+            'id': None,
+            'content_hash': message_hash,
+            'chat_name': chat_name,
+            'username': username,
+            'created_at': None
+        }
+        pending['near_entry'] = self.near_duplicates.add(text, pending['near_row'])
+
+    def release_message_hash(self, message_hash):
+        """Снятие резерва хеша, если сообщение так и не было сохранено"""
+        pending = self.pending_messages.release(message_hash)
+        if pending is not None and pending['near_entry'] is not None:
+            self.near_duplicates.remove(pending['near_entry'])
+
+    def near_duplicate_row(self, row):
+        """Поля оригинала, которые нужны для записи и логирования почти-дубликата"""
+        return {
+            'id': row.get('id'),
+            'chat_name': row.get('chat_name'),
+            'username': row.get('username'),
+            'created_at': row.get('created_at')
+        }
+
+    async def find_near_duplicate(self, text):
+        """Поиск почти-дубликата (MinHash/LSH) за последние 24 часа"""
+        original, similarity = self.near_duplicates.find(text)
+        if original is not None and original.get('id') is None:
+            # Оригинал еще ждет пакетной записи - нужен его id из БД
+            original = await self.pending_messages.wait(original['content_hash'])
+        if original is None:
+            return {'is_duplicate': False}
+        return {
+            'is_duplicate': True,
+            'original_message': original,
+            'similarity': similarity
+        }
+
     async def save_duplicate_info(self, original_message_id, message_data, sender_info):
         """Сохранение информации о дубликате"""
         try:
@@ -521,7 +830,7 @@ class TelegramParser:
                     duplicate_data['duplicate_user_last_name'] = sender_info['last_name']
             
             # Сохраняем в БД
-            response = self.supabase.table('message_duplicates').insert(duplicate_data).execute()
+            await self.repository.insert_message_duplicate(duplicate_data)
             logger.info(f"ДУБЛИКАТ: Информация сохранена для оригинала ID {original_message_id}")
             return True
             
@@ -529,6 +838,10 @@ class TelegramParser:
             logger.error(f"ОШИБКА: Сохранение дубликата: {e}")
             return False
 
+    async def insert_message_rows(self, rows):
+        """Массовая вставка строк в messages одним запросом"""
+        return await self.repository.insert_messages(rows)
+
     async def save_message(self, message_data):
         """Сохранение сообщения в БД без цены"""
         try:
@@ -555,8 +868,17 @@ class TelegramParser:
                 if sender_info.get('last_name'):
                     save_data['last_name'] = sender_info['last_name']
             
-            response = self.supabase.table('messages').insert(save_data).execute()
-            return response.data
+            # Строка уходит в БД общим пакетом, id приходит через future
+            saved_row = await self.message_writer.write(save_data)
+            self.duplicate_cache.add(save_data['content_hash'], saved_row)
+            self.duplicate_filter.add(save_data['content_hash'])
+            pending = self.pending_messages.resolve(save_data['content_hash'], saved_row)
+            if pending is not None and pending['near_row'] is not None:
+                # Запись в индексе появилась при проверке - дополняем ее строкой из БД
+                pending['near_row'].update(self.near_duplicate_row(saved_row))
+            else:
+                self.near_duplicates.add(save_data['message_text'], self.near_duplicate_row(saved_row))
+            return [saved_row]
         except Exception as e:
             logger.error(f"ОШИБКА: Сохранение сообщения: {e}")
             """
@@ -603,86 +925,33 @@ class TelegramParser:
     # - Логическое И: "тандем;140" - ищет оба слова "тандем" И "140" в тексте
     # - Можно комбинировать: "груз;дальнобой;срочно" - все три слова должны быть в тексте
     def check_keywords(self, text):
-        found_keywords = []
-        
         # Проверка на None или пустой текст
         if not text:
-            logger.info(f"ДИАГНОСТИКА: Текст сообщения пустой или None")
-            return found_keywords
-            
-        text_lower = text.lower()
+            logger.debug("ДИАГНОСТИКА: Текст сообщения пустой или None")
+            return []
         
-        logger.info(f"ДИАГНОСТИКА: Проверяем текст: '{text[:100]}...' в списке из {len(self.keywords)} ключевых слов")
-        logger.info(f"ДИАГНОСТИКА: Доступные ключевые слова: {self.keywords}")
+        matcher = self.keyword_matcher
         
-        for keyword in self.keywords:
-            # Проверяем, содержит ли ключевое слово оператор логического И (;)
-            if ';' in keyword:
-                # Разбиваем ключевое слово на части по символу ;
-                keyword_parts = [part.strip() for part in keyword.split(';')]
-                
-                # Проверяем, что ВСЕ части присутствуют в тексте
-                all_parts_found = True
-                found_parts = []
-                for part in keyword_parts:
-                    if part and part in text_lower:
-                        found_parts.append(part)
-                    elif part:
-                        all_parts_found = False
-                        break
-                
-                # Если все части найдены, добавляем в результат
-                if all_parts_found and len(keyword_parts) > 1:
-                    found_keywords.append(keyword)
-                    logger.info(f"ДИАГНОСТИКА: Найдено составное ключевое слово '{keyword}' (части: {found_parts})")
-            else:
-                # Обычная проверка для простых ключевых слов
-                if keyword in text_lower:
-                    found_keywords.append(keyword)
-                    logger.info(f"ДИАГНОСТИКА: Найдено простое ключевое слово '{keyword}'")
+        logger.debug("ДИАГНОСТИКА: Проверяем текст: '%.100s...' в списке из %d ключевых слов", text, len(matcher))
         
-        logger.info(f"ДИАГНОСТИКА: ИТОГО найдено ключевых слов: {found_keywords}")
+        found_keywords = text_processing.find_keywords(text, matcher)
+        
+        # Позиции совпадений нужны только для диагностики
+        if found_keywords and logger.isEnabledFor(logging.DEBUG):
+            for match in matcher.match(text):
+                logger.debug("ДИАГНОСТИКА: Найдено ключевое слово '%s' (части: %s)", match['keyword'], match['parts'])
+        
+        logger.debug("ДИАГНОСТИКА: ИТОГО найдено ключевых слов: %s", found_keywords)
         return found_keywords
 
+    def find_keyword_matches(self, text):
+        """Найденные ключевые слова с позициями совпадений в тексте"""
+        return self.keyword_matcher.match(text)
+
     async def get_sender_info(self, message):
         """Получение информации об отправителе сообщения"""
         try:
-            sender_info = {
-                'id': message.sender_id,
-                'username': None,
-                'first_name': None,
-                'last_name': None,
-                'display_name': None,
-                'profile_link': None
-            }
-            
-            # Получаем полную информацию об отправителе
-            if message.sender:
-                sender = message.sender
-                
-                # Username (если есть)
-                if hasattr(sender, 'username') and sender.username:
-                    sender_info['username'] = sender.username
-                    sender_info['profile_link'] = f"https://t.me/{sender.username}"
-                
-                # Имя и фамилия
-                if hasattr(sender, 'first_name') and sender.first_name:
-                    sender_info['first_name'] = sender.first_name
-                
-                if hasattr(sender, 'last_name') and sender.last_name:
-                    sender_info['last_name'] = sender.last_name
-                
-                # Формируем отображаемое имя
-                display_parts = []
-                if sender_info['first_name']:
-                    display_parts.append(sender_info['first_name'])
-                if sender_info['last_name']:
-                    display_parts.append(sender_info['last_name'])
-                
-                sender_info['display_name'] = ' '.join(display_parts) if display_parts else f"User {sender_info['id']}"
-            
-            return sender_info
-            
+            return text_processing.sender_info(message)
         except Exception as e:
             logger.error(f"ОШИБКА: Получение информации об отправителе: {e}")
             return {
@@ -696,59 +965,19 @@ class TelegramParser:
 
     def extract_phone_numbers(self, text):
         """Извлечение номеров телефонов из текста с улучшенной логикой"""
-        # Улучшенные паттерны для различных форматов номеров
-        phone_patterns = [
-            # Российские номера с +7
-            r'\+7[- ]?\d{3}[- ]?\d{3}[- ]?\d{2}[- ]?\d{2}',
-            r'\+7\d{10}',
-            
-            # Российские номера с 8 (проверяем что следующие цифры не цена)
-            r'8[- ]?\d{3}[- ]?\d{3}[- ]?\d{2}[- ]?\d{2}(?!\d)',
-            
-            # Международные номера (минимум 10 цифр, начинаются с +)
-            r'\+\d{1,3}[- ]?\d{3,4}[- ]?\d{3,4}[- ]?\d{2,4}',
-            
-            # Прочие форматы (только если минимум 10 цифр)
-            r'(?<!\d)\d{3}[- ]?\d{3}[- ]?\d{4}(?!\d)',  # 999-999-9999
-        ]
-        
-        phone_numbers = []
-        for pattern in phone_patterns:
-            matches = re.findall(pattern, text)
-            for match in matches:
-                # Очищаем номер от лишних символов
-                clean_number = re.sub(r'[^\d+]', '', match)
-                
-                # Проверяем валидность номера
-                if self.is_valid_phone_number(clean_number):
-                    phone_numbers.append(match)
-        
-        return list(set(phone_numbers))  # Убираем дубликаты
+        return text_processing.extract_phone_numbers(text)
 
     def is_valid_phone_number(self, phone):
         """Проверка что номер телефона валидный (не цена)"""
-        # Убираем все кроме цифр и +
-        clean = re.sub(r'[^\d+]', '', phone)
-        
-        # Минимум 10 цифр для валидного номера
-        digit_count = len(re.sub(r'[^\d]', '', clean))
-        if digit_count < 10:
-            return False
-            
-        # Максимум 15 цифр (международный стандарт)
-        if digit_count > 15:
-            return False
-            
-        # Если начинается с +, должно быть минимум 11 символов
-        if clean.startswith('+') and len(clean) < 11:
-            return False
-            
-        # Проверяем что это не цена (цены обычно 4-6 цифр)
-        # Номера телефонов редко начинаются с 0
-        if clean.startswith('0'):
-            return False
-            
-        return True
+        return text_processing.is_valid_phone_number(phone)
+
+    def analyze_messages_batch(self, texts):
+        """Пакетное извлечение ключевых слов и телефонов для списка текстов
+
+        Возвращает список словарей {'matched_keywords', 'phone_numbers'}
+        в порядке входных текстов
+        """
+        return text_processing.analyze_texts(texts, self.keyword_matcher)
 
     def format_phone_for_telegram(self, phone):
         """Форматирование номера телефона для Telegram ссылки"""
@@ -800,61 +1029,89 @@ class TelegramParser:
             logger.error(f"ОШИБКА: Проверка дубликата: {e}")
             return False
 
-    async def process_message(self, message, chat):
-        """Обработка сообщения из старого парсера"""
+    async def process_message(self, message, chat, analysis=None):
+        """Обработка сообщения из истории чата
+
+        analysis - готовый результат analyze_messages_batch для этого сообщения
+        """
         try:
             if not message or not message.text:
                 return
                 
             self.stats['messages_processed'] += 1
-            duplicate_reason = ""
+            
+            if analysis is None:
+                analysis = self.analyze_messages_batch([message.text])[0]
+            matched_keywords = analysis['matched_keywords']
             
             # Извлекаем данные сообщения (БЕЗ ЦЕНЫ)
             message_data = {
                 'message_id': str(message.id),
                 'chat_id': str(message.chat_id),
-                'chat_name': getattr(message.chat, 'title', 'Unknown'),
+                'chat_name': getattr(chat or message.chat, 'title', 'Unknown'),
                 'user_id': str(message.sender_id),
                 'username': getattr(message.sender, 'username', None) if message.sender else None,
                 'message_text': message.text,
                 'platform': 'telegram',
-                'content_hash': self.create_content_hash(message.text),
-                'matched_keywords': self.check_keywords(message.text),
-                'contains_keywords': bool(self.check_keywords(message.text))
+                'content_hash': self.create_message_hash(message.text, str(message.sender_id)),
+                'matched_keywords': matched_keywords,
+                'contains_keywords': bool(matched_keywords)
             }
             
             # Проверка на дубликат
-            if await self.is_duplicate(message_data):
+            duplicate_check = await self.claim_message_hash(message_data['content_hash'])
+            if duplicate_check['is_duplicate']:
                 self.stats['duplicates'] += 1
                 return
             
-            # Логируем процесс
-            duplicate_reason = await self.check_duplicate(message_data['content_hash'], message_data['user_id'])
-            if duplicate_reason:
-                logger.info(f"ПРОВЕРКА: {duplicate_reason}")
-            
             # Сохраняем сообщение (ВСЕ сообщения сохраняются)
-            saved = await self.save_message(message_data)
+            try:
+                saved = await self.save_message(message_data)
+            finally:
+                self.release_message_hash(message_data['content_hash'])
             if saved:
-                logger.info(f"СОХРАНЕНО: {message_data['chat_name']} | Ключевые слова: {message_data['matched_keywords']}")
+                logger.debug("СОХРАНЕНО: %s | Ключевые слова: %s", message_data['chat_name'], message_data['matched_keywords'])
                 
         except Exception as e:
             self.stats['errors'] += 1
             logger.error(f"ОШИБКА: Обработка сообщения: {e}")
 
-    async def flag_watcher(self):
-        FLAG_PATH = '../request_chats.flag'
-        while True:
-            if os.path.exists(FLAG_PATH):
-                logger.info('ФЛАГ: Получен запрос на список чатов, останавливаю мониторинг...')
-                await self.client.disconnect()
-                await self.discover_chats()  # функция получения чатов
-                os.remove(FLAG_PATH)
-                logger.info('ФЛАГ: Список чатов обновлён, мониторинг возобновлён.')
-                await self.client.start()
-                self.setup_message_handlers()
-                await self.client.run_until_disconnected()
-            await asyncio.sleep(10)
+    def start_background_job(self, name, coro):
+        """Запуск фоновой задачи по имени; одна задача с таким именем за раз"""
+        job = self.background_jobs.get(name)
+        if job and not job.done():
+            coro.close()
+            return 409, {'status': 'running', 'job': name}
+        self.background_jobs[name] = asyncio.create_task(coro)
+        return 202, {'status': 'accepted', 'job': name}
+
+    async def control_discover_chats(self, params):
+        """Команда discover-chats: выгрузка чатов в all_chats параллельно с мониторингом (full=1 - все чаты)"""
+        full_refresh = str(params.get('full', '')).lower() in ('1', 'true', 'yes')
+        return self.start_background_job('discover-chats', self.discover_chats(full_refresh))
+
+    async def control_reload_config(self, params):
+        """Команда reload-config: полная перезагрузка ключевых слов, чатов и получателей"""
+        await self.reload_config()
+        return 200, {'status': 'ok', 'config': self.config_tables.get_stats()}
+
+    async def control_backfill(self, params):
+        """Команда backfill: обработка истории чата (chat_id, limit)"""
+        chat_id = params.get('chat_id')
+        try:
+            chat_id = int(chat_id)
+            limit = int(params.get('limit', 100))
+        except (TypeError, ValueError):
+            raise ControlError(400, 'Нужны числовые chat_id и limit')
+        return self.start_background_job(f"backfill:{chat_id}", self.parse_chat_history(chat_id, limit))
+
+    async def control_stats(self, params):
+        """Команда stats: текущая статистика парсера"""
+        return 200, self.get_stats()
+
+    async def control_metrics(self, params):
+        """Команда metrics: метрики в текстовом формате Prometheus"""
+        return 200, self.metrics.render()
 
     async def start_monitoring(self):
         """Запуск мониторинга сообщений"""
@@ -869,9 +1126,8 @@ class TelegramParser:
                 logger.error("3. Загрузите файл сессии на Railway")
                 raise FileNotFoundError(f"Сессия Telegram не найдена: {session_file}")
 
-            # ВЫГРУЗКА ВСЕХ ЧАТОВ ПЕРЕД СТАРТОМ МОНИТОРИНГА
-            logger.info("Выгружаю все чаты в all_chats перед запуском мониторинга...")
-            await self.discover_chats()
+            # Прогреваем кеш дубликатов за последние сутки одним постраничным запросом
+            await self.warm_duplicate_cache()
             
             # Автоматический запуск без запроса кода (используется сохраненная сессия)
             await self.client.start()
@@ -882,74 +1138,34 @@ class TelegramParser:
                 raise RuntimeError("Telegram сессия требует повторной авторизации")
             
             logger.info("✅ МОНИТОРИНГ: Подключение к Telegram успешно")
+            
+            # Разрешаем получателей заранее, до первого лида
+            self.resolve_recipients()
+            
+            # Выгрузка чатов в all_chats идет в фоне и не задерживает мониторинг
+            self.start_background_job('discover-chats', self.discover_chats())
             logger.info("🎯 СТАТУС: Запуск отслеживания новых сообщений...")
             
-            @self.client.on(events.NewMessage)
-            async def handle_new_message(event):
-                try:
-                    # Проверяем, что сообщение из отслеживаемого чата
-                    chat_id = str(event.chat_id)
-                    monitored_chat_ids = [str(chat['chat_id']) for chat in self.monitored_chats]
-                    
-                    # Если чат НЕ в списке отслеживаемых - игнорируем
-                    if chat_id not in monitored_chat_ids:
-                        logger.debug(f"ИГНОРИРУЕМ: Чат {chat_id} не в списке отслеживаемых")
-                        return
-                    
-                    # Получаем информацию о чате
-                    chat_info = next((chat for chat in self.monitored_chats if str(chat['chat_id']) == chat_id), None)
-                    chat_name = chat_info['chat_name'] if chat_info else 'Unknown'
-                    
-                    # Обрабатываем только сообщения с текстом из отслеживаемых чатов
-                    if event.message.text:
-                        self.stats['messages_processed'] += 1
-                        logger.info(f"НОВОЕ СООБЩЕНИЕ: Получено из чата '{chat_name}' (ID: {chat_id})")
-                        logger.info(f"НОВОЕ СООБЩЕНИЕ: Текст: {event.message.text[:100]}...")
-                        logger.info(f"НОВОЕ СООБЩЕНИЕ: От пользователя ID: {event.message.sender_id}")
-                        
-                        # Создаем хеш для дедупликации
-                        message_hash = self.create_message_hash(
-                            event.message.text, 
-                            str(event.message.sender_id)
-                        )
-                        logger.info(f"НОВОЕ СООБЩЕНИЕ: Хеш для дедупликации: {message_hash[:12]}...")
-                        
-                        # Проверяем на дубликат
-                        duplicate_check = await self.is_duplicate_message(message_hash)
-                        if duplicate_check['is_duplicate']:
-                            self.stats['duplicates'] += 1
-                            
-                            # Получаем информацию об отправителе дубликата
-                            sender_info = await self.get_sender_info(event.message)
-                            
-                            # Сохраняем информацию о дубликате
-                            original_id = duplicate_check['original_message']['id']
-                            message_data = {
-                                'chat_id': event.chat_id,
-                                'chat_name': event.chat.title or 'Unknown',
-                                'user_id': event.message.sender_id,
-                                'message_id': event.message.id,
-                                'content_hash': message_hash
-                            }
-                            
-                            await self.save_duplicate_info(original_id, message_data, sender_info)
-                            
-                            # Логируем подробную информацию
-                            original = duplicate_check['original_message']
-                            current_chat = event.chat.title or 'Unknown'
-                            current_user = sender_info.get('display_name', 'Unknown') if sender_info else 'Unknown'
-                            
-                            logger.info(f"ДУБЛИКАТ: Сообщение отклонено (хеш: {message_hash[:8]}...)")
-                            logger.info(f"ДУБЛИКАТ: Оригинал из '{original['chat_name']}' от {original.get('username', 'Unknown')}")
-                            logger.info(f"ДУБЛИКАТ: Дубликат из '{current_chat}' от {current_user}")
-                            return
-                        
-                        # Обрабатываем новое сообщение
-                        await self.process_new_message(event.message, event.chat, message_hash)
-                        
-                except Exception as e:
-                    self.stats['errors'] += 1
-                    logger.error(f"ОШИБКА: Обработка события: {e}")
+            # Обработчики конвейера стартуют до регистрации обработчика событий
+            self.ingestion.start()
+            self.metrics.loop_lag.start()
+            
+            # Правки конфигурации применяются по мере поступления из потока изменений
+            await self.config_feed.start()
+            self.config_periodic_task = asyncio.create_task(self.periodic_config_reload(
+                int(os.getenv('CONFIG_FALLBACK_RELOAD_SECONDS', '300'))
+            ))
+            
+            # Канал управления не обязателен: без него мониторинг продолжает работу
+            try:
+                await self.control_server.start()
+            except OSError as e:
+                logger.error(f"ОШИБКА: Канал управления не запущен: {e}")
+            
+            # Сообщения из неотслеживаемых чатов отсекаются фильтром Telethon до вызова
+            # обработчика; словарь читается на каждом событии, поэтому перезагрузка
+            # списка чатов действует сразу
+            self.client.add_event_handler(self.handle_new_message, events.NewMessage(func=self.is_monitored_event))
 
             # Запускаем клиент
             logger.info("ГОТОВ: Ожидание новых сообщений...")
@@ -959,14 +1175,141 @@ class TelegramParser:
             logger.error(f"ОШИБКА: Мониторинг: {e}")
             raise
 
+    def is_monitored_event(self, event):
+        """Фильтр событий: только сообщения из отслеживаемых чатов"""
+        return event.chat_id in self.monitored_chats
+
+    async def handle_new_message(self, event):
+        """Обработчик нового сообщения Telethon (и офлайн-прогона replay.py)"""
+        try:
+            # Обрабатываем только сообщения с текстом из отслеживаемых чатов
+            if not event.message.text:
+                return
+            
+            # Получаем информацию о чате
+            chat_info = self.monitored_chats.get(event.chat_id)
+            chat_name = chat_info['chat_name'] if chat_info else 'Unknown'
+            
+            # Вся обработка - в пуле обработчиков, здесь только постановка в очередь
+            trace = self.tracer.start_trace('message', chat_id=event.chat_id, message_id=event.message.id)
+            with tracing.use(trace), tracing.span('enqueue'):
+                accepted = await self.ingestion.submit(
+                    IncomingMessage(str(event.chat_id), chat_name, event.chat, event.message, trace)
+                )
+            if accepted is False:
+                self.tracer.end(trace, 'dropped')
+                
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.error(f"ОШИБКА: Обработка события: {e}")
+
+    def incoming_message_dropped(self, item):
+        """Событие вытеснено из очереди новым (drop_oldest) - трасса завершается"""
+        self.tracer.end(item.trace, 'dropped')
+
+    async def process_incoming_message(self, item):
+        """Обработка события из очереди в трассе сообщения"""
+        with tracing.use(item.trace):
+            try:
+                await self.process_queued_message(item)
+            finally:
+                self.tracer.end(item.trace)
+
+    async def process_queued_message(self, item):
+        """Обработка события из очереди: дедупликация, сохранение и рассылка"""
+        message_hash = None
+        try:
+            message = item.message
+            chat = item.chat
+            chat_title = getattr(chat, 'title', None) or 'Unknown'
+            
+            self.stats['messages_processed'] += 1
+            self.metrics.observe_stage('queue_wait', item.received_at)
+            logger.debug(
+                "НОВОЕ СООБЩЕНИЕ: Чат '%s' (ID: %s), пользователь ID: %s, текст: %.100s...",
+                item.chat_name, item.chat_id, message.sender_id, message.text
+            )
+            
+            # Создаем хеш для дедупликации
+            started = time.perf_counter()
+            message_hash = self.create_message_hash(
+                message.text, 
+                str(message.sender_id)
+            )
+            self.metrics.observe_stage('hash', started)
+            logger.debug("НОВОЕ СООБЩЕНИЕ: Хеш для дедупликации: %.12s...", message_hash)
+            
+            # Проверяем на дубликат; хеш резервируется до записи сообщения
+            started = time.perf_counter()
+            duplicate_check = await self.claim_message_hash(message_hash)
+            if not duplicate_check['is_duplicate']:
+                # Репост с измененным словом, эмодзи или от другого отправителя
+                duplicate_check = await self.find_near_duplicate(message.text)
+                if duplicate_check['is_duplicate']:
+                    self.stats['near_duplicates'] += 1
+                    self.metrics.messages.inc('near_duplicate')
+                    logger.debug("ДУБЛИКАТ: Почти-дубликат, сходство %.2f", duplicate_check['similarity'])
+                else:
+                    self.reserve_near_duplicate(
+                        message_hash, message.text, chat_title, getattr(message.sender, 'username', None)
+                    )
+            self.metrics.observe_stage('dedup_lookup', started)
+            
+            if duplicate_check['is_duplicate']:
+                self.stats['duplicates'] += 1
+                self.metrics.messages.inc('duplicate')
+                
+                # Получаем информацию об отправителе дубликата
+                started = time.perf_counter()
+                sender_info = await self.get_sender_info(message)
+                self.metrics.observe_stage('sender_info', started)
+                
+                # Сохраняем информацию о дубликате
+                original_id = duplicate_check['original_message']['id']
+                message_data = {
+                    'chat_id': message.chat_id,
+                    'chat_name': chat_title,
+                    'user_id': message.sender_id,
+                    'message_id': message.id,
+                    'content_hash': message_hash
+                }
+                
+                await self.save_duplicate_info(original_id, message_data, sender_info)
+                
+                # Логируем подробную информацию
+                original = duplicate_check['original_message']
+                current_user = sender_info.get('display_name', 'Unknown') if sender_info else 'Unknown'
+                
+                logger.info("ДУБЛИКАТ: Сообщение из '%s' от %s отклонено (хеш: %.8s...)", chat_title, current_user, message_hash)
+                logger.debug(
+                    "ДУБЛИКАТ: Оригинал из '%s' от %s", original['chat_name'], original.get('username', 'Unknown')
+                )
+                return
+            
+            # Обрабатываем новое сообщение
+            self.metrics.messages.inc('new')
+            await self.process_new_message(message, chat, message_hash)
+            
+        except Exception as e:
+            self.stats['errors'] += 1
+            self.metrics.messages.inc('error')
+            tracing.record_error(e)
+            logger.error(f"ОШИБКА: Обработка события: {e}")
+        finally:
+            # Сохраненное сообщение уже сняло резерв в save_message
+            if message_hash is not None:
+                self.release_message_hash(message_hash)
+
     async def send_message_to_recipients(self, message_data, keywords_found):
         """Отправка сообщения получателям по ключевым словам"""
         try:
             # Получаем список получателей для найденных ключевых слов
+            started = time.perf_counter()
             recipients = await self.get_recipients_for_keywords(keywords_found)
+            self.metrics.observe_stage('recipient_lookup', started)
             
             if not recipients:
-                logger.info(f"ОТПРАВКА: Нет получателей для ключевых слов: {keywords_found}")
+                logger.debug("ОТПРАВКА: Нет получателей для ключевых слов: %s", keywords_found)
                 return
             
             # Извлекаем номера телефонов из текста сообщения
@@ -1008,88 +1351,97 @@ class TelegramParser:
 ---
 ⏰ **Время:** {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"""
             
-            # Отправляем всем получателям
+            # Определяем, как отправлять сообщение каждому получателю
+            deliveries = []
             for recipient in recipients:
-                try:
-                    # Определяем, как отправлять сообщение
-                    contact_info = None
-                    contact_type = None
-                    
-                    # Приоритет: номер телефона, затем username
-                    if recipient.get('phone'):
-                        contact_info = recipient['phone']
-                        contact_type = 'phone'
-                        logger.info(f"ОТПРАВКА: Отправляем по номеру телефона {contact_info}")
-                    elif recipient.get('username'):
-                        contact_info = recipient['username']
-                        contact_type = 'username'
-                        logger.info(f"ОТПРАВКА: Отправляем по username @{contact_info}")
-                    else:
-                        logger.warning(f"ПРОПУСК: У получателя {recipient['name']} нет ни телефона, ни username")
-                        continue
-                    
-                    # Отправляем сообщение
-                    await self.client.send_message(
-                        contact_info, 
-                        notification_text,
-                        parse_mode='markdown'
-                    )
-                    
-                    if contact_type == 'phone':
-                        logger.info(f"ОТПРАВКА: ✅ Сообщение отправлено {recipient['name']} (📞 {contact_info})")
-                    else:
-                        logger.info(f"ОТПРАВКА: ✅ Сообщение отправлено {recipient['name']} (@{contact_info})")
-                        
-                except Exception as e:
-                    error_contact = recipient.get('phone') or f"@{recipient.get('username', 'unknown')}"
-                    logger.error(f"ОШИБКА: ❌ Не удалось отправить сообщение {recipient['name']} ({error_contact}): {e}")
+                # Приоритет: номер телефона, затем username
+                if recipient.get('phone'):
+                    deliveries.append((recipient, recipient['phone']))
+                elif recipient.get('username'):
+                    deliveries.append((recipient, recipient['username']))
+                else:
+                    logger.warning(f"ПРОПУСК: У получателя {recipient['name']} нет ни телефона, ни username")
+            
+            # Рассылка уходит в очередь отправителей: обработчик не ждет лимитов
+            # Telegram, а трасса сообщения остается открытой до конца отправок
+            trace = tracing.hold()
+            with tracing.span('fan_out', recipients=len(deliveries)):
+                self.notification_sender.submit(
+                    deliveries, notification_text,
+                    on_done=lambda results: self.notifications_sent(results, trace),
+                    trace=trace
+                )
                     
         except Exception as e:
+            tracing.record_error(e)
             logger.error(f"ОШИБКА: Отправка сообщений получателям: {e}")
 
+    def notifications_sent(self, results, trace=None):
+        """Метрики и журнал доставки одной рассылки"""
+        for result in results:
+            recipient = result['recipient']
+            self.metrics.stage_seconds.observe(result['latency'], 'send')
+            self.metrics.notifications.inc('ok' if result['ok'] else 'failed')
+            contact = f"📞 {result['target']}" if recipient.get('phone') else f"@{result['target']}"
+            if result['ok']:
+                logger.info(f"ОТПРАВКА: ✅ Сообщение отправлено {recipient['name']} ({contact}) за {result['latency'] * 1000:.0f} мс")
+            else:
+                logger.error(f"ОШИБКА: ❌ Не удалось отправить сообщение {recipient['name']} ({contact}): {result['error']}")
+        self.tracer.release(trace)
+
+    async def send_notification(self, target, text, parse_mode='markdown'):
+        """Отправка одного уведомления через Telegram клиент"""
+        with tracing.span('telegram.send_message', target=str(target)):
+            peer = self.recipient_resolver.get(target)
+            if peer is None:
+                return await self.client.send_message(target, text, parse_mode=parse_mode)
+            try:
+                return await self.client.send_message(peer, text, parse_mode=parse_mode)
+            except FloodWaitError:
+                raise
+            except Exception as e:
+                # Сохраненный peer устарел - отправляем по контакту и разрешаем заново
+                logger.warning(f"ОТПРАВКА: Сохраненный peer для {target} не подошел: {e}")
+                self.recipient_resolver.invalidate(target)
+                return await self.client.send_message(target, text, parse_mode=parse_mode)
+
+    async def resolve_recipient_entity(self, contact):
+        """Разрешение телефона или username получателя в input peer"""
+        return await self.client.get_input_entity(contact)
+
+    def resolve_recipients(self):
+        """Фоновое разрешение всех активных получателей (нужен подключенный клиент)"""
+        if self.recipient_router is None or not self.client or not self.client.is_connected():
+            return
+        contacts = [
+            recipient.get('phone') or recipient.get('username')
+            for recipient in self.recipient_router.all_recipients()
+        ]
+        self.recipient_resolver.schedule([contact for contact in contacts if contact])
+
     async def get_recipients_for_keywords(self, keywords_found):
         """Получение списка получателей для найденных ключевых слов через категории"""
         try:
-            logger.info(f"ОТПРАВКА: Поиск получателей для ключевых слов: {keywords_found}")
+            logger.debug("ОТПРАВКА: Поиск получателей для ключевых слов: %s", keywords_found)
             
-            # Сначала найдем категории для найденных ключевых слов
-            categories = set()
-            for keyword in keywords_found:
-                # Поиск категории по ключевому слову (нечувствительный к регистру)
-                keyword_variants = [keyword.lower(), keyword.upper(), keyword.capitalize()]
-                
-                for variant in keyword_variants:
-                    response = self.supabase.table('keywords').select('category').eq('keyword', variant).eq('active', True).execute()
-                    for row in response.data:
-                        if row.get('category'):
-                            categories.add(row['category'])
-                            logger.info(f"ОТПРАВКА: Ключевое слово '{keyword}' относится к категории '{row['category']}'")
-            
-            logger.info(f"ОТПРАВКА: Найденные категории: {list(categories)}")
-            
-            # Теперь найдем получателей для этих категорий
-            recipients = []
-            for category in categories:
-                response = self.supabase.table('recipient_categories').select('*').eq('category', category).eq('active', True).execute()
-                recipients.extend(response.data)
-                logger.info(f"ОТПРАВКА: Для категории '{category}' найдено {len(response.data)} получателей")
-            
-            # Убираем дубликаты по phone или username
-            unique_recipients = []
-            seen_contacts = set()
-            for recipient in recipients:
-                # Создаем уникальный ключ для получателя
-                contact_key = recipient.get('phone') or recipient.get('username')
-                if contact_key and contact_key not in seen_contacts:
-                    unique_recipients.append(recipient)
-                    seen_contacts.add(contact_key)
+            # Таблица маршрутизации загружается вместе с ключевыми словами
+            if self.recipient_router is None:
+                await self.load_keywords()
+            router = self.recipient_router
+            if router is None:
+                return []
             
-            logger.info(f"ОТПРАВКА: Найдено {len(unique_recipients)} уникальных получателей для категорий: {list(categories)}")
+            # Поиск категорий и получателей в памяти (без учета регистра)
+            # Получатели уже без дубликатов по phone или username
+            unique_recipients = router.recipients_for(keywords_found)
             
             # Выводим информацию о получателях для отладки
-            for recipient in unique_recipients:
-                contact_info = recipient.get('phone') or f"@{recipient.get('username', 'unknown')}"
-                logger.info(f"ОТПРАВКА: - {recipient['name']} ({contact_info}) в категории '{recipient['category']}'")
+            if logger.isEnabledFor(logging.DEBUG):
+                categories = router.categories_for(keywords_found)
+                logger.debug("ОТПРАВКА: Найдено %d уникальных получателей для категорий: %s", len(unique_recipients), list(categories))
+                for recipient in unique_recipients:
+                    contact_info = recipient.get('phone') or f"@{recipient.get('username', 'unknown')}"
+                    logger.debug("ОТПРАВКА: - %s (%s) в категории '%s'", recipient['name'], contact_info, recipient['category'])
             
             return unique_recipients
             
@@ -1108,24 +1460,17 @@ class TelegramParser:
                 return
                 
             # Получаем информацию об отправителе
+            started = time.perf_counter()
             sender_info = await self.get_sender_info(message)
+            self.metrics.observe_stage('sender_info', started)
             
-            # Периодически перезагружаем ключевые слова
-            if self.should_reload_keywords():
-                await self.load_keywords()
-                
             # Проверяем на ключевые слова
-            logger.info(f"ДИАГНОСТИКА: Начинаем проверку ключевых слов для сообщения...")
-            logger.info(f"ДИАГНОСТИКА: Текст сообщения для проверки: '{message.text[:100] if message.text else 'НЕТ ТЕКСТА'}...'")
-            logger.info(f"ДИАГНОСТИКА: Загружено ключевых слов в парсер: {len(self.keywords)}")
-            logger.info(f"ДИАГНОСТИКА: Список ключевых слов: {self.keywords}")
-            
+            started = time.perf_counter()
             keywords_found = self.check_keywords(message.text)
+            self.metrics.observe_stage('keyword_match', started)
             has_keywords = len(keywords_found) > 0
             
-            logger.info(f"ОБРАБОТКА: Проверка ключевых слов завершена")
-            logger.info(f"ОБРАБОТКА: Найденные ключевые слова: {keywords_found}")
-            logger.info(f"ОБРАБОТКА: Есть ключевые слова: {has_keywords}")
+            logger.debug("ОБРАБОТКА: Найденные ключевые слова: %s", keywords_found)
             
             # Подготавливаем данные для сохранения (ВСЕ сообщения сохраняются, БЕЗ ЦЕНЫ)
             message_data = {
@@ -1142,22 +1487,25 @@ class TelegramParser:
             }
             
             # Сохраняем в базу (ВСЕ сообщения)
+            started = time.perf_counter()
             saved = await self.save_message(message_data)
+            self.metrics.observe_stage('save_message', started)
             if saved:
-                logger.info(f"СОХРАНЕНИЕ: Сообщение сохранено в БД из чата '{message_data['chat_name']}'")
+                logger.debug("СОХРАНЕНИЕ: Сообщение сохранено в БД из чата '%s'", message_data['chat_name'])
                 
                 # Если есть ключевые слова - отправляем получателям
                 if has_keywords:
-                    logger.info(f"КЛЮЧЕВЫЕ СЛОВА: Найдены {keywords_found} - запуск отправки получателям")
+                    logger.info("КЛЮЧЕВЫЕ СЛОВА: Найдены %s в '%s' - запуск отправки получателям", keywords_found, message_data['chat_name'])
                     self.stats['keywords_found'] += 1
                     
                     # Отправляем сообщение получателям
                     await self.send_message_to_recipients(message_data, keywords_found)
                 else:
-                    logger.info(f"КЛЮЧЕВЫЕ СЛОВА: Не найдены - отправка не требуется")
+                    logger.debug("КЛЮЧЕВЫЕ СЛОВА: Не найдены - отправка не требуется")
                     
         except Exception as e:
             self.stats['errors'] += 1
+            tracing.record_error(e)
             logger.error(f"ОШИБКА: Обработка нового сообщения: {e}")
 
     async def parse_chat_history(self, chat_id, limit=100):
@@ -1165,15 +1513,22 @@ class TelegramParser:
         try:
             logger.info(f"ИСТОРИЯ: Парсинг чата {chat_id} (лимит: {limit})")
             
-            messages = []
+            # Сначала выгружаем историю, затем анализируем её одним пакетом
+            history = []
             async for message in self.client.iter_messages(int(chat_id), limit=limit):
                 if message.text:
-                    await self.process_message(message, message.chat)
-                    messages.append({
-                        'id': message.id,
-                        'text': message.text[:100] + '...' if len(message.text) > 100 else message.text,
-                        'date': message.date.isoformat() if message.date else None
-                    })
+                    history.append(message)
+            
+            analyses = self.analyze_messages_batch([message.text for message in history])
+            
+            messages = []
+            for message, analysis in zip(history, analyses):
+                await self.process_message(message, message.chat, analysis)
+                messages.append({
+                    'id': message.id,
+                    'text': message.text[:100] + '...' if len(message.text) > 100 else message.text,
+                    'date': message.date.isoformat() if message.date else None
+                })
             
             logger.info(f"ЗАВЕРШЕНО: Обработано {len(messages)} сообщений из истории")
             return messages
@@ -1189,13 +1544,57 @@ class TelegramParser:
             'duplicates': self.stats['duplicates'], 
             'errors': self.stats['errors'],
             'keywords_found': self.stats['keywords_found'],
+            'near_duplicates': self.stats['near_duplicates'],
             'active_keywords': len(self.keywords),
-            'monitored_chats': len(self.monitored_chats)
+            'monitored_chats': len(self.monitored_chats),
+            'duplicate_cache': self.duplicate_cache.get_stats(),
+            'pending_messages': self.pending_messages.get_stats(),
+            'duplicate_filter': self.duplicate_filter.get_stats(),
+            'near_duplicate_index': self.near_duplicates.get_stats(),
+            'message_writer': self.message_writer.get_stats(),
+            'database': self.repository.get_stats(),
+            'ingestion': self.ingestion.get_stats(),
+            'notifications': self.notification_sender.get_stats(),
+            'recipient_peers': self.recipient_resolver.get_stats(),
+            'config': {
+                'tables': self.config_tables.get_stats(),
+                'feed': self.config_feed.get_stats(),
+                'synced': self.config_synced,
+                'snapshot': self.config_snapshot.get_stats()
+            },
+            'chat_discovery': self.chat_discovery.get_stats(),
+            'chat_list': self.chat_list.get_stats(),
+            'tracing': self.tracer.get_stats(),
+            'event_loop': self.loop_watchdog.get_stats(),
+            'logging': dict(
+                self.logging_runtime.get_stats(),
+                records_per_message=round(
+                    sum(self.logging_runtime.handler.counts.values()) / max(self.stats['messages_processed'], 1), 2
+                )
+            ),
+            'control': dict(
+                self.control_server.get_stats(),
+                running_jobs=[name for name, job in self.background_jobs.items() if not job.done()]
+            )
         }
 
     async def stop(self):
         """Остановка парсера"""
         try:
+            # Дорабатываем очередь и дописываем сообщения, которые ждут пакетной вставки
+            await self.control_server.stop()
+            self.metrics.loop_lag.stop()
+            for job in self.background_jobs.values():
+                job.cancel()
+            for task in (self.config_reload_task, self.config_periodic_task):
+                if task:
+                    task.cancel()
+            await self.config_feed.stop()
+            await self.ingestion.stop()
+            await self.message_writer.close()
+            await self.notification_sender.close()
+            await self.repository.close()
+            self.tracer.close()
             if self.client and self.client.is_connected():
                 await self.client.disconnect()
             logger.info("СТОП: Парсер остановлен")
@@ -1204,6 +1603,8 @@ class TelegramParser:
 
 async def main():
     """Главная функция"""
+    setup_logging()
+    decrypt_session_file()
     parser = None
     try:
         # Используем ту же логику выбора сессии, что и в __init__
@@ -1288,5 +1689,36 @@ async def main():
         if parser:
             await parser.stop()
 
+async def replay_main(args):
+    """Офлайн-прогон записанных сообщений (см. replay.py)"""
+    import replay
+    report = await replay.run_replay(
+        TelegramParser,
+        args.replay,
+        speed=args.speed,
+        config_path=args.replay_config,
+        db_latency_ms=args.db_latency_ms,
+        send_latency_ms=args.send_latency_ms
+    )
+    print(replay.format_report(report), flush=True)
+    if args.replay_report:
+        with open(args.replay_report, 'w', encoding='utf-8') as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    import argparse
+    arg_parser = argparse.ArgumentParser(description='Telegram парсер сообщений')
+    # backend/server.js запускает мониторинг с --monitor; без флагов - тот же режим
+    arg_parser.add_argument('--monitor', action='store_true', help='Мониторинг новых сообщений (режим по умолчанию)')
+    arg_parser.add_argument('--replay', metavar='FILE.jsonl', help='Прогон записанных сообщений без Telegram и Supabase')
+    arg_parser.add_argument('--speed', type=float, default=0, help='Темп прогона: 1 - реальный, N - в N раз быстрее, 0 - максимальный')
+    arg_parser.add_argument('--replay-config', metavar='FILE.json', help='Ключевые слова, получатели и чаты для прогона')
+    arg_parser.add_argument('--db-latency-ms', type=float, default=0, help='Задержка каждого запроса к БД-заглушке')
+    arg_parser.add_argument('--send-latency-ms', type=float, default=0, help='Задержка каждой отправки уведомления')
+    arg_parser.add_argument('--replay-report', metavar='FILE.json', help='Сохранить отчет прогона в JSON')
+    args = arg_parser.parse_args()
+
+    if args.replay:
+        asyncio.run(replay_main(args))
+    else:
+        asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,142 @@
+"""
+Обработка текста сообщений: извлечение телефонов, поиск ключевых слов,
+хеш, данные отправителя и пакетный анализ
+Регулярные выражения компилируются один раз при импорте модуля
+"""
+
+import hashlib
+import re
+
+# Улучшенные паттерны для различных форматов номеров
+PHONE_PATTERNS = [
+    # Российские номера с +7
+    re.compile(r'\+7[- ]?\d{3}[- ]?\d{3}[- ]?\d{2}[- ]?\d{2}'),
+    re.compile(r'\+7\d{10}'),
+
+    # Российские номера с 8 (проверяем что следующие цифры не цена)
+    re.compile(r'8[- ]?\d{3}[- ]?\d{3}[- ]?\d{2}[- ]?\d{2}(?!\d)'),
+
+    # Международные номера (минимум 10 цифр, начинаются с +)
+    re.compile(r'\+\d{1,3}[- ]?\d{3,4}[- ]?\d{3,4}[- ]?\d{2,4}'),
+
+    # Прочие форматы (только если минимум 10 цифр)
+    re.compile(r'(?<!\d)\d{3}[- ]?\d{3}[- ]?\d{4}(?!\d)'),  # 999-999-9999
+]
+
+NON_PHONE_CHARS = re.compile(r'[^\d+]')
+DIGIT = re.compile(r'\d')
+
+# Минимум цифр в валидном номере (см. is_valid_phone_number)
+MIN_PHONE_DIGITS = 10
+MAX_PHONE_DIGITS = 15
+
+
+def is_valid_phone_number(phone):
+    """Проверка что номер телефона валидный (не цена)"""
+    # Убираем все кроме цифр и +
+    clean = NON_PHONE_CHARS.sub('', phone)
+
+    # Минимум 10 цифр, максимум 15 (международный стандарт)
+    digit_count = len(clean) - clean.count('+')
+    if digit_count < MIN_PHONE_DIGITS or digit_count > MAX_PHONE_DIGITS:
+        return False
+
+    # Если начинается с +, должно быть минимум 11 символов
+    if clean.startswith('+') and len(clean) < 11:
+        return False
+
+    # Проверяем что это не цена (цены обычно 4-6 цифр)
+    # Номера телефонов редко начинаются с 0
+    if clean.startswith('0'):
+        return False
+
+    return True
+
+
+def extract_phone_numbers(text):
+    """Извлечение номеров телефонов из текста с улучшенной логикой"""
+    if not text:
+        return []
+
+    # Без 10 цифр в тексте валидного номера быть не может - регулярки не нужны
+    digits = DIGIT.findall(text)
+    if len(digits) < MIN_PHONE_DIGITS:
+        return []
+
+    phone_numbers = set()
+    for pattern in PHONE_PATTERNS:
+        for match in pattern.findall(text):
+            if match not in phone_numbers and is_valid_phone_number(match):
+                phone_numbers.add(match)
+
+    return list(phone_numbers)  # Убираем дубликаты
+
+
+def create_message_hash(text, sender_id):
+    """Создаёт уникальный хеш для сообщения по тексту и id пользователя"""
+    hash_input = f"{text}:{sender_id}"
+    return hashlib.sha256(hash_input.encode('utf-8')).hexdigest()
+
+
+def sender_info(message):
+    """Информация об отправителе сообщения: имя, username и ссылка на профиль"""
+    info = {
+        'id': message.sender_id,
+        'username': None,
+        'first_name': None,
+        'last_name': None,
+        'display_name': None,
+        'profile_link': None
+    }
+
+    sender = message.sender
+    if sender:
+        username = getattr(sender, 'username', None)
+        if username:
+            info['username'] = username
+            info['profile_link'] = f"https://t.me/{username}"
+        info['first_name'] = getattr(sender, 'first_name', None) or None
+        info['last_name'] = getattr(sender, 'last_name', None) or None
+
+        # Отображаемое имя из имени и фамилии
+        display_parts = [part for part in (info['first_name'], info['last_name']) if part]
+        info['display_name'] = ' '.join(display_parts) if display_parts else f"User {info['id']}"
+
+    return info
+
+
+def find_keywords(text, keyword_matcher):
+    """Ключевые слова KeywordMatcher, найденные в тексте (TelegramParser.check_keywords)"""
+    if not text:
+        return []
+    # Один проход автомата по тексту вместо проверки каждого ключевого слова
+    return keyword_matcher.check(text)
+
+
+def analyze_texts(texts, keyword_matcher):
+    """Пакетный анализ текстов: ключевые слова и телефоны за один проход
+
+    Каждый текст приводится к нижнему регистру один раз, матчер и
+    скомпилированные паттерны общие для всего пакета.
+    Возвращает список словарей {'matched_keywords', 'phone_numbers'}
+    в порядке входных текстов.
+    """
+    results = []
+    # Одинаковые тексты (репосты) в истории встречаются часто
+    seen = {}
+    for text in texts:
+        if not text:
+            results.append({'matched_keywords': [], 'phone_numbers': []})
+            continue
+
+        cached = seen.get(text)
+        if cached is None:
+            cached = seen[text] = (
+                keyword_matcher.check(text, text.lower()),
+                extract_phone_numbers(text)
+            )
+        results.append({
+            'matched_keywords': list(cached[0]),
+            'phone_numbers': list(cached[1])
+        })
+    return results
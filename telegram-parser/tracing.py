@@ -0,0 +1,298 @@
+"""
+Трассировка обработки сообщений
+Каждое сообщение получает trace id в handle_new_message; этапы обработки
+(metrics.observe_stage) и внешние вызовы (запросы к БД, отправки в Telegram)
+записываются как спаны текущей трассы, которая передается через contextvars
+и через событие очереди IncomingMessage.
+В файл попадает доля трасс (TRACE_SAMPLE_RATE) и все медленные или
+завершившиеся ошибкой, поэтому выбросы можно разобрать постфактум, не
+засоряя лог. Запись в JSONL идет в отдельном потоке, одна трасса - одна строка
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TRACE_FILE = os.path.join('logs', 'traces.jsonl')
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+MAX_SPANS_PER_TRACE = 200
+
+# (трасса, id родительского спана) текущей задачи; None - трассировки нет
+_current = contextvars.ContextVar('trace_context', default=None)
+
+
+class Trace:
+    """Трасса одного сообщения: корневой спан (id 0) и дочерние спаны"""
+
+    def __init__(self, name, attributes, sampled):
+        self.trace_id = os.urandom(8).hex()
+        self.name = name
+        self.attributes = attributes
+        self.sampled = sampled
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.spans = []
+        self.dropped_spans = 0
+        self.errors = 0
+        self.ended = False
+        # Незавершенные фоновые продолжения трассы (hold) и статус отложенного end
+        self.holds = 0
+        self.end_status = None
+        self._next_id = 1
+
+    def reserve_id(self):
+        span_id = self._next_id
+        self._next_id += 1
+        return span_id
+
+    def add_span(self, span_id, parent_id, name, started, duration, attributes, error=None):
+        if error:
+            self.errors += 1
+        if len(self.spans) >= MAX_SPANS_PER_TRACE:
+            self.dropped_spans += 1
+            return
+        self.spans.append((span_id, parent_id, name, started, duration, attributes, error))
+
+    def to_dict(self, duration, status):
+        return {
+            'trace_id': self.trace_id,
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.started_at, timezone.utc).isoformat(),
+            'duration_ms': round(duration * 1000, 3),
+            'status': status,
+            'attributes': self.attributes,
+            'spans': [
+                {
+                    'id': span_id,
+                    'parent': parent_id,
+                    'name': name,
+                    'offset_ms': round((started - self.started) * 1000, 3),
+                    'duration_ms': round(duration * 1000, 3),
+                    'attributes': attributes,
+                    'error': error
+                }
+                for span_id, parent_id, name, started, duration, attributes, error in self.spans
+            ],
+            'dropped_spans': self.dropped_spans
+        }
+
+
+@contextmanager
+def use(trace):
+    """Сделать trace текущей трассой (например, в обработчике очереди)"""
+    if trace is None:
+        yield
+        return
+    token = _current.set((trace, 0))
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def span(name, **attributes):
+    """Спан вокруг блока кода внутри текущей трассы; без трассы ничего не делает"""
+    context = _current.get()
+    if context is None:
+        yield
+        return
+    trace, parent_id = context
+    span_id = trace.reserve_id()
+    token = _current.set((trace, span_id))
+    started = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        _current.reset(token)
+        trace.add_span(span_id, parent_id, name, started, time.perf_counter() - started, attributes, error)
+
+
+def hold():
+    """Текущая трасса остается открытой, пока ее продолжает фоновая задача
+
+    Tracer.end откладывается до парного Tracer.release; возвращает трассу или None
+    """
+    context = _current.get()
+    if context is None:
+        return None
+    trace = context[0]
+    trace.holds += 1
+    return trace
+
+
+def capture():
+    """Текущий контекст трассы, чтобы записать спан из другой задачи (record_span(context=...))"""
+    return _current.get()
+
+
+def record_span(name, started, context=None, error=None, **attributes):
+    """Завершенный спан от started (time.perf_counter) до текущего момента
+
+    context - результат capture(); без него спан пишется в текущую трассу
+    """
+    if context is None:
+        context = _current.get()
+    if context is None:
+        return
+    trace, parent_id = context
+    trace.add_span(trace.reserve_id(), parent_id, name, started, time.perf_counter() - started, attributes, error)
+
+
+def record_error(error):
+    """Ошибка, перехваченная в текущей трассе: трасса будет экспортирована"""
+    context = _current.get()
+    if context is None:
+        return
+    trace, parent_id = context
+    trace.add_span(trace.reserve_id(), parent_id, 'error', time.perf_counter(), 0.0, {}, f"{type(error).__name__}: {error}")
+
+
+class JsonlExporter:
+    """Запись трасс в JSONL из отдельного потока с ротацией по размеру
+
+    Очередь ограничена: при переполнении трасса отбрасывается, а не ждет диск
+    """
+
+    def __init__(self, path=DEFAULT_TRACE_FILE, max_bytes=DEFAULT_MAX_BYTES, max_queue_size=10000):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.exported = 0
+        self.dropped = 0
+        self.errors = 0
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+        self._thread.start()
+
+    def export(self, record):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        return open(self.path, 'a', encoding='utf-8')
+
+    def _run(self):
+        file = None
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            try:
+                if file is None:
+                    file = self._open()
+                file.write(json.dumps(record, ensure_ascii=False, default=str) + '\n')
+                if self._queue.empty():
+                    file.flush()
+                self.exported += 1
+                # Одна резервная копия: traces.jsonl.1
+                if file.tell() >= self.max_bytes:
+                    file.close()
+                    os.replace(self.path, f"{self.path}.1")
+                    file = None
+            except OSError as e:
+                self.errors += 1
+                logger.warning(f"ТРАССИРОВКА: Не удалось записать трассу в {self.path}: {e}")
+        if file is not None:
+            file.close()
+
+    def close(self, timeout=5):
+        """Дописывает очередь и останавливает поток"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def get_stats(self):
+        return {
+            'path': self.path,
+            'exported': self.exported,
+            'dropped': self.dropped,
+            'errors': self.errors
+        }
+
+
+class Tracer:
+    """Создание и завершение трасс с выборкой
+
+    Трасса экспортируется, если попала в долю sample_rate, длилась не меньше
+    slow_threshold_ms или содержит спан с ошибкой. Без exporter трассировка
+    выключена: start_trace возвращает None, спаны не создаются
+    """
+
+    def __init__(self, exporter=None, sample_rate=0.01, slow_threshold_ms=2000):
+        self.exporter = exporter
+        self.sample_rate = sample_rate
+        self.slow_threshold = slow_threshold_ms / 1000
+        self.started = 0
+        self.exported_sampled = 0
+        self.exported_slow = 0
+        self.exported_errors = 0
+
+    def start_trace(self, name, **attributes):
+        if self.exporter is None:
+            return None
+        self.started += 1
+        return Trace(name, attributes, random.random() < self.sample_rate)
+
+    def end(self, trace, status='ok'):
+        """Завершение трассы и решение об экспорте; повторный вызов игнорируется"""
+        if trace is None or trace.ended:
+            return
+        if trace.holds:
+            # Трассу еще продолжает фоновая задача (рассылка) - завершит release
+            trace.end_status = status
+            return
+        trace.ended = True
+        duration = time.perf_counter() - trace.started
+        if trace.errors or status == 'error':
+            self.exported_errors += 1
+        elif duration >= self.slow_threshold:
+            self.exported_slow += 1
+        elif trace.sampled:
+            self.exported_sampled += 1
+        else:
+            return
+        self.exporter.export(trace.to_dict(duration, status))
+
+    def release(self, trace):
+        """Завершение фонового продолжения трассы (парный вызов к hold)"""
+        if trace is None or trace.holds <= 0:
+            return
+        trace.holds -= 1
+        if trace.holds == 0 and trace.end_status is not None:
+            self.end(trace, trace.end_status)
+
+    def close(self):
+        if self.exporter is not None:
+            self.exporter.close()
+
+    def get_stats(self):
+        stats = {
+            'enabled': self.exporter is not None,
+            'sample_rate': self.sample_rate,
+            'slow_threshold_ms': self.slow_threshold * 1000,
+            'traces': self.started,
+            'exported_sampled': self.exported_sampled,
+            'exported_slow': self.exported_slow,
+            'exported_errors': self.exported_errors
+        }
+        if self.exporter is not None:
+            stats['exporter'] = self.exporter.get_stats()
+        return stats